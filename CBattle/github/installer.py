@@ -1,4 +1,5 @@
-import requests
+import aiohttp
+
 
 def format(code: str) -> str:
     return (
@@ -10,6 +11,9 @@ def format(code: str) -> str:
         .replace("<COLOR>", "#FF466A")
     )
 
-content = requests.get("https://raw.githubusercontent.com/Dotsian/BDInstaller/main/main.py").text
+
+async with aiohttp.ClientSession() as session:
+    async with session.get("https://raw.githubusercontent.com/Dotsian/BDInstaller/main/main.py") as response:
+        content = await response.text()
 
 await ctx.invoke(bot.get_command("eval"), body=format(content))
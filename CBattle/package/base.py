@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, final
+from typing import TYPE_CHECKING, Any, ClassVar, final
 
 if TYPE_CHECKING:
     from .logic import BattleBall
@@ -13,6 +13,11 @@ class BaseAbility:
     Base ability class for all custom abilities.
     """
 
+    # Balls given this ability, by name or through a config attribute. Abilities are discovered without importing
+    # their module, so both have to be literal lists or tuples of strings.
+    balls: ClassVar[tuple[str, ...]] = ()
+    attributes: ClassVar[tuple[str, ...]] = ()
+
     ball: BattleBall
 
     passive: bool = False
@@ -52,34 +57,49 @@ class BaseAbility:
         return self.ball.attack
 
 
-@dataclass
+@dataclass(eq=False)
 class BaseEffect:
     """
     Base effect class for handling custom effects.
+
+    Effects are applied and expired by the battle's `EffectEngine`, which only calls the hooks a subclass overrides.
+    Effects are tracked by identity, so two identical effects can be stacked on the same ball.
     """
 
     ball: BattleBall
     rounds: int
 
-    rounds_since: int = 0
+    applied_round: int = 0
     active: bool = True
 
-    @final
-    def process_round(self):
-        if not self.active:
-            return
-
-        self.rounds_since += 1
-
-        if self.rounds_since < self.rounds:
-            self.active = False
-            self.ball.effects.remove(self)
+    @property
+    def expires_round(self) -> int:
+        return self.applied_round + self.rounds
 
     def choose_ball(self) -> bool:
+        """
+        Returns false to prevent the ball from being chosen to attack.
+        """
         return True
 
     def fetch_damage(self, opponent_ball: Any) -> int:
+        """
+        Returns the attack stat the ball uses against `opponent_ball`.
+        """
         return self.ball.attack
 
-    def round_passed(self, round_number):
-        self.process_round()
+    def modify_damage(self, damage: int, opponent_ball: Any) -> int:
+        """
+        Returns the damage dealt by the ball to `opponent_ball` once the attack was rolled.
+        """
+        return damage
+
+    def round_passed(self, round_number: int):
+        """
+        Called at the start of every round played by the ball's owner while the effect is active.
+        """
+
+    def on_expire(self):
+        """
+        Called when the effect expires or is removed.
+        """
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import json
+import struct
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterator
+
+from .eventlog import CRIT, DODGED, FRAME_HEADER, KILLED
+from .writer import FileWriter
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .logic import AttackResult, BattleState
+    from .templates import MessageTemplate
+
+# Rounds kept in the log of a battle. Once a log is full, every round overwrites the oldest one, so a log never
+# takes more than `LOG_CAPACITY * RECORD.size` bytes, however long the battle lasts.
+LOG_CAPACITY = 256
+
+# Round number, side of the attacking player, attacker and target indexes in their decks, damage, flags, and index
+# of the message in the list of messages matching the flags.
+RECORD = struct.Struct("<IBBBqBH")
+
+# Battle ID, Discord IDs of both players, winner as 1 or 2 (0 if nobody won), rounds dropped from the log, rounds
+# kept and sizes of both decks, followed by the instance IDs of both decks as `INSTANCE` structs, in deck order, then
+# the kept rounds as `RECORD` structs.
+EXPORT_HEADER = struct.Struct("<QQQBIIHH")
+INSTANCE = struct.Struct("<Q")
+
+
+def _messages(config: Config, flags: int) -> tuple[MessageTemplate, ...]:
+    if flags & DODGED:
+        return config.dodge_messages
+    if flags & KILLED:
+        return config.defeat_messages
+
+    return config.attack_messages
+
+
+@dataclass(frozen=True, slots=True)
+class LogRecord:
+    round_number: int
+    side: int
+    attacker: int
+    target: int
+    damage: int
+    flags: int
+    message: int
+
+    def render(self, battle: BattleState) -> str:
+        """
+        Returns the round as a single line of a battle log, with the message of the `AttackResult` it was played
+        with.
+        """
+        players = battle.player1, battle.player2
+        attacker = players[self.side].balls[self.attacker]
+        target = players[1 - self.side].balls[self.target]
+
+        text = _messages(battle.config, self.flags)[self.message].render(
+            attacker.owner.user.name, attacker.name, target.owner.user.name, target.name, self.damage
+        )
+
+        if self.flags & CRIT:
+            text += " It's a critical hit!"
+
+        return f"**{self.round_number}.** {text}".replace("\n", " ")
+
+
+class BattleLog:
+    """
+    Ring buffer of the latest `capacity` rounds of a battle, packed back to back as `RECORD` structs. Rounds are
+    only rendered to text when they are displayed.
+    """
+
+    __slots__ = ("capacity", "buffer", "count")
+
+    def __init__(self, capacity: int = LOG_CAPACITY):
+        self.capacity = capacity
+        self.buffer = bytearray()
+
+        # Rounds appended since the battle started, including the ones that were overwritten.
+        self.count = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    @property
+    def dropped(self) -> int:
+        """
+        Number of rounds that were overwritten by newer ones.
+        """
+        return self.count - len(self)
+
+    def append(self, round_number: int, side: int, attacker: int, target: int, result: AttackResult, config: Config):
+        flags = result.flags
+        message = _messages(config, flags).index(result.template)
+        values = (round_number, side, attacker, target, result.damage, flags, message)
+
+        if self.count < self.capacity:
+            self.buffer += RECORD.pack(*values)
+        else:
+            RECORD.pack_into(self.buffer, (self.count % self.capacity) * RECORD.size, *values)
+
+        self.count += 1
+
+    def records(self, start: int = 0) -> Iterator[LogRecord]:
+        """
+        Yields the kept rounds, oldest first, starting from the `start`th round appended.
+        """
+        for index in range(max(start, self.dropped), self.count):
+            yield LogRecord(*RECORD.unpack_from(self.buffer, (index % self.capacity) * RECORD.size))
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the kept rounds as `RECORD` structs, oldest first.
+        """
+        split = (self.count % self.capacity) * RECORD.size if self.dropped else 0
+        return bytes(self.buffer[split:] + self.buffer[:split])
+
+
+class LogView:
+    """
+    Text of the latest `size` rounds of a battle. Every round is rendered once, when the view is updated after the
+    round was played.
+    """
+
+    def __init__(self, battle: BattleState, size: int = 5):
+        self.battle = battle
+        self.lines: deque[str] = deque(maxlen=size)
+        self.cursor = 0
+
+    def update(self) -> str:
+        log = self.battle.log
+
+        # Rounds that would be pushed out of the view by newer ones are never rendered.
+        for record in log.records(max(self.cursor, log.count - self.lines.maxlen)):
+            self.lines.append(record.render(self.battle))
+
+        self.cursor = log.count
+        return "\n".join(self.lines)
+
+
+@dataclass(frozen=True, slots=True)
+class ExportedLog:
+    """
+    Log of a finished battle, read back from a binary export.
+    """
+
+    battle_id: int
+    player_ids: tuple[int, int]
+
+    # 1 or 2 for the winning side, 0 if nobody won.
+    winner: int
+    dropped: int
+
+    # Instance IDs of the balls of both decks, indexed by the attacker and target of the rounds.
+    decks: tuple[tuple[int, ...], tuple[int, ...]]
+    rounds: list[LogRecord]
+
+
+def read_exports(file: BinaryIO) -> Iterator[ExportedLog]:
+    """
+    Reads a binary export, yielding every log. Reading stops at the first incomplete or corrupted log.
+    """
+    while header := file.read(FRAME_HEADER.size):
+        if len(header) < FRAME_HEADER.size:
+            return
+
+        length, checksum = FRAME_HEADER.unpack(header)
+        body = file.read(length)
+
+        if len(body) < length or length < EXPORT_HEADER.size or zlib.crc32(body) != checksum:
+            return
+
+        battle_id, user1, user2, winner, dropped, _, size1, size2 = EXPORT_HEADER.unpack_from(body)
+        end = EXPORT_HEADER.size + (size1 + size2) * INSTANCE.size
+
+        instances = [instance_id for (instance_id,) in INSTANCE.iter_unpack(body[EXPORT_HEADER.size : end])]
+        rounds = [LogRecord(*values) for values in RECORD.iter_unpack(body[end:])]
+
+        yield ExportedLog(
+            battle_id, (user1, user2), winner, dropped, (tuple(instances[:size1]), tuple(instances[size1:])), rounds
+        )
+
+
+class LogExporter(FileWriter):
+    """
+    Appends the logs of finished battles to a file, as JSON Lines if its name ends with `.jsonl`, or as frames read
+    by `read_exports` otherwise.
+
+    Logs are serialized when their battle ends, so the battle can be freed right away, and written in batches every
+    `flush_interval` seconds from a worker thread.
+    """
+
+    description = "battle logs"
+
+    def __init__(self, path: Path, flush_interval: float = 2.0):
+        super().__init__(path, flush_interval)
+        self.binary = path.suffix != ".jsonl"
+
+    def export(self, battle: BattleState, winner: int = 0):
+        """
+        Buffers the log of a finished battle, with the winner as 1 or 2, or 0 if nobody won.
+        """
+        log = battle.log
+        user_ids = battle.player1.user.id, battle.player2.user.id
+        decks = [[ball.instance_id for ball in player.balls] for player in (battle.player1, battle.player2)]
+
+        if self.binary:
+            body = b"".join(
+                (
+                    EXPORT_HEADER.pack(battle.id, *user_ids, winner, log.dropped, len(log), *map(len, decks)),
+                    *(INSTANCE.pack(instance_id) for deck in decks for instance_id in deck),
+                    log.to_bytes(),
+                )
+            )
+            self.pending.append(FRAME_HEADER.pack(len(body), zlib.crc32(body)) + body)
+            return
+
+        line = {
+            "battle": battle.id,
+            "players": user_ids,
+            "winner": winner,
+            "balls": [[ball.name for ball in player.balls] for player in (battle.player1, battle.player2)],
+            "instances": decks,
+            "dropped": log.dropped,
+            "rounds": [
+                [
+                    record.round_number,
+                    record.side,
+                    record.attacker,
+                    record.target,
+                    record.damage,
+                    record.flags,
+                    record.message,
+                ]
+                for record in log.records()
+            ],
+        }
+        self.pending.append(json.dumps(line, separators=(",", ":")).encode() + b"\n")
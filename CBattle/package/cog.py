@@ -1,20 +1,43 @@
+import asyncio
+import logging
+import re
+from pathlib import Path
 from typing import TYPE_CHECKING
 
 import discord
 from discord import app_commands
 from discord.ext import commands
+from tortoise.signals import Signals
 
-from ballsdex.core.models import Player
+from ballsdex.core.models import BallInstance, Player
 from ballsdex.core.utils.transformers import BallInstanceTransform
 from ballsdex.settings import settings
 
-from .components import BattleStartView
-from .logic import BattleBall, BattlePlayer, BattleState
+from .battlelog import LogExporter
+from .components import BattleAcceptView, BattleStartView, TurnView
+from .config import ConfigWatcher, get_config
+from .coordination import CoordinationError, create_coordinator, default_node
+from .deck import DeckLoader
+from .embeds import AssetCache, build_tutorial
+from .eventlog import CRIT, DODGED, EventLog, RecoveredBattle, compact, replay
+from .history import DRAW, WIN, BattleHistory
+from .janitor import BattleJanitor
+from .logic import BattlePlayer, BattleState, reserve_battle_ids
+from .matchmaking import MatchQueue, QueueEntry, deck_power
+from .metrics import MetricsServer, QueryCounter, count_request, instrument, metrics
 from .pagination import TutorialPages
+from .plugins import PluginRegistry
+from .profiler import profiler
+from .registry import BattleRegistry
 
 if TYPE_CHECKING:
     from ballsdex.core.bot import BallsDexBot
 
+log = logging.getLogger(__name__)
+
+# Seconds between two passes pairing the queued players whose search window grew.
+MATCHMAKING_INTERVAL = 5.0
+
 TUTORIAL = {
     "Welcome to CBattle!": (
         "Welcome, soldier, and thank you for installing CBattle! In this package, battling is greatly improved by "
@@ -56,20 +79,8 @@ TUTORIAL = {
     ),
 }
 
-THUMBNAILS = [
-    # page 1: cbattle logo
-    "https://images-ext-1.discordapp.net/external/yM5ZPPxC1zPzGYhq8HnzXjT0Q0T8uWlOXHbWyay3Nnw/https/raw.githubusercontent.com/Dotsian/CBattle/refs/heads/main/assets/Logo.png",
-    # page 2: fists
-    "https://www.pngmart.com/files/23/Fist-PNG.png",
-    # page 3: cards
-    "https://cdn-icons-png.flaticon.com/512/5030/5030368.png",
-    # page 4: shield
-    "https://th.bing.com/th/id/R.cc541053f483f433d81d867221f29135?rik=QzKgpGUoVAyNmA&riu=http%3a%2f%2fwww.clker.com%2fcliparts%2fl%2fE%2f3%2fC%2fe%2fT%2fred-shield-hi.png&ehk=YNsIL2zoKv%2b54fxAa3tiPatJI6%2ffLPrU%2f3lgEb2wKLc%3d&risl=&pid=ImgRaw&r=0",
-    # page 5: potion
-    "https://gamepedia.cursecdn.com/zelda_gamepedia_en/thumb/6/68/PH_Red_Potion_Model.png/225px-PH_Red_Potion_Model.png?version=59fdeb61e177cc36789fd835546017e4",
-    # page 6: trophy
-    "https://th.bing.com/th/id/R.a5b17534342efbc6b3d1c9689255c7b7?rik=9u%2fKoEzC1XQ1jw&pid=ImgRaw&r=0",
-]
+# Thumbnails of the tutorial pages, as the names of files of the `assets` folder.
+THUMBNAILS = ["Logo.png", "Fist.png", "Cards.png", "Shield.png", "Potion.png", "Trophy.png"]
 
 
 class Battle(commands.GroupCog):
@@ -79,33 +90,326 @@ class Battle(commands.GroupCog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.battles: dict[Player, BattleState] = {}
+        self.node = default_node(bot.shard_ids)
+        self.coordinator = create_coordinator(get_config().coordination_url, self.node)
+        self.battles = BattleRegistry(self.coordinator)
+        self.plugins = PluginRegistry()
+        self.decks = DeckLoader(bot, self.plugins)
+        self.config_watcher = ConfigWatcher()
+
+        # Tutorial pages never change, so they are built once and shared by every tutorial message.
+        self.tutorial_pages = build_tutorial(TUTORIAL, THUMBNAILS, AssetCache())
+
+        event_log = get_config().event_log
+        self.event_log = EventLog(self.node_path(event_log)) if event_log else None
+
+        # The database is shared by every process, which tell their battles apart by node name.
+        history_database = get_config().history_database
+        history_node = self.node if get_config().coordination_url else ""
+        self.history = (
+            BattleHistory(Path(__file__).parent / history_database, history_node) if history_database else None
+        )
 
-    @app_commands.command()
-    async def tutorial(self, interaction: discord.Interaction):
+        log_export = get_config().log_export
+        self.log_exporter = LogExporter(self.node_path(log_export)) if log_export else None
+
+        metrics_port = get_config().metrics_port
+        self.metrics_server = MetricsServer("127.0.0.1", metrics_port) if metrics_port else None
+        self.query_counter = QueryCounter()
+
+        battle_timeout = get_config().battle_timeout
+        self.janitor = BattleJanitor(self.battles, battle_timeout) if battle_timeout else None
+
+        # Matchmaking queues, by guild ID.
+        self.queues: dict[int, MatchQueue] = {}
+        self.matchmaking_task: asyncio.Task | None = None
+
+    def node_path(self, name: str) -> Path:
         """
-        View the tutorial for CBattling!
+        Returns the path of a file of this process, relative to the package folder. When several processes are
+        coordinated, each of them gets its own file, named after its node, as they share the folder.
         """
+        path = Path(__file__).parent / name
 
-        def make_pages(page_num: int):
-            async def page():
-                title = list(TUTORIAL.keys())[page_num]
-                description = TUTORIAL[title]
-                thumbnail = THUMBNAILS[page_num]
+        if not get_config().coordination_url:
+            return path
 
-                embed = discord.Embed(
-                    title=f"Tutorial Page {page_num + 1}: {title}", description=description, color=discord.Color.red()
-                )
+        node = re.sub(r"[^\w.-]", "-", self.node)
+        return path.with_name(f"{path.stem}.{node}{path.suffix}")
+
+    async def cog_load(self):
+        self.config_watcher.start()
+
+        # The client reconnects with the next command, so battles can be started again once the server is back.
+        try:
+            await self.coordinator.start()
+        except CoordinationError as error:
+            log.error(f"Could not reach the coordination server, battles can't be started until it's back: {error}")
+
+        if self.janitor is not None:
+            self.janitor.start()
+
+        self.matchmaking_task = asyncio.create_task(self.match_waiting())
+
+        # Only the manifest is read here, plugin modules are imported when a ball using them joins a battle.
+        self.plugins.discover()
+
+        # Trades and in-bot edits of specials and bonuses save the instance, which drops its cached stats. Edits made
+        # by another process, like the admin panel, only apply once the entry is evicted or the config is reloaded.
+        BallInstance.register_listener(Signals.post_save, self.on_ball_saved)
+
+        if self.metrics_server is not None:
+            await self.start_metrics()
+
+        if self.history is not None:
+            self.history.open()
+            reserve_battle_ids(self.history.last_battle_id())
+
+        if self.log_exporter is not None:
+            self.log_exporter.open()
+
+        if self.event_log is None:
+            return
+
+        recovered = {}
+
+        if self.event_log.path.exists():
+            with self.event_log.path.open("rb") as file:
+                recovered = replay(file)
+
+            # Only unfinished battles are kept, so the log doesn't grow across restarts.
+            compact(self.event_log.path, recovered)
+            reserve_battle_ids(max(recovered, default=0))
+
+        self.event_log.open()
+        self.bot.loop.create_task(self.restore_battles(list(recovered.values())))
+
+    async def start_metrics(self):
+        metrics.gauge(
+            "cbattle_active_battles",
+            lambda: sum(1 for battle in self.battles if battle.accepted),
+            "Battles that were accepted and haven't ended.",
+        )
+        metrics.gauge(
+            "cbattle_pending_requests",
+            lambda: sum(1 for battle in self.battles if not battle.accepted),
+            "Battle requests waiting to be accepted.",
+        )
+
+        try:
+            await self.metrics_server.start()
+        except OSError as error:
+            log.error(f"Could not serve CBattle metrics on port {self.metrics_server.port}: {error}")
+            return
+
+        self.query_counter.install()
+        metrics.enabled = True
+
+    async def cog_unload(self):
+        self.config_watcher.stop()
+
+        # Tortoise has no way to unregister a listener, so it's removed from the model's listeners directly.
+        listeners = BallInstance._listeners[Signals.post_save].get(BallInstance, [])
+        if self.on_ball_saved in listeners:
+            listeners.remove(self.on_ball_saved)
+
+        if self.janitor is not None:
+            self.janitor.stop()
+
+        if self.matchmaking_task is not None:
+            self.matchmaking_task.cancel()
+
+        await self.coordinator.stop()
+
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+            self.query_counter.uninstall()
+            metrics.enabled = False
+
+        if self.history is not None:
+            await self.history.close()
+
+        if self.log_exporter is not None:
+            await self.log_exporter.close()
+
+        if self.event_log is not None:
+            await self.event_log.close()
+
+    async def on_ball_saved(self, sender, instance: BallInstance, created: bool, using_db, update_fields):
+        if not created:
+            self.decks.stats.invalidate(instance.pk)
+
+    async def match_waiting(self):
+        while True:
+            await asyncio.sleep(MATCHMAKING_INTERVAL)
+
+            # Empty queues are kept, as commands could still be holding them across an await.
+            for queue in list(self.queues.values()):
+                for first, second in queue.pair_waiting():
+                    try:
+                        await self.start_match(queue, first, second)
+                    except Exception:
+                        log.exception("Could not start a matched battle")
+
+    async def register(self, battle: BattleState) -> bool:
+        """
+        Reserves both players of a battle in every process, then adds the battle to the registry. Returns false if
+        either player is already part of a battle.
+        """
+        if not await self.coordinator.reserve(battle):
+            return False
+
+        if not self.battles.add(battle):
+            self.coordinator.drop(battle)
+            return False
+
+        return True
+
+    async def start_match(self, queue: MatchQueue, first: QueueEntry, second: QueueEntry) -> bool:
+        """
+        Starts a battle between two paired players, in the channel the last one of them queued in. Battles started
+        from the queue skip the request, as both players asked for one. Returns false if the battle couldn't be
+        started, in which case the players who can still battle are put back in the queue.
+        """
+        (user1, player1, _), (user2, player2, channel) = first.payload, second.payload
+
+        if await player1.is_blocked(player2) or await player2.is_blocked(player1):
+            first.avoid.add(user2.id)
+            second.avoid.add(user1.id)
+            queue.wait(first)
+            queue.wait(second)
+            return False
+
+        battle = BattleState(
+            player1=BattlePlayer(model=player1, user=user1),
+            player2=BattlePlayer(model=player2, user=user2),
+            channel=channel,
+            accepted=True,
+            history=self.history,
+            exporter=self.log_exporter,
+        )
+
+        try:
+            registered = await self.register(battle)
+        except CoordinationError:
+            log.exception("Could not reserve the players of a matched battle")
+            registered = False
 
-                embed.set_thumbnail(url=thumbnail)
+        # Either player could have started another battle while waiting, in which case the other one keeps waiting.
+        # Both keep waiting if the coordination server couldn't be reached.
+        if not registered:
+            for entry, user in ((first, user1), (second, user2)):
+                if user.id not in self.battles:
+                    queue.wait(entry)
 
-                return embed, None
+            return False
 
-            return page
+        if self.janitor is not None:
+            self.janitor.track(battle)
 
-        pages = [make_pages(i) for i in range(6)]
-        view = TutorialPages(pages, interaction.user.id)
-        embed, attachment = await pages[0]()
+        if self.event_log is not None:
+            battle.recorder = self.event_log.recorder(battle.id)
+            battle.recorder.created(battle)
+            battle.recorder.accepted()
+
+        view = BattleAcceptView(battle)
+        battle.accept_view = view
+
+        view.message = await channel.send(
+            f"{user1.mention} and {user2.mention}, you were matched! Add balls with `/battle add` and lock your deck.",
+            view=view,
+            embed=view.get_embed(),
+        )
+        count_request("send")
+        return True
+
+    async def restore_battles(self, recovered: list[RecoveredBattle]):
+        await self.bot.wait_until_ready()
+
+        for data in recovered:
+            try:
+                await self.restore_battle(data)
+            except Exception:
+                log.exception(f"Could not restore battle {data.id}")
+                self.event_log.recorder(data.id).ended()
+
+    async def restore_battle(self, data: RecoveredBattle):
+        """
+        Rebuilds a battle recorded in the event log and sends a new view for it in its channel.
+        """
+        recorder = self.event_log.recorder(data.id)
+        channel = self.bot.get_channel(data.channel_id)
+
+        # Pending requests are dropped, as their view would have expired anyway.
+        if channel is None or not data.accepted:
+            recorder.ended()
+            return
+
+        players = []
+        for user_id in data.user_ids:
+            user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+            model, _ = await Player.get_or_create(discord_id=user_id)
+            players.append(BattlePlayer(model=model, user=user))
+
+        battle = BattleState(
+            player1=players[0],
+            player2=players[1],
+            id=data.id,
+            seed=data.seed,
+            accepted=True,
+            auto=data.auto,
+            channel=channel,
+            recorder=recorder,
+            history=self.history,
+            exporter=self.log_exporter,
+        )
+
+        for side, player in enumerate(players):
+            player.balls = await self.decks.load(player, data.decks[side])
+            player.locked = data.locked[side]
+
+            # Rounds reference balls by their index, so a deck with missing balls can't be restored.
+            if len(player.balls) != len(data.decks[side]):
+                recorder.ended()
+                await channel.send("A battle could not be restored after a restart, as a deck has changed.")
+                count_request("send")
+                return
+
+        if data.started:
+            battle.start()
+
+            for attacker, target, damage, flags in data.rounds:
+                battle.apply_round(attacker, target, damage, bool(flags & CRIT), bool(flags & DODGED))
+
+        if not await self.register(battle):
+            recorder.ended()
+            return
+
+        if self.janitor is not None:
+            self.janitor.track(battle)
+
+        if battle.started:
+            view = TurnView(battle)
+            view.message = await channel.send(
+                'This battle was restored after a restart. Press "Next Turn" to continue!', view=view
+            )
+            battle.last_turn = view
+            count_request("send")
+            return
+
+        view = BattleAcceptView(battle)
+        view.message = await channel.send(view=view, embed=view.get_embed())
+        battle.accept_view = view
+        count_request("send")
+
+    @app_commands.command()
+    @instrument("tutorial")
+    async def tutorial(self, interaction: discord.Interaction):
+        """
+        View the tutorial for CBattling!
+        """
+        view = TutorialPages(self.tutorial_pages, interaction.user.id)
+        embed, attachment = await self.tutorial_pages[0]()
 
         if attachment:
             await interaction.response.send_message(embed=embed, file=attachment, view=view)
@@ -114,6 +418,7 @@ class Battle(commands.GroupCog):
         await interaction.response.send_message(embed=embed, view=view)
 
     @app_commands.command()
+    @instrument("add")
     async def add(self, interaction: discord.Interaction["BallsDexBot"], countryball: BallInstanceTransform):
         """
         Adds a countryball to the battle.
@@ -123,14 +428,12 @@ class Battle(commands.GroupCog):
         countryball: BallInstance
             The countryball you want to add.
         """
-        interaction_player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        battle = self.battles.get(interaction.user.id)
 
-        if interaction_player not in self.battles:
+        if battle is None:
             await interaction.response.send_message("You don't have an active battle!", ephemeral=True)
             return
 
-        battle = self.battles[interaction_player]
-
         if battle.started:
             await interaction.response.send_message(
                 "You can't change your deck after the battle has started!", ephemeral=True
@@ -143,28 +446,30 @@ class Battle(commands.GroupCog):
             )
             return
 
-        battle_player = battle.player1 if battle.player1.model == interaction_player else battle.player2
+        battle_player = battle.get_user(interaction.user)
 
         if battle_player.locked:
             await interaction.response.send_message("You can't change your deck after you've locked!", ephemeral=True)
             return
 
-        battleball = BattleBall.from_ballinstance(countryball, battle_player)
-
-        if battleball in battle_player.balls:
+        if battle_player.get_ball(countryball.pk) is not None:
             await interaction.response.send_message("You've already added this ball to your deck!", ephemeral=True)
             return
 
-        battle_player.balls.append(BattleBall.from_ballinstance(countryball, battle_player))
-        emoji = self.bot.get_emoji(countryball.countryball.emoji_id)
+        battle.touch()
+
+        battleball = self.decks.build(countryball, battle_player)
+        battle_player.balls.append(battleball)
+        battle.recorder.ball_added(battle.recorder.side(battle, battle_player), battleball.instance_id)
 
         await interaction.response.send_message(
-            f"`#{countryball.id}` {emoji} {countryball.countryball.country} added!", ephemeral=True
+            f"`#{countryball.id}` {battleball.emoji} {battleball.name} added!", ephemeral=True
         )
 
         await battle.accept_view.update()
 
     @app_commands.command()
+    @instrument("remove")
     async def remove(self, interaction: discord.Interaction["BallsDexBot"], countryball: BallInstanceTransform):
         """
         Removes a countryball from the battle.
@@ -174,14 +479,12 @@ class Battle(commands.GroupCog):
         countryball: BallInstance
             The countryball you want to remove.
         """
-        interaction_player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        battle = self.battles.get(interaction.user.id)
 
-        if interaction_player not in self.battles:
+        if battle is None:
             await interaction.response.send_message("You don't have an active battle!", ephemeral=True)
             return
 
-        battle = self.battles[interaction_player]
-
         if battle.started:
             await interaction.response.send_message(
                 "You can't change your deck after the battle has started!", ephemeral=True
@@ -193,51 +496,157 @@ class Battle(commands.GroupCog):
             )
             return
 
-        battle_player = battle.player1 if battle.player1.model == interaction_player else battle.player2
+        battle_player = battle.get_user(interaction.user)
 
         if battle_player.locked:
             await interaction.response.send_message("You can't change your deck after you've locked!", ephemeral=True)
             return
 
-        removing_ball = BattleBall.from_ballinstance(countryball)
-
-        emoji = self.bot.get_emoji(countryball.countryball.emoji_id)
+        removing_ball = battle_player.get_ball(countryball.pk)
 
-        if removing_ball not in battle_player.balls:
+        if removing_ball is None:
             await interaction.response.send_message("This ball is not in your deck!", ephemeral=True)
             return
 
+        battle.touch()
         battle_player.balls.remove(removing_ball)
+        battle.recorder.ball_removed(battle.recorder.side(battle, battle_player), removing_ball.instance_id)
 
         await interaction.response.send_message(
-            f"`#{countryball.id}` {emoji} {countryball.countryball.country} removed!", ephemeral=True
+            f"`#{countryball.id}` {removing_ball.emoji} {removing_ball.name} removed!", ephemeral=True
         )
 
         await battle.accept_view.update()
 
     @app_commands.command()
+    @instrument("queue")
+    async def queue(self, interaction: discord.Interaction["BallsDexBot"]):
+        """
+        Joins the matchmaking queue, to battle a player whose deck has a similar power.
+        """
+        if interaction.guild is None or interaction.channel is None:
+            await interaction.response.send_message("This command must be run in a server.", ephemeral=True)
+            return
+
+        try:
+            reserved = interaction.user.id in self.battles or await self.coordinator.lookup(interaction.user.id)
+        except CoordinationError:
+            log.exception("Could not look up the reservation of a queued player")
+            await interaction.response.send_message(
+                "Matchmaking is unavailable right now, try again later.", ephemeral=True
+            )
+            return
+
+        if reserved:
+            await interaction.response.send_message(
+                "You cannot join the queue while you have an active battle or battle request", ephemeral=True
+            )
+            return
+
+        if interaction.user.id in self.queues.get(interaction.guild.id, ()):
+            await interaction.response.send_message("You are already in the queue!", ephemeral=True)
+            return
+
+        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+
+        # Stats are computed like `BallInstance.health` and `BallInstance.attack`, without fetching the instances.
+        rows = await BallInstance.filter(player=player).values_list(
+            "ball__health", "health_bonus", "ball__attack", "attack_bonus"
+        )
+        stats = [
+            (health + int(health * health_bonus * 0.01), attack + int(attack * attack_bonus * 0.01))
+            for health, health_bonus, attack, attack_bonus in rows
+        ]
+        power = deck_power(stats, get_config().max_ball_amount)
+
+        if not power:
+            await interaction.response.send_message(
+                f"You need {settings.plural_collectible_name} to join the queue!", ephemeral=True
+            )
+            return
+
+        # The player could have been queued by another command while the database was queried.
+        queue = self.queues.setdefault(interaction.guild.id, MatchQueue())
+
+        if interaction.user.id in queue:
+            await interaction.response.send_message("You are already in the queue!", ephemeral=True)
+            return
+
+        entry = QueueEntry(
+            interaction.user.id, power, queue.clock(), payload=(interaction.user, player, interaction.channel)
+        )
+        opponent = queue.join(entry)
+        send = interaction.response.send_message
+
+        if opponent is not None:
+            # The player is only told an opponent was found once the battle is registered, which takes a few requests.
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            send = interaction.followup.send
+
+            if await self.start_match(queue, opponent, entry):
+                await send("An opponent was found!", ephemeral=True)
+                return
+
+            if interaction.user.id not in queue:
+                await send(
+                    "You cannot join the queue while you have an active battle or battle request", ephemeral=True
+                )
+                return
+
+        await send(
+            f"You joined the queue with a deck power of {power:,.0f}. "
+            "You'll be pinged once an opponent is found, or use `/battle leave` to leave the queue.",
+            ephemeral=True,
+        )
+
+    @app_commands.command()
+    @instrument("leave")
+    async def leave(self, interaction: discord.Interaction["BallsDexBot"]):
+        """
+        Leaves the matchmaking queue.
+        """
+        queue = self.queues.get(interaction.guild.id) if interaction.guild else None
+
+        if queue is None or queue.leave(interaction.user.id) is None:
+            await interaction.response.send_message("You are not in the queue!", ephemeral=True)
+            return
+
+        await interaction.response.send_message("You left the queue.", ephemeral=True)
+
+    @app_commands.command()
+    @instrument("cancel")
     async def cancel(self, interaction: discord.Interaction):
-        interaction_player, _ = await Player.get_or_create(discord_id=interaction.user.id)
+        battle = self.battles.get(interaction.user.id)
 
-        if interaction_player not in self.battles:
+        if battle is None:
             await interaction.response.send_message("You don't have an active battle!", ephemeral=True)
             return
 
-        battle = self.battles[interaction_player]
-        if battle.accept_view:
-            await battle.accept_view.message.edit(content="This battle was cancelled.")
+        async with battle.lock:
+            if battle.finished:
+                await interaction.response.send_message("This battle is already over.", ephemeral=True)
+                return
+
+            battle.finished = True
 
-        players = [battle.player1.model, battle.player2.model]
-        for player in players:
-            del self.battles[player]
+            if battle.accept_view:
+                battle.accept_view.stop()
+                battle.accept_view.editor.cancel()
+                await battle.accept_view.message.edit(content="This battle was cancelled.")
+                count_request("edit")
 
-        if battle.last_turn:
-            await battle.last_turn.cancel()
+            self.battles.remove(battle)
+            battle.recorder.ended()
+            profiler.finish(battle.id)
 
-        await interaction.response.send_message("Cancelled battle!")
+            if battle.last_turn:
+                await battle.last_turn.cancel()
+
+            await interaction.response.send_message("Cancelled battle!")
 
     @app_commands.command()
-    async def start(self, interaction: discord.Interaction, user: discord.User):
+    @instrument("start")
+    async def start(self, interaction: discord.Interaction, user: discord.User, auto: bool = False):
         """
         Starts a battle with a user.
 
@@ -245,6 +654,8 @@ class Battle(commands.GroupCog):
         ----------
         user: discord.User
             The user you want to battle against.
+        auto: bool
+            Whether the whole battle should be played at once after both players lock.
         """
 
         if not interaction.channel:
@@ -262,6 +673,27 @@ class Battle(commands.GroupCog):
             await interaction.response.send_message("You cannot battle against a blacklisted player.", ephemeral=True)
             return
 
+        for user_id in (interaction.user.id, user.id):
+            existing = self.battles.get(user_id)
+
+            # Finished battles stay registered until the janitor sweeps them, but shouldn't keep players from
+            # starting a new one.
+            if existing is not None and existing.finished:
+                self.battles.remove(existing)
+
+        if interaction.user.id in self.battles:
+            await interaction.response.send_message(
+                "You cannot start a battle while you have an active battle or battle request", ephemeral=True
+            )
+            return
+        if user.id in self.battles:
+            await interaction.response.send_message(
+                "You cannot start a battle with a player already in a battle", ephemeral=True
+            )
+            return
+
+        capture = profiler.begin((interaction.user.id, user.id)) if get_config().debug else None
+
         player1, _ = await Player.get_or_create(discord_id=interaction.user.id)
         player2, _ = await Player.get_or_create(discord_id=user.id)
 
@@ -269,28 +701,19 @@ class Battle(commands.GroupCog):
         blocked2 = await player2.is_blocked(player1)
 
         if blocked1:
+            profiler.discard(capture)
             await interaction.response.send_message(
                 "You cannot battle against a player you have blocked.", ephemeral=True
             )
             return
 
         if blocked2:
+            profiler.discard(capture)
             await interaction.response.send_message(
                 "You cannot battle against a player that has blocked you.", ephemeral=True
             )
             return
 
-        if player1 in self.battles:
-            await interaction.response.send_message(
-                "You cannot start a battle while you have an active battle or battle request", ephemeral=True
-            )
-            return
-        if player2 in self.battles:
-            await interaction.response.send_message(
-                "You cannot start a battle with a player already in a battle", ephemeral=True
-            )
-            return
-
         embed = discord.Embed(
             title="Battle Request!",
             description=f"{user.mention}, {interaction.user.mention} has invited you to a battle!",
@@ -302,9 +725,177 @@ class Battle(commands.GroupCog):
             player1=BattlePlayer(model=player1, user=interaction.user),
             player2=BattlePlayer(model=player2, user=user),
             channel=interaction.channel,
+            auto=auto,
+            history=self.history,
+            exporter=self.log_exporter,
         )
-        self.battles[player1] = battle
+
+        try:
+            registered = await self.register(battle)
+        except CoordinationError:
+            log.exception("Could not reserve the players of a battle")
+            profiler.discard(capture)
+            await interaction.response.send_message(
+                "Battles can't be started right now, try again later.", ephemeral=True
+            )
+            return
+
+        # Either player could have joined another battle while the database was queried, possibly on another shard.
+        if not registered:
+            profiler.discard(capture)
+            await interaction.response.send_message(
+                "You cannot start a battle with a player already in a battle", ephemeral=True
+            )
+            return
+
+        profiler.bind(capture, battle.id)
+
+        if self.janitor is not None:
+            self.janitor.track(battle)
+
+        if self.event_log is not None:
+            battle.recorder = self.event_log.recorder(battle.id)
+            battle.recorder.created(battle)
 
         view = BattleStartView(interaction, user, battle, self.battles)
 
         await interaction.response.send_message(view=view, embed=embed)
+
+    @app_commands.command()
+    @instrument("leaderboard")
+    async def leaderboard(self, interaction: discord.Interaction["BallsDexBot"], balls: bool = False):
+        """
+        Displays the highest rated players, or the balls that won the most battles.
+
+        Parameters
+        ----------
+        balls: bool
+            Whether to rank balls instead of players.
+        """
+        if self.history is None:
+            await interaction.response.send_message("Battle history is disabled.", ephemeral=True)
+            return
+
+        if balls:
+            title = f"Top {settings.plural_collectible_name}"
+            lines = [
+                f"{rank}. **{stats.ball}**: {stats.wins}W / {stats.losses}L / {stats.draws}D"
+                for rank, stats in enumerate(await self.history.ball_leaderboard(), 1)
+            ]
+        else:
+            title = "Top players"
+            lines = [
+                f"{rank}. <@{stats.player_id}>: {stats.rating:.0f} ({stats.wins}W / {stats.losses}L / {stats.draws}D)"
+                for rank, stats in enumerate(await self.history.leaderboard(), 1)
+            ]
+
+        embed = discord.Embed(title=title, color=discord.Color.red())
+        embed.description = "\n".join(lines) or "No battles finished yet."
+
+        await interaction.response.send_message(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+    @app_commands.command(name="history")
+    @instrument("history")
+    async def battle_history(self, interaction: discord.Interaction["BallsDexBot"], user: discord.User | None = None):
+        """
+        Displays the latest battles of a player.
+
+        Parameters
+        ----------
+        user: discord.User
+            The player to display the history of. Defaults to yourself.
+        """
+        if self.history is None:
+            await interaction.response.send_message("Battle history is disabled.", ephemeral=True)
+            return
+
+        user = user or interaction.user
+        stats = await self.history.player_stats(user.id)
+
+        if stats is None:
+            await interaction.response.send_message(f"{user.mention} hasn't finished any battle yet.", ephemeral=True)
+            return
+
+        lines = []
+
+        for entry in await self.history.history(user.id):
+            result = "Won" if entry.result == WIN else "Draw" if entry.result == DRAW else "Lost"
+            lines.append(
+                f"**{result}** against <@{entry.opponent_id}> <t:{entry.finished_at:.0f}:R> "
+                f"({entry.rating_change:+.0f})"
+            )
+
+        embed = discord.Embed(title=f"{user.name}'s battles", color=discord.Color.red())
+        embed.add_field(name="Rating", value=f"{stats.rating:.0f}")
+        embed.add_field(name="Record", value=f"{stats.wins}W / {stats.losses}L / {stats.draws}D")
+        embed.description = "\n".join(lines)
+
+        await interaction.response.send_message(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+    @app_commands.command()
+    async def stats(self, interaction: discord.Interaction["BallsDexBot"]):
+        """
+        Displays the battle metrics. Only available to the bot owners.
+        """
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("Only the bot owners can view battle stats.", ephemeral=True)
+            return
+
+        if not metrics.enabled:
+            await interaction.response.send_message(
+                "Metrics are disabled. Set `metrics-port` in the CBattle config to enable them.", ephemeral=True
+            )
+            return
+
+        embed = discord.Embed(title="Battle Stats", color=discord.Color.red())
+        embed.add_field(name="Active battles", value=str(metrics.gauges["cbattle_active_battles"]()))
+        embed.add_field(name="Pending requests", value=str(metrics.gauges["cbattle_pending_requests"]()))
+        embed.add_field(
+            name="Discord requests",
+            value=f"{metrics.counter_total('cbattle_discord_requests_total', kind='send'):.0f} sent, "
+            f"{metrics.counter_total('cbattle_discord_requests_total', kind='edit'):.0f} edited",
+        )
+
+        lines = []
+
+        for labels, histogram in sorted(metrics.histograms.get("cbattle_handler_seconds", {}).items()):
+            handler = dict(labels)["handler"]
+            queries = metrics.counter_total("cbattle_db_queries_total", handler=handler)
+            lines.append(
+                f"`{handler}`: {histogram.count} calls, p50 ≤ {histogram.quantile(0.5) * 1000:g}ms, "
+                f"p95 ≤ {histogram.quantile(0.95) * 1000:g}ms, {queries / histogram.count:.1f} queries per call"
+            )
+
+        embed.description = "\n".join(lines) or "No commands handled yet."
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command()
+    async def profile(self, interaction: discord.Interaction["BallsDexBot"], user: discord.User | None = None):
+        """
+        Profiles the next battle, from its start until its winner is announced. Only available to the bot owners
+        in debug mode.
+
+        Parameters
+        ----------
+        user: discord.User
+            Only profile the next battle started by or against this user.
+        """
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("Only the bot owners can profile battles.", ephemeral=True)
+            return
+
+        if not get_config().debug:
+            await interaction.response.send_message(
+                "Profiling is only available when `debug` is enabled in the CBattle config.", ephemeral=True
+            )
+            return
+
+        profiler.arm(user.id if user else None)
+
+        target = f"started by or against {user.mention}" if user else "started"
+        await interaction.response.send_message(
+            f"The next battle {target} will be profiled. Its collapsed stacks will be written to "
+            f"`{profiler.directory.name}/` once it ends.",
+            ephemeral=True,
+        )
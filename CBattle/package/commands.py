@@ -1,10 +1,17 @@
 import base64
+import tarfile
+from http import HTTPStatus
+from pathlib import Path
 
-import requests
 from discord.ext import commands
 
+from .fetch import Fetcher, FetchError, install_local
+
 __version__ = "0.0.1a"
 
+INSTALLER_URL = "https://api.github.com/repos/Dotsian/CBattle/contents/CBattle/github/installer.py"
+RELEASE_URL = "https://api.github.com/repos/Dotsian/CBattle/releases/latest"
+
 
 class CBattleText(commands.Cog):
     """
@@ -13,6 +20,10 @@ class CBattleText(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.fetcher = Fetcher()
+
+    async def cog_unload(self):
+        await self.fetcher.close()
 
     @commands.command()
     @commands.is_owner()
@@ -25,18 +36,81 @@ class CBattleText(commands.Cog):
         reference: str
             The CBattle branch you want to run the installer on.
         """
-        link = "https://api.github.com/repos/Dotsian/CBattle/contents/CBattle/github/installer.py"
-
-        request = requests.get(link, {"ref": reference})
+        try:
+            result = await self.fetcher.get(INSTALLER_URL, {"ref": reference})
+        except FetchError as error:
+            await ctx.send(f"Could not reach GitHub: {error}\nUse `cbattleinstall` to install from a local copy.")
+            return
 
-        match request.status_code:
-            case requests.codes.not_found:
+        match result.status:
+            case HTTPStatus.NOT_FOUND:
                 await ctx.send(f"Could not find installer for the {reference} branch.")
 
-            case requests.codes.ok:
-                content = requests.get(link, {"ref": reference}).json()["content"]
+            case HTTPStatus.OK:
+                content = result.json()["content"]
 
                 await ctx.invoke(self.bot.get_command("eval"), body=base64.b64decode(content).decode())
 
             case _:
-                await ctx.send(f"Request raised error code `{request.status_code}`.")
+                await ctx.send(f"Request raised error code `{result.status}`.")
+
+    @commands.command()
+    @commands.is_owner()
+    async def cbattleversion(self, ctx: commands.Context):
+        """
+        Displays the installed CBattle version and the latest released one.
+        """
+        try:
+            result = await self.fetcher.get(RELEASE_URL)
+        except FetchError as error:
+            await ctx.send(f"CBattle {__version__} is installed. Could not check for updates: {error}")
+            return
+
+        if result.status != HTTPStatus.OK:
+            await ctx.send(f"CBattle {__version__} is installed. No release could be found.")
+            return
+
+        latest = result.json()["tag_name"].removeprefix("v")
+        status = "up to date" if latest == __version__ else f"the latest release is {latest}"
+
+        await ctx.send(f"CBattle {__version__} is installed, {status}.")
+
+    @commands.command()
+    @commands.is_owner()
+    async def cbattleinstall(self, ctx: commands.Context, *, path: str):
+        """
+        Installs CBattle from a folder or tarball on the host, for hosts that can't reach GitHub.
+
+        Parameters
+        ----------
+        path: str
+            A CBattle clone, its package folder, or a tarball of either, such as a GitHub source archive.
+        """
+        try:
+            source = await install_local(Path(path))
+        except (OSError, ValueError, tarfile.TarError) as error:
+            await ctx.send(f"Could not install CBattle: {error}")
+            return
+
+        await ctx.send(f"Installed CBattle from `{source}`, keeping the current config. Restart the bot to apply it.")
+
+    @commands.command()
+    @commands.is_owner()
+    async def cbattleplugins(self, ctx: commands.Context):
+        """
+        Displays the CBattle plugins and the time it took to import every plugin module loaded so far.
+        """
+        cog = self.bot.get_cog("Battle")
+
+        if cog is None:
+            await ctx.send("The battle cog is not loaded.")
+            return
+
+        plugins = cog.plugins
+        lines = [f"{len(plugins)} plugins discovered, {len(plugins.import_times)} modules imported."]
+
+        # Only the slowest modules are listed, so the message stays under Discord's length limit.
+        for module, seconds in plugins.report()[:20]:
+            lines.append(f"`{module}`: {seconds * 1000:.1f}ms")
+
+        await ctx.send("\n".join(lines))
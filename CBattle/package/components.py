@@ -1,16 +1,82 @@
+import functools
 from typing import TYPE_CHECKING
 
 import discord
 from discord.embeds import Embed
 from discord.ui import Button, View, button
 
-from ballsdex.core.models import Player
-
+from .battlelog import LogView
 from .logic import BattlePlayer, BattleState
+from .metrics import count_request, instrument
+from .pagination import TutorialPages
+from .profiler import profiler
+from .registry import BattleRegistry
+from .updater import EditScheduler
 
 if TYPE_CHECKING:
     from ballsdex.core.bot import BallsDexBot
 
+LOG_PAGE_SIZE = 10
+
+
+def battle_locked(callback):
+    """
+    Runs a callback of a battle view while holding the lock of its battle. Interactions of the same battle are
+    handled one after the other, while battles stay independent from each other.
+    """
+
+    @functools.wraps(callback)
+    async def wrapper(self, *args, **kwargs):
+        async with self.battle.lock:
+            self.battle.touch()
+            return await callback(self, *args, **kwargs)
+
+    return wrapper
+
+
+async def send_battle_log(battle: BattleState, first_round: int = 1):
+    """
+    Plays the rest of a battle at once and sends its log as a single paginated message. Rounds are rendered from
+    the battle log when their page is displayed.
+    """
+    winner = battle.play_out()
+    battle.end(winner)
+
+    records = [record for record in battle.log.records() if record.round_number >= first_round]
+    skipped = records[0].round_number - first_round if records else 0
+    chunks = [records[i : i + LOG_PAGE_SIZE] for i in range(0, len(records), LOG_PAGE_SIZE)] or [[]]
+
+    def make_page(page_num: int):
+        async def page():
+            lines = [record.render(battle) for record in chunks[page_num]] or ["No rounds were played."]
+
+            # Only the latest rounds of long battles are kept in the log.
+            if page_num == 0 and skipped:
+                lines.insert(0, f"*{skipped} earlier rounds are not shown.*")
+
+            embed = (
+                discord.Embed(
+                    title=f"Battle Log ({page_num + 1}/{len(chunks)})",
+                    description="\n".join(lines),
+                    color=discord.Color.red(),
+                )
+                .set_footer(text="CBattle")
+                .add_field(name=battle.player1.user.name, value=TurnView.get_battle_status(battle.player1), inline=True)
+                .add_field(name=battle.player2.user.name, value=TurnView.get_battle_status(battle.player2), inline=True)
+            )
+
+            return embed, None
+
+        return page
+
+    pages = [make_page(i) for i in range(len(chunks))]
+    embed, _ = await pages[-1]()
+
+    result = f"Battle finished! Winner: {winner.user.mention}" if winner else "Battle finished in a draw!"
+    await battle.channel.send(result, embed=embed, view=TutorialPages(pages, None) if len(pages) > 1 else None)
+    count_request("send")
+    profiler.finish(battle.id)
+
 
 class BattleStartView(View):
     """
@@ -25,36 +91,53 @@ class BattleStartView(View):
         self.target_player = target_player
 
         self.battle: BattleState = battle
-        self.battles: dict[Player, BattleState] = battles
+        self.battles: BattleRegistry = battles
 
+    @battle_locked
     async def on_timeout(self) -> None:
         for child in [x for x in self.children if isinstance(x, Button)]:
             child.disabled = True
 
-        if not self.battle.accepted:
+        if not self.battle.accepted and not self.battle.finished:
+            self.battle.finished = True
+
             embed = Embed()
             embed.description = "Battle request timed out."
             embed.set_footer(text="")
 
-            start_player, _ = await Player.get_or_create(discord_id=self.start_player.id)
-            del self.battles[start_player]
+            self.battles.remove(self.battle)
+            self.battle.recorder.ended()
+            profiler.finish(self.battle.id)
 
             await self.interaction.edit_original_response(embed=embed, view=self)
+            count_request("edit", "start_timeout")
 
         return await super().on_timeout()
 
     @button(style=discord.ButtonStyle.primary, label="Accept")
+    @instrument("accept")
+    @battle_locked
     async def accept_button(self, interaction: discord.Interaction["BallsDexBot"], button: Button):
         if interaction.user.id != self.target_player.id:
             await interaction.response.send_message("Only the target player can accept a battle!", ephemeral=True)
             return
 
+        if self.battles.get_battle(self.battle.id) is not self.battle:
+            await interaction.response.send_message("This battle request was cancelled.", ephemeral=True)
+            return
+
+        if self.battle.accepted or self.battle.finished:
+            await interaction.response.send_message("This battle request was already answered.", ephemeral=True)
+            return
+
         for child in [x for x in self.children if isinstance(x, Button)]:
             child.disabled = True
 
         if interaction.message is None:
             return
 
+        self.stop()
+
         embed = interaction.message.embeds[0]
         embed.set_footer(text="")
 
@@ -64,18 +147,20 @@ class BattleStartView(View):
             )
 
         await interaction.response.edit_message(embed=embed, view=self)
-        target_player, _ = await Player.get_or_create(discord_id=interaction.user.id)
 
         self.battle.accepted = True
-        self.battles[target_player] = self.battle
+        self.battle.recorder.accepted()
 
         view = BattleAcceptView(self.battle)
         self.battle.accept_view = view
 
         message = await self.battle.channel.send(view=view, embed=view.get_embed())
         view.message = message
+        count_request("send")
 
     @button(style=discord.ButtonStyle.red, label="Decline")
+    @instrument("decline")
+    @battle_locked
     async def decline_button(self, interaction: discord.Interaction["BallsDexBot"], button: Button):
         if interaction.user.id != self.target_player.id:
             await interaction.response.send_message("Only the target player can decline a battle!", ephemeral=True)
@@ -91,8 +176,10 @@ class BattleStartView(View):
         embed.description = "Battle declined!"
         embed.set_footer(text="")
 
-        start_player, _ = await Player.get_or_create(discord_id=self.start_player.id)
-        del self.battles[start_player]
+        self.battle.finished = True
+        self.battles.remove(self.battle)
+        self.battle.recorder.ended()
+        profiler.finish(self.battle.id)
 
         await interaction.response.edit_message(embed=embed, view=self)
 
@@ -101,7 +188,11 @@ class BattleAcceptView(View):
     def __init__(self, battle: BattleState):
         self.battle: BattleState = battle
         self.message: discord.Message
-        super().__init__()
+
+        # Battles can last longer than any fixed timeout, so the janitor stops the view once its battle expires.
+        super().__init__(timeout=None)
+
+        self.editor = EditScheduler(self.render, lambda **kwargs: self.message.edit(**kwargs))
 
     def get_embed(self) -> Embed:
         embed = (
@@ -112,12 +203,12 @@ class BattleAcceptView(View):
             )
             .add_field(
                 name=self.battle.player1.user.name + ("🔒" if self.battle.player1.locked else ""),
-                value="\n".join(" - " + ball.model.to_string() for ball in self.battle.player1.balls),
+                value="\n".join(" - " + ball.label for ball in self.battle.player1.balls),
                 inline=True,
             )
             .add_field(
                 name=self.battle.player2.user.name + ("🔒" if self.battle.player2.locked else ""),
-                value="\n".join(" - " + ball.model.to_string() for ball in self.battle.player2.balls),
+                value="\n".join(" - " + ball.label for ball in self.battle.player2.balls),
                 inline=True,
             )
         )
@@ -125,6 +216,8 @@ class BattleAcceptView(View):
         return embed
 
     @button(style=discord.ButtonStyle.green, label="🔒Lock")
+    @instrument("lock")
+    @battle_locked
     async def lock_button(self, interaction: discord.Interaction["BallsDexBot"], button: Button):
         battle_player = self.battle.get_user(interaction.user)
         if battle_player is None:
@@ -137,49 +230,101 @@ class BattleAcceptView(View):
             )
             return
 
+        if self.battle.started:
+            await interaction.response.send_message("This battle has already started.", ephemeral=True)
+            return
+
+        if self.battle.finished:
+            await interaction.response.send_message("This battle is already over.", ephemeral=True)
+            return
+
         battle_player.locked = True
+        self.battle.recorder.locked(self.battle.recorder.side(self.battle, battle_player))
         await interaction.response.send_message(f"{interaction.user.mention} locked!")
-        await self.update()
 
         if not (self.battle.player1.locked and self.battle.player2.locked):
+            await self.update()
             return
 
         self.battle.start()
 
         button.disabled = True
+        await self.editor.flush()
+        self.stop()
+
+        if self.battle.auto:
+            await send_battle_log(self.battle)
+            return
 
         view = TurnView(self.battle)
         message = await self.battle.channel.send('Press "Next Turn" to start the battle!', view=view)
         self.battle.last_turn = view
         view.message = message
+        count_request("send")
+
+    async def render(self) -> dict:
+        return {"embed": self.get_embed(), "view": self}
 
     async def update(self):
-        await self.message.edit(view=self, embed=self.get_embed())
+        self.editor.schedule()
 
 
 class TurnView(View):
     def __init__(self, battle: BattleState):
         self.battle: BattleState = battle
         self.message: discord.Message
-        super().__init__()
+        self.description: str | None = None
+        self.log_view = LogView(battle)
+        super().__init__(timeout=None)
+
+        self.editor = EditScheduler(self.render, lambda **kwargs: self.message.edit(**kwargs))
 
     async def cancel(self):
         for child in [x for x in self.children if isinstance(x, Button)]:
             child.disabled = True
 
-        await self.message.edit(view=self)
+        await self.editor.flush()
+        self.stop()
 
     @button(style=discord.ButtonStyle.green, label="Next Turn")
+    @instrument("next_turn")
+    @battle_locked
     async def next_turn_button(self, interaction: discord.Interaction["BallsDexBot"], button: Button):
+        if self.battle.finished:
+            await interaction.response.send_message("This battle is already over.", ephemeral=True)
+            return
+
         if self.battle.last_turn != self:
             await self.message.delete()
             await interaction.response.send_message("Oops, I am not supposed to exist", ephemeral=True)
+            return
 
         if interaction.user != self.battle.player1.user and interaction.user != self.battle.player2.user:
             await interaction.response.send_message("You're not a part of this battle.", ephemeral=True)
             return
         await self.next_turn(interaction)
 
+    @button(style=discord.ButtonStyle.primary, label="Auto")
+    @instrument("auto")
+    @battle_locked
+    async def auto_button(self, interaction: discord.Interaction["BallsDexBot"], button: Button):
+        if interaction.user != self.battle.player1.user and interaction.user != self.battle.player2.user:
+            await interaction.response.send_message("You're not a part of this battle.", ephemeral=True)
+            return
+
+        if self.battle.finished:
+            await interaction.response.send_message("This battle is already over.", ephemeral=True)
+            return
+
+        for child in [x for x in self.children if isinstance(x, Button)]:
+            child.disabled = True
+
+        await self.editor.respond(interaction)
+        await self.editor.flush()
+        self.stop()
+
+        await send_battle_log(self.battle, self.battle.round_number + 1)
+
     async def next_turn(self, interaction: discord.Interaction):
         # This works well, but until we have actual interactivity it's just annoying
         # Once abilities & attack choices are there, then we can uncomment the following block
@@ -189,15 +334,36 @@ class TurnView(View):
         #     return
 
         next_round = self.battle.next_round()
-        if isinstance(next_round, BattlePlayer):
-            await self.battle.channel.send(f"Battle finished! Winner: {next_round.user.mention}")
-            for child in [x for x in self.children if isinstance(x, Button)]:
-                child.disabled = True
+        self.description = self.log_view.update()
 
-        embed = (
+        if not isinstance(next_round, BattlePlayer):
+            await self.editor.respond(interaction)
+            return
+
+        self.description = "\n\n".join(filter(None, (self.description, f"**{next_round} won the battle!**")))
+
+        self.battle.end(next_round)
+        await self.battle.channel.send(f"Battle finished! Winner: {next_round.user.mention}")
+        count_request("send")
+        profiler.finish(self.battle.id)
+        for child in [x for x in self.children if isinstance(x, Button)]:
+            child.disabled = True
+
+        await self.editor.respond(interaction)
+        await self.editor.flush()
+        self.stop()
+
+    async def render(self) -> dict:
+        if self.description is None:
+            return {"view": self}
+
+        return {"content": "", "embed": self.get_embed(), "view": self}
+
+    def get_embed(self) -> Embed:
+        return (
             discord.Embed(
                 title=f"{self.battle.active_player.user.name}'s Turn! ({self.battle.round_number})",
-                description=next_round,
+                description=self.description,
             )
             .set_footer(text="CBattle")
             .add_field(
@@ -207,15 +373,15 @@ class TurnView(View):
                 name=self.battle.player2.user.name, value=self.get_battle_status(self.battle.player2), inline=True
             )
         )
-        await interaction.response.edit_message(content="", embed=embed, view=self)
 
-    def get_battle_status(self, player: BattlePlayer) -> str:
+    @staticmethod
+    def get_battle_status(player: BattlePlayer) -> str:
         lines = []
         for ball in player.balls:
             if ball.dead:
                 status = "💀"
             else:
                 status = f"❤️ {ball.health} | ⚔️ {ball.attack}"
-            lines.append(f"- {ball.model.countryball.country} ({status})")
+            lines.append(f"- {ball.name} ({status})")
 
         return "\n".join(lines)
@@ -1,24 +1,255 @@
+import asyncio
+import logging
 import os
 import tomllib
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping
 
+from .templates import PLACEHOLDERS, MessageTemplate, compile_messages
 
+log = logging.getLogger(__name__)
+
+# Expected type and default value of every key of the `settings` table.
+SETTINGS_SCHEMA: dict[str, tuple[type | tuple[type, ...], Any]] = {
+    "max-ball-amount": (int, 5),
+    "debug": (bool, False),
+    "edit-window": ((int, float), 1.0),
+    "reload-interval": ((int, float), 5.0),
+    "event-log": (str, ""),
+    "metrics-port": (int, 0),
+    "battle-timeout": ((int, float), 900.0),
+    "history-database": (str, ""),
+    "coordination-url": (str, ""),
+    "log-export": (str, ""),
+}
+
+# Settings naming files created at runtime next to the package, which installs must never copy or overwrite, with
+# the name suggested for them in `config.toml`. Every one of them is disabled by default.
+FILE_SETTINGS = {"event-log": "battles.log", "history-database": "history.sqlite3", "log-export": "battle-logs.jsonl"}
+
+MESSAGE_KINDS = ("attack", "defeat", "dodge")
+
+# Stats a config attribute can modify. Health and attack are changed by a percentage of the ball's stat, like the
+# bonuses of a ball instance, while evasion and crit chance are added to the ball's chances.
+MODIFIER_STATS = ("health", "attack", "evasion", "crit-chance")
+
+
+class ConfigError(ValueError):
+    """
+    Raised when the `config.toml` file doesn't match the expected schema.
+    """
+
+
+def _validate(data: dict[str, Any]):
+    unknown = set(data) - {"settings", "attributes", "modifiers", "messages"}
+    if unknown:
+        raise ConfigError(f"Unknown config tables: {', '.join(sorted(unknown))}.")
+
+    for table, value in data.items():
+        if not isinstance(value, dict):
+            raise ConfigError(f"`{table}` must be a table.")
+
+    settings = data.get("settings", {})
+    for key, value in settings.items():
+        if key not in SETTINGS_SCHEMA:
+            raise ConfigError(f"Unknown setting `{key}`.")
+
+        expected, _ = SETTINGS_SCHEMA[key]
+
+        # `bool` is a subclass of `int`, so it has to be excluded explicitly from numeric settings.
+        if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+            raise ConfigError(f"Setting `{key}` has an invalid value: {value!r}.")
+
+    if settings.get("max-ball-amount", 1) < 1:
+        raise ConfigError("Setting `max-ball-amount` must be at least 1.")
+
+    if not 0 <= settings.get("metrics-port", 0) <= 65535:
+        raise ConfigError("Setting `metrics-port` must be a port number, or 0 to disable metrics.")
+
+    if settings.get("battle-timeout", 0) < 0:
+        raise ConfigError("Setting `battle-timeout` can't be negative.")
+
+    coordination_url = settings.get("coordination-url", "")
+    if coordination_url and not coordination_url.startswith("redis://"):
+        raise ConfigError("Setting `coordination-url` must be a `redis://` URL, or empty to coordinate in memory.")
+
+    for name, balls in data.get("attributes", {}).items():
+        if not isinstance(balls, list) or not all(isinstance(ball, str) for ball in balls):
+            raise ConfigError(f"Attribute `{name}` must be a list of names.")
+
+    for name, modifiers in data.get("modifiers", {}).items():
+        if name not in data.get("attributes", {}):
+            raise ConfigError(f"Modifiers are set for `{name}`, which isn't an attribute.")
+
+        if not isinstance(modifiers, dict):
+            raise ConfigError(f"The modifiers of `{name}` must be a table.")
+
+        for stat, value in modifiers.items():
+            if stat not in MODIFIER_STATS:
+                raise ConfigError(f"Unknown stat `{stat}` in the modifiers of `{name}`.")
+
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise ConfigError(f"Modifier `{stat}` of `{name}` has an invalid value: {value!r}.")
+
+    messages = data.get("messages", {})
+    for kind in MESSAGE_KINDS:
+        kind_messages = messages.get(kind)
+
+        if not kind_messages:
+            raise ConfigError(f"At least one {kind} message must be set in the config.")
+
+        if not isinstance(kind_messages, list) or not all(isinstance(message, str) for message in kind_messages):
+            raise ConfigError(f"The {kind} messages must be a list of strings.")
+
+
+@dataclass(frozen=True)
 class Config:
     """
     Configuration class for holding all config values loaded from the `config.toml` file.
+
+    Configs are immutable snapshots: reloading the file creates a new `Config`, so anything holding on to a
+    snapshot keeps using the values it started with.
     """
 
-    def __init__(self, path: Path):
+    version: int
+    max_ball_amount: int
+    debug: bool
+    edit_window: float
+    reload_interval: float
+    event_log: str
+    metrics_port: int
+    battle_timeout: float
+    history_database: str
+    coordination_url: str
+    log_export: str
+    attributes: Mapping[str, tuple[str, ...]]
+    modifiers: Mapping[str, Mapping[str, float]]
+    attack_messages: tuple[MessageTemplate, ...]
+    defeat_messages: tuple[MessageTemplate, ...]
+    dodge_messages: tuple[MessageTemplate, ...]
+
+    @classmethod
+    def load(cls, path: Path, version: int = 1) -> "Config":
+        """
+        Loads and validates a config file, raising a `ConfigError` if it's invalid.
+        """
         with path.open("rb") as config_file:
-            data = tomllib.load(config_file)
+            try:
+                data = tomllib.load(config_file)
+            except (tomllib.TOMLDecodeError, UnicodeDecodeError) as error:
+                raise ConfigError(f"Invalid TOML: {error}") from error
+
+        _validate(data)
+
+        settings = {key: data.get("settings", {}).get(key, default) for key, (_, default) in SETTINGS_SCHEMA.items()}
+        messages = data["messages"]
 
-        self.max_ball_amount = data["settings"].get("max-ball-amount", 5)
-        self.debug = data["settings"].get("debug", False)
-        self.attributes = data.get("attributes", {})
-        self.attack_messages = data["messages"].get("attack", [])
-        self.defeat_messages = data["messages"].get("defeat", [])
-        self.dodge_messages = data["messages"].get("dodge", [])
+        # Messages are compiled once here, so invalid placeholders are reported when the file is loaded.
+        try:
+            attack_messages = compile_messages(messages["attack"])
+            defeat_messages = compile_messages(messages["defeat"])
+            dodge_messages = compile_messages(messages["dodge"], [name for name in PLACEHOLDERS if name != "dmg"])
+        except ValueError as error:
+            raise ConfigError(str(error)) from error
+
+        return cls(
+            version=version,
+            max_ball_amount=settings["max-ball-amount"],
+            debug=settings["debug"],
+            edit_window=float(settings["edit-window"]),
+            reload_interval=float(settings["reload-interval"]),
+            event_log=settings["event-log"],
+            metrics_port=settings["metrics-port"],
+            battle_timeout=float(settings["battle-timeout"]),
+            history_database=settings["history-database"],
+            coordination_url=settings["coordination-url"],
+            log_export=settings["log-export"],
+            attributes=MappingProxyType({name: tuple(balls) for name, balls in data.get("attributes", {}).items()}),
+            modifiers=MappingProxyType(
+                {
+                    name: MappingProxyType({stat: float(value) for stat, value in modifiers.items()})
+                    for name, modifiers in data.get("modifiers", {}).items()
+                }
+            ),
+            attack_messages=tuple(attack_messages),
+            defeat_messages=tuple(defeat_messages),
+            dodge_messages=tuple(dodge_messages),
+        )
 
 
 CONFIG_PATH = Path(os.path.dirname(os.path.abspath(__file__)), "./config.toml")
-config = Config(CONFIG_PATH)
+config = Config.load(CONFIG_PATH)
+
+
+def get_config() -> Config:
+    """
+    Returns the current config snapshot.
+    """
+    return config
+
+
+def reload_config(path: Path = CONFIG_PATH) -> Config:
+    """
+    Loads the config file again and swaps it in as the current snapshot. The current snapshot is kept if the file
+    is invalid, in which case a `ConfigError` is raised.
+    """
+    global config
+
+    config = Config.load(path, config.version + 1)
+    return config
+
+
+class ConfigWatcher:
+    """
+    Polls the modification time of the config file and reloads it whenever it changes.
+    """
+
+    def __init__(self, path: Path = CONFIG_PATH):
+        self.path = path
+        self.task: asyncio.Task | None = None
+        self._mtime = self._stat()
+
+    def _stat(self) -> int | None:
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._watch())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def check(self) -> bool:
+        """
+        Reloads the config if the file changed since the last check. Returns true if a new snapshot was swapped in.
+        """
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return False
+
+        self._mtime = mtime
+
+        try:
+            new_config = reload_config(self.path)
+        except (ConfigError, OSError) as error:
+            log.error(f"Could not reload the CBattle config, keeping version {config.version}: {error}")
+            return False
+        except Exception:
+            # Anything escaping here would stop the watcher, and with it every later reload.
+            log.exception(f"Could not reload the CBattle config, keeping version {config.version}")
+            return False
+
+        log.info(f"Reloaded the CBattle config (version {new_config.version}).")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(config.reload_interval)
+            self.check()
@@ -0,0 +1,498 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Iterable, Sequence
+from urllib.parse import unquote, urlsplit
+
+if TYPE_CHECKING:
+    from .logic import BattleState
+
+log = logging.getLogger(__name__)
+
+KEY_PREFIX = "cbattle:player:"
+
+# Deletes every key of KEYS still holding the token at the same index in ARGV, returning the amount deleted.
+RELEASE_SCRIPT = """
+local released = 0
+for i, key in ipairs(KEYS) do
+    if redis.call("GET", key) == ARGV[i] then
+        released = released + redis.call("DEL", key)
+    end
+end
+return released
+"""
+
+# Extends to ARGV[1] milliseconds the lease of every key of KEYS still holding the token at the next index in ARGV,
+# returning 1 for every key extended and 0 for the others.
+RENEW_SCRIPT = """
+local renewed = {}
+for i, key in ipairs(KEYS) do
+    if redis.call("GET", key) == ARGV[i + 1] then
+        renewed[i] = redis.call("PEXPIRE", key, ARGV[1])
+    else
+        renewed[i] = 0
+    end
+end
+return renewed
+"""
+
+# How long a reservation lasts without being renewed, in seconds. Reservations of a process that stopped without
+# releasing them expire after this delay.
+LEASE = 60.0
+
+
+class CoordinationError(Exception):
+    """
+    Raised when the coordination backend can't be reached, or rejects a command.
+    """
+
+
+@dataclass(frozen=True, slots=True)
+class Reservation:
+    """
+    Process holding a player, and the battle the player is reserved for.
+    """
+
+    node: str
+    battle_id: int
+
+    @property
+    def token(self) -> str:
+        return f"{self.node}/{self.battle_id}"
+
+    @classmethod
+    def parse(cls, token: str) -> Reservation:
+        node, _, battle_id = token.rpartition("/")
+        return cls(node, int(battle_id))
+
+
+def default_node(shard_ids: Iterable[int] | None = None) -> str:
+    """
+    Returns a name for this process, which stays the same across restarts so battles restored from the event log
+    can claim their reservations back.
+    """
+    shards = ",".join(map(str, sorted(shard_ids))) if shard_ids else "0"
+    return f"{socket.gethostname()}:{shards}"
+
+
+def _user_ids(battle: BattleState) -> tuple[int, int]:
+    return battle.player1.user.id, battle.player2.user.id
+
+
+class Coordinator:
+    """
+    Base class of the backends reserving players across every process running the bot, so a player can only be
+    part of one battle even when battles are started on different shards.
+
+    Players are reserved for a lease of `lease` seconds, which is renewed every `interval` seconds while their
+    battle is registered in this process, and released once the battle finishes or is removed.
+    """
+
+    def __init__(
+        self, node: str, lease: float = LEASE, interval: float = 1.0, clock: Callable[[], float] = time.monotonic
+    ):
+        self.node = node
+        self.lease = lease
+        self.interval = interval
+        self.clock = clock
+        self.task: asyncio.Task | None = None
+
+        # Battles whose players are reserved by this process, by battle ID.
+        self.leases: dict[int, BattleState] = {}
+        self._renewed = clock()
+
+    def reservation(self, battle: BattleState) -> Reservation:
+        return Reservation(self.node, battle.id)
+
+    async def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._keep())
+
+    async def stop(self):
+        """
+        Releases every reservation of this process.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        for battle in list(self.leases.values()):
+            self.drop(battle)
+
+        await self.flush()
+
+    async def reserve(self, battle: BattleState) -> bool:
+        """
+        Reserves both players of a battle at once. Returns false without reserving anyone if either player is
+        reserved by another battle, in any process. Reserving a battle again, like after a restart, succeeds.
+        """
+        if not await self._reserve(_user_ids(battle), self.reservation(battle).token):
+            return False
+
+        self.leases[battle.id] = battle
+        return True
+
+    def drop(self, battle: BattleState):
+        """
+        Releases the players of a battle reserved by this process. Called when the battle leaves the registry.
+        """
+        if self.leases.get(battle.id) is not battle:
+            return
+
+        del self.leases[battle.id]
+        self._release(_user_ids(battle), self.reservation(battle).token)
+
+    async def lookup(self, user_id: int) -> Reservation | None:
+        """
+        Returns the reservation of a player, whichever process holds it.
+        """
+        raise NotImplementedError
+
+    async def flush(self):
+        """
+        Releases the players of finished battles, and renews the other reservations once a third of the lease
+        passed since they were last renewed.
+        """
+        for battle in [battle for battle in self.leases.values() if battle.finished]:
+            self.drop(battle)
+
+        now = self.clock()
+        if now - self._renewed < self.lease / 3:
+            return
+
+        self._renewed = now
+        leases = [(_user_ids(battle), self.reservation(battle).token) for battle in self.leases.values()]
+
+        for battle_id in await self._renew(leases):
+            log.warning(f"The players of battle {battle_id} were reserved by another process after their lease expired")
+
+    async def _reserve(self, user_ids: Sequence[int], token: str) -> bool:
+        raise NotImplementedError
+
+    def _release(self, user_ids: Sequence[int], token: str):
+        raise NotImplementedError
+
+    async def _renew(self, leases: list[tuple[Sequence[int], str]]) -> list[int]:
+        """
+        Extends the given reservations, returning the battle IDs of those that were lost.
+        """
+        raise NotImplementedError
+
+    async def _keep(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await self.flush()
+            except CoordinationError as error:
+                log.warning(f"Could not renew battle reservations: {error}")
+
+
+class LocalCoordinator(Coordinator):
+    """
+    Keeps reservations in memory, for a bot running in a single process.
+    """
+
+    def __init__(
+        self, node: str, lease: float = LEASE, interval: float = 1.0, clock: Callable[[], float] = time.monotonic
+    ):
+        super().__init__(node, lease, interval, clock)
+
+        # Discord ID of a player -> token of their reservation and monotonic time it expires at.
+        self._reservations: dict[int, tuple[str, float]] = {}
+
+    def _holder(self, user_id: int) -> str | None:
+        reservation = self._reservations.get(user_id)
+
+        if reservation is None or reservation[1] <= self.clock():
+            return None
+
+        return reservation[0]
+
+    async def lookup(self, user_id: int) -> Reservation | None:
+        token = self._holder(user_id)
+        return Reservation.parse(token) if token is not None else None
+
+    async def _reserve(self, user_ids: Sequence[int], token: str) -> bool:
+        if any(self._holder(user_id) not in (None, token) for user_id in user_ids):
+            return False
+
+        expires = self.clock() + self.lease
+        for user_id in user_ids:
+            self._reservations[user_id] = (token, expires)
+
+        return True
+
+    def _release(self, user_ids: Sequence[int], token: str):
+        for user_id in user_ids:
+            if self._holder(user_id) == token:
+                del self._reservations[user_id]
+
+    async def _renew(self, leases: list[tuple[Sequence[int], str]]) -> list[int]:
+        lost = []
+        expires = self.clock() + self.lease
+
+        for user_ids, token in leases:
+            if not all(self._holder(user_id) == token for user_id in user_ids):
+                lost.append(Reservation.parse(token).battle_id)
+                continue
+
+            for user_id in user_ids:
+                self._reservations[user_id] = (token, expires)
+
+        return lost
+
+
+class RespClient:
+    """
+    Minimal client of the Redis serialization protocol over a single connection.
+
+    Commands are written as soon as they are sent and their replies are read in order by a background task, so
+    concurrent callers share the connection and their commands are pipelined instead of waiting for each other.
+    """
+
+    def __init__(self, host: str, port: int, password: str | None = None, db: int = 0, timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.timeout = timeout
+
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.task: asyncio.Task | None = None
+        self.pending: deque[asyncio.Future] = deque()
+        self._connecting = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def connect(self):
+        async with self._connecting:
+            if self.connected:
+                return
+
+            if self.writer is not None:
+                self.writer.close()
+
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout
+                )
+            except (OSError, asyncio.TimeoutError) as error:
+                raise CoordinationError(f"Could not connect to {self.host}:{self.port}: {error}") from error
+
+            self.task = asyncio.create_task(self._read_replies())
+
+            if self.password:
+                await self.execute("AUTH", self.password)
+            if self.db:
+                await self.execute("SELECT", self.db)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        self._fail(CoordinationError("The connection was closed."))
+
+    async def execute(self, *args: str | int | bytes):
+        (reply,) = await self.pipeline(args)
+        return reply
+
+    async def pipeline(self, *commands: Sequence[str | int | bytes]) -> list:
+        """
+        Sends several commands at once, and returns their replies. Raises a `CoordinationError` if any of them
+        failed.
+        """
+        if not self.connected:
+            await self.connect()
+
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in commands]
+
+        self.pending.extend(futures)
+        self.writer.write(b"".join(self._encode(command) for command in commands))
+
+        try:
+            await asyncio.wait_for(self.writer.drain(), self.timeout)
+            return list(await asyncio.wait_for(asyncio.gather(*futures), self.timeout))
+        except (OSError, asyncio.TimeoutError) as error:
+            # Replies would be matched with the wrong commands after a timeout, so the connection is dropped.
+            await self.close()
+            raise CoordinationError(f"No reply from {self.host}:{self.port}: {error}") from error
+
+    @staticmethod
+    def _encode(command: Sequence[str | int | bytes]) -> bytes:
+        parts = [f"*{len(command)}\r\n".encode()]
+
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("The connection was closed.")
+
+        kind, data = line[:1], line[1:-2]
+
+        if kind == b"+":
+            return data.decode()
+        if kind == b"-":
+            return CoordinationError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            length = int(data)
+            return None if length < 0 else (await self.reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(data)
+            return None if length < 0 else [await self._read_reply() for _ in range(length)]
+
+        raise ConnectionError(f"Unexpected reply: {line!r}")
+
+    async def _read_replies(self):
+        try:
+            while True:
+                reply = await self._read_reply()
+                future = self.pending.popleft()
+
+                if future.done():
+                    continue
+
+                if isinstance(reply, CoordinationError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except (OSError, EOFError, ConnectionError, IndexError, ValueError) as error:
+            self._fail(CoordinationError(f"Lost the connection to {self.host}:{self.port}: {error}"))
+
+    def _fail(self, error: CoordinationError):
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+
+class RedisCoordinator(Coordinator):
+    """
+    Keeps reservations in a Redis server shared by every process, with one key per player holding the token of
+    the battle reserving them and expiring with the lease.
+
+    Both players are reserved with `SET NX` in a single pipeline, and a player that was already taken makes the
+    other one be released again, so no battle ever holds a single player. Releases are buffered, and written with
+    the next flush or reservation. Keys are only released or renewed by scripts checking their token, so a lease
+    that expired and was taken by another process in the meantime is never touched.
+    """
+
+    def __init__(
+        self,
+        client: RespClient,
+        node: str,
+        lease: float = LEASE,
+        interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(node, lease, interval, clock)
+        self.client = client
+        self.releases: list[tuple[Sequence[int], str]] = []
+
+    @classmethod
+    def from_url(cls, url: str, node: str) -> RedisCoordinator:
+        parts = urlsplit(url)
+        db = parts.path.strip("/")
+        password = unquote(parts.password) if parts.password else None
+
+        return cls(RespClient(parts.hostname or "localhost", parts.port or 6379, password, int(db or 0)), node)
+
+    async def start(self):
+        # Reservations are renewed even if the server can't be reached yet, as every command reconnects.
+        await super().start()
+        await self.client.connect()
+
+    async def stop(self):
+        try:
+            await super().stop()
+        except CoordinationError as error:
+            log.warning(f"Could not release battle reservations, they will expire with their lease: {error}")
+        finally:
+            await self.client.close()
+
+    async def flush(self):
+        await super().flush()
+        await self._write_releases()
+
+    async def lookup(self, user_id: int) -> Reservation | None:
+        token = await self.client.execute("GET", KEY_PREFIX + str(user_id))
+        return Reservation.parse(token.decode()) if token is not None else None
+
+    async def _reserve(self, user_ids: Sequence[int], token: str) -> bool:
+        # Players freed by this process must be released before they can be reserved again.
+        await self._write_releases()
+
+        keys = [KEY_PREFIX + str(user_id) for user_id in user_ids]
+        lease = int(self.lease * 1000)
+
+        replies = await self.client.pipeline(*(("SET", key, token, "NX", "PX", lease) for key in keys))
+        taken = [key for key, reply in zip(keys, replies) if reply is None]
+
+        if not taken:
+            return True
+
+        # Keys already holding this token were reserved by the same battle before a restart.
+        renewed = await self._eval(RENEW_SCRIPT, taken, [lease, token])
+
+        if all(renewed):
+            return True
+
+        await self._eval(RELEASE_SCRIPT, keys, [token] * len(keys))
+        return False
+
+    def _release(self, user_ids: Sequence[int], token: str):
+        self.releases.append((user_ids, token))
+
+    async def _eval(self, script: str, keys: Sequence[str], args: Sequence[str | int]):
+        return await self.client.execute("EVAL", script, len(keys), *keys, *args)
+
+    async def _write_releases(self):
+        if not self.releases:
+            return
+
+        releases, self.releases = self.releases, []
+        keys = [KEY_PREFIX + str(user_id) for user_ids, _ in releases for user_id in user_ids]
+        tokens = [token for user_ids, token in releases for _ in user_ids]
+
+        await self._eval(RELEASE_SCRIPT, keys, tokens)
+
+    async def _renew(self, leases: list[tuple[Sequence[int], str]]) -> list[int]:
+        if not leases:
+            return []
+
+        keys = [KEY_PREFIX + str(user_id) for user_ids, _ in leases for user_id in user_ids]
+        tokens = [token for user_ids, token in leases for _ in user_ids]
+
+        renewed = await self._eval(RENEW_SCRIPT, keys, [int(self.lease * 1000), *tokens])
+        return sorted({Reservation.parse(token).battle_id for token, ok in zip(tokens, renewed) if not ok})
+
+
+def create_coordinator(url: str, node: str) -> Coordinator:
+    """
+    Creates the coordinator for the `coordination-url` setting, which keeps reservations in memory when empty.
+    """
+    if not url:
+        return LocalCoordinator(node)
+
+    return RedisCoordinator.from_url(url, node)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable
+
+from ballsdex.core.models import BallInstance
+
+from .config import get_config
+from .logic import BattleBall
+from .stats import StatResolver
+
+if TYPE_CHECKING:
+    from ballsdex.core.bot import BallsDexBot
+
+    from .logic import BattlePlayer
+    from .plugins import PluginRegistry
+
+
+class DeckLoader:
+    """
+    Builds `BattleBall` instances for a deck, resolving every display value once so that embeds can be rendered
+    without any database or cache lookups.
+    """
+
+    def __init__(self, bot: BallsDexBot, plugins: PluginRegistry | None = None, stats: StatResolver | None = None):
+        self.bot = bot
+        self.plugins = plugins
+        self.stats = stats or StatResolver()
+
+    def build(self, ballinstance: BallInstance, owner: BattlePlayer) -> BattleBall:
+        """
+        Creates a `BattleBall` from a ball instance that has already been fetched with its related data. Its stats
+        come from the stat cache, and the plugin modules of the ball's abilities are imported at this point, the
+        first time a ball using them joins a battle.
+        """
+        emoji = self.bot.get_emoji(ballinstance.countryball.emoji_id)
+        stats = self.stats.resolve(ballinstance)
+        ball = BattleBall.from_ballinstance(ballinstance, owner, emoji=str(emoji) if emoji else "", stats=stats)
+
+        if self.plugins is not None:
+            abilities = self.plugins.abilities_for(ball.name, get_config().attributes)
+            ball.abilities = [ability(ball) for ability in abilities]
+
+        return ball
+
+    async def load(self, owner: BattlePlayer, instance_ids: Iterable[int]) -> list[BattleBall]:
+        """
+        Fetches every selected ball instance owned by a player with their countryball and special in one query.
+        Balls are returned in the order of `instance_ids`, skipping IDs that don't belong to the player.
+        """
+        instance_ids = list(dict.fromkeys(instance_ids))
+
+        if not instance_ids:
+            return []
+
+        instances = await BallInstance.filter(id__in=instance_ids, player_id=owner.model.pk).prefetch_related(
+            "ball", "special"
+        )
+        instances_by_id = {instance.pk: instance for instance in instances}
+
+        return [
+            self.build(instances_by_id[instance_id], owner)
+            for instance_id in instance_ids
+            if instance_id in instances_by_id
+        ]
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Mapping, Sequence
+
+import discord
+
+ASSETS_PATH = Path(__file__).parent / "assets"
+
+
+class AssetCache:
+    """
+    Reads the images of the `assets` folder once, and hands out attachments of them from memory.
+    """
+
+    def __init__(self, directory: Path = ASSETS_PATH):
+        self.directory = directory
+        self._data: dict[str, bytes | None] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def get(self, name: str) -> bytes | None:
+        """
+        Returns the content of an asset, or `None` if it doesn't exist. Missing assets are remembered as well.
+        """
+        if name not in self._data:
+            try:
+                self._data[name] = (self.directory / name).read_bytes()
+            except OSError:
+                self._data[name] = None
+
+        return self._data[name]
+
+    def file(self, name: str) -> discord.File | None:
+        """
+        Returns a new attachment of an asset. Attachments are consumed when they are sent, so one is needed per
+        message, but the asset is only read from the disk once.
+        """
+        data = self.get(name)
+        return discord.File(io.BytesIO(data), filename=name) if data is not None else None
+
+
+@dataclass(frozen=True, slots=True)
+class StaticPage:
+    """
+    A page whose embed is built once and shared by every view displaying it, so the embed must never be modified.
+    """
+
+    embed: discord.Embed
+    asset: str | None = None
+    assets: AssetCache | None = None
+
+    async def __call__(self) -> tuple[discord.Embed, discord.File | None]:
+        if self.asset is None or self.assets is None:
+            return self.embed, None
+
+        return self.embed, self.assets.file(self.asset)
+
+
+def build_tutorial(
+    chapters: Mapping[str, str], thumbnails: Sequence[str], assets: AssetCache
+) -> tuple[StaticPage, ...]:
+    """
+    Builds the pages of the tutorial, whose thumbnails are the names of files of the `assets` folder. Raises a
+    `FileNotFoundError` if any of them is missing, so the cog fails to load instead of sending broken embeds.
+    """
+    pages = []
+
+    for index, ((title, description), asset) in enumerate(zip(chapters.items(), thumbnails)):
+        if asset not in assets:
+            raise FileNotFoundError(f"The tutorial thumbnail {asset} is missing from {assets.directory}.")
+
+        embed = discord.Embed(
+            title=f"Tutorial Page {index + 1}: {title}", description=description, color=discord.Color.red()
+        )
+        embed.set_thumbnail(url=f"attachment://{asset}")
+        pages.append(StaticPage(embed, asset, assets))
+
+    return tuple(pages)
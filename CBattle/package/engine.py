@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import heapq
+from enum import Enum
+from itertools import count
+from typing import TYPE_CHECKING, Type, TypeVar
+
+from .base import BaseEffect
+
+if TYPE_CHECKING:
+    from .logic import BattleBall
+    from .rng import BattleRNG
+
+E = TypeVar("E", bound=BaseEffect)
+
+
+class Hook(Enum):
+    ROUND_START = "round_passed"
+    CHOOSE_BALL = "choose_ball"
+    ATTACK = "fetch_damage"
+    DAMAGE = "modify_damage"
+
+
+def _hooks(effect_type: Type[BaseEffect]) -> tuple[Hook, ...]:
+    """
+    Returns the hooks an effect class overrides. Effects are only registered for these, so an effect that doesn't
+    change damage is never consulted when damage is computed.
+    """
+    return tuple(hook for hook in Hook if getattr(effect_type, hook.value) is not getattr(BaseEffect, hook.value))
+
+
+class EffectEngine:
+    """
+    Keeps track of the effects applied during a battle.
+
+    Effects are indexed per hook and per ball, so every dispatch only visits the effects that override the hook,
+    and expiry is kept in a min-heap keyed by round number. Effects can be applied or removed from within any
+    hook: dispatches iterate over a snapshot and skip effects that were removed in the meantime.
+    """
+
+    __slots__ = ("round_number", "active", "_registries", "_expiry", "_order", "_hook_cache")
+
+    def __init__(self):
+        self.round_number = 0
+        self.active = 0
+
+        # Hook -> ID of the ball -> effects of the ball overriding the hook, by ID. Dictionaries keep the effects in
+        # the order they were applied while removing them in constant time, and subclasses declared with a plain
+        # `@dataclass` aren't hashable, so effects are keyed by their ID.
+        self._registries: dict[Hook, dict[int, dict[int, BaseEffect]]] = {hook: {} for hook in Hook}
+        self._expiry: list[tuple[int, int, BaseEffect]] = []
+        self._order = count()
+        self._hook_cache: dict[type, tuple[Hook, ...]] = {}
+
+    def __len__(self) -> int:
+        return self.active
+
+    def apply(self, ball: BattleBall, effect_type: Type[E], rounds: int) -> E:
+        """
+        Applies an effect to a ball for the given amount of rounds, counted from the current round.
+        """
+        effect = effect_type(ball, rounds, applied_round=self.round_number)
+
+        hooks = self._hook_cache.get(effect_type)
+        if hooks is None:
+            hooks = self._hook_cache[effect_type] = _hooks(effect_type)
+
+        for hook in hooks:
+            self._registries[hook].setdefault(id(ball), {})[id(effect)] = effect
+
+        ball.effects[id(effect)] = effect
+        self.active += 1
+        heapq.heappush(self._expiry, (effect.expires_round, next(self._order), effect))
+
+        return effect
+
+    def remove(self, effect: BaseEffect):
+        """
+        Removes an effect before it expires. Its entry in the expiry heap is dropped once it reaches the top.
+        """
+        if not effect.active:
+            return
+
+        effect.active = False
+        del effect.ball.effects[id(effect)]
+        self.active -= 1
+
+        for hook in self._hook_cache[type(effect)]:
+            registry = self._registries[hook]
+            effects = registry[id(effect.ball)]
+            del effects[id(effect)]
+
+            if not effects:
+                del registry[id(effect.ball)]
+
+        effect.on_expire()
+
+    def start_round(self, round_number: int, balls: list[BattleBall]):
+        """
+        Expires the effects that ran out before the given round, then dispatches the round start to the effects
+        of the given balls.
+        """
+        self.round_number = round_number
+        expiry = self._expiry
+
+        while expiry and expiry[0][0] <= round_number:
+            _, _, effect = heapq.heappop(expiry)
+            self.remove(effect)
+
+        registry = self._registries[Hook.ROUND_START]
+        if not registry:
+            return
+
+        for ball in balls:
+            for effect in tuple(registry.get(id(ball), {}).values()):
+                if effect.active:
+                    effect.round_passed(round_number)
+
+    def choosable(self, ball: BattleBall) -> bool:
+        for effect in tuple(self._registries[Hook.CHOOSE_BALL].get(id(ball), {}).values()):
+            if effect.active and not effect.choose_ball():
+                return False
+
+        return True
+
+    def choose(self, balls: list[BattleBall], rng: BattleRNG) -> int:
+        """
+        Picks the index of the ball attacking this round, among the balls none of the effects prevent from being
+        chosen. If every ball is prevented, any of them can be picked.
+        """
+        if not self._registries[Hook.CHOOSE_BALL]:
+            return rng.pick(len(balls))
+
+        indices = [index for index, ball in enumerate(balls) if self.choosable(ball)] or range(len(balls))
+        return indices[rng.pick(len(indices))]
+
+    def attack(self, ball: BattleBall, target: BattleBall) -> int:
+        """
+        Returns the attack stat of a ball against a target. When several effects change it, the last one applied
+        takes precedence.
+        """
+        effects = self._registries[Hook.ATTACK].get(id(ball))
+        if not effects:
+            return ball.attack
+
+        for effect in reversed(tuple(effects.values())):
+            if effect.active:
+                return effect.fetch_damage(target)
+
+        return ball.attack
+
+    def damage(self, ball: BattleBall, target: BattleBall, damage: int) -> int:
+        """
+        Passes the damage dealt by a ball through every effect modifying it, in the order they were applied.
+        """
+        effects = self._registries[Hook.DAMAGE].get(id(ball))
+        if not effects:
+            return damage
+
+        for effect in tuple(effects.values()):
+            if effect.active:
+                damage = effect.modify_damage(damage, target)
+
+        return damage
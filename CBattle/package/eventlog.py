@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from enum import IntEnum
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterator
+
+from .writer import FileWriter
+
+if TYPE_CHECKING:
+    from .logic import AttackResult, BattlePlayer, BattleState
+
+# Every frame is a header with the length and CRC32 of its body, followed by the body itself. The body starts with
+# the event type and the battle ID, followed by the payload of the event.
+FRAME_HEADER = struct.Struct("<II")
+BODY_HEADER = struct.Struct("<BQ")
+
+CREATE = struct.Struct("<QQQBQ")
+BALL = struct.Struct("<BQ")
+SIDE = struct.Struct("<B")
+ROUND = struct.Struct("<IBBqB")
+
+CRIT = 1 << 0
+DODGED = 1 << 1
+KILLED = 1 << 2
+
+
+class EventType(IntEnum):
+    CREATE = 1
+    ACCEPT = 2
+    ADD_BALL = 3
+    REMOVE_BALL = 4
+    LOCK = 5
+    ROUND = 6
+    END = 7
+
+
+def encode(event_type: EventType, battle_id: int, payload: bytes = b"") -> bytes:
+    body = BODY_HEADER.pack(event_type, battle_id) + payload
+    return FRAME_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def read_frames(file: BinaryIO) -> Iterator[tuple[EventType, int, bytes, bytes]]:
+    """
+    Reads every frame of a log, yielding the event type, battle ID, payload and raw frame of each event. Reading
+    stops at the first incomplete or corrupted frame, which is what a crash in the middle of a write leaves behind.
+    """
+    data = file.read()
+    offset = 0
+
+    while offset + FRAME_HEADER.size <= len(data):
+        length, checksum = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        end = start + length
+
+        if end > len(data) or length < BODY_HEADER.size or zlib.crc32(data[start:end]) != checksum:
+            return
+
+        event_type, battle_id = BODY_HEADER.unpack_from(data, start)
+        yield EventType(event_type), battle_id, data[start + BODY_HEADER.size : end], data[offset:end]
+
+        offset = end
+
+
+@dataclass
+class RecoveredBattle:
+    """
+    State of a battle rebuilt from the event log, holding IDs instead of Discord and ORM objects.
+    """
+
+    id: int
+    user_ids: tuple[int, int]
+    channel_id: int
+    seed: int
+    auto: bool = False
+    accepted: bool = False
+    ended: bool = False
+
+    decks: tuple[list[int], list[int]] = field(default_factory=lambda: ([], []))
+    locked: list[bool] = field(default_factory=lambda: [False, False])
+
+    # Attacker index, target index, damage and flags of every round played.
+    rounds: list[tuple[int, int, int, int]] = field(default_factory=list)
+    frames: list[bytes] = field(default_factory=list)
+
+    @property
+    def started(self) -> bool:
+        return all(self.locked)
+
+
+def replay(file: BinaryIO) -> dict[int, RecoveredBattle]:
+    """
+    Rebuilds every battle of a log that hasn't ended, indexed by battle ID.
+    """
+    battles: dict[int, RecoveredBattle] = {}
+
+    for event_type, battle_id, payload, frame in read_frames(file):
+        if event_type == EventType.CREATE:
+            user1, user2, channel_id, auto, seed = CREATE.unpack(payload)
+            battles[battle_id] = RecoveredBattle(battle_id, (user1, user2), channel_id, seed, bool(auto))
+
+        battle = battles.get(battle_id)
+        if battle is None:
+            continue
+
+        battle.frames.append(frame)
+
+        match event_type:
+            case EventType.ACCEPT:
+                battle.accepted = True
+            case EventType.ADD_BALL:
+                side, instance_id = BALL.unpack(payload)
+                battle.decks[side].append(instance_id)
+            case EventType.REMOVE_BALL:
+                side, instance_id = BALL.unpack(payload)
+                if instance_id in battle.decks[side]:
+                    battle.decks[side].remove(instance_id)
+            case EventType.LOCK:
+                (side,) = SIDE.unpack(payload)
+                battle.locked[side] = True
+            case EventType.ROUND:
+                _, attacker, target, damage, flags = ROUND.unpack(payload)
+                battle.rounds.append((attacker, target, damage, flags))
+            case EventType.END:
+                del battles[battle_id]
+
+    return battles
+
+
+def compact(path: Path, battles: dict[int, RecoveredBattle]):
+    """
+    Rewrites a log so that it only contains the events of the given battles.
+    """
+    temporary = path.with_suffix(path.suffix + ".tmp")
+
+    with temporary.open("wb") as file:
+        for battle in battles.values():
+            file.writelines(battle.frames)
+
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temporary, path)
+
+
+class EventLog(FileWriter):
+    """
+    Append-only log of battle events. Events are buffered in memory and written in batches, followed by an fsync,
+    every `flush_interval` seconds.
+    """
+
+    description = "battle events"
+
+    def __init__(self, path: Path, flush_interval: float = 1.0):
+        super().__init__(path, flush_interval)
+
+    def append(self, event_type: EventType, battle_id: int, payload: bytes = b""):
+        self.pending.append(encode(event_type, battle_id, payload))
+
+    def recorder(self, battle_id: int) -> BattleRecorder:
+        return BattleRecorder(self, battle_id)
+
+
+class BattleRecorder:
+    """
+    Records the events of a single battle. Recorders without a log ignore every event, which is the case for
+    battles that don't need to survive a restart.
+    """
+
+    __slots__ = ("log", "battle_id")
+
+    def __init__(self, log: EventLog | None = None, battle_id: int = 0):
+        self.log = log
+        self.battle_id = battle_id
+
+    @staticmethod
+    def side(battle: BattleState, player: BattlePlayer) -> int:
+        return 0 if player is battle.player1 else 1
+
+    def created(self, battle: BattleState):
+        if self.log is None:
+            return
+
+        channel_id = battle.channel.id if battle.channel else 0
+        payload = CREATE.pack(battle.player1.user.id, battle.player2.user.id, channel_id, battle.auto, battle.seed)
+        self.log.append(EventType.CREATE, self.battle_id, payload)
+
+    def accepted(self):
+        if self.log is not None:
+            self.log.append(EventType.ACCEPT, self.battle_id)
+
+    def ball_added(self, side: int, instance_id: int):
+        if self.log is not None:
+            self.log.append(EventType.ADD_BALL, self.battle_id, BALL.pack(side, instance_id))
+
+    def ball_removed(self, side: int, instance_id: int):
+        if self.log is not None:
+            self.log.append(EventType.REMOVE_BALL, self.battle_id, BALL.pack(side, instance_id))
+
+    def locked(self, side: int):
+        if self.log is not None:
+            self.log.append(EventType.LOCK, self.battle_id, SIDE.pack(side))
+
+    def round_played(self, round_number: int, attacker: int, target: int, result: AttackResult):
+        if self.log is None:
+            return
+
+        self.log.append(
+            EventType.ROUND, self.battle_id, ROUND.pack(round_number, attacker, target, result.damage, result.flags)
+        )
+
+    def ended(self, winner: int = 0):
+        """
+        Records the end of the battle, with the winner as 1 or 2, or 0 if nobody won.
+        """
+        if self.log is not None:
+            self.log.append(EventType.END, self.battle_id, SIDE.pack(winner))
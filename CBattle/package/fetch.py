@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import shutil
+import tarfile
+import tempfile
+import tomllib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Mapping
+
+import aiohttp
+
+from .config import FILE_SETTINGS, get_config
+
+log = logging.getLogger(__name__)
+
+CACHE_PATH = Path(__file__).parent / "cache"
+PACKAGE_PATH = Path(__file__).parent
+
+# Files of an installed package that belong to the bot owner, and are kept when installing over it.
+PRESERVED_FILES = ("config.toml",)
+
+# Files created at runtime, which are never copied from the source of an install. Files named by the config are
+# added by `runtime_files`.
+RUNTIME_FILES = ("__pycache__", "*.py[cod]", "cache", "profiles", "manifest.json")
+
+
+class FetchError(Exception):
+    """
+    Raised when a URL can't be fetched and no cached copy of it exists.
+    """
+
+
+@dataclass(frozen=True, slots=True)
+class FetchResult:
+    status: int
+    body: bytes
+
+    # Whether the body comes from the disk cache, either because the server confirmed it is still current or because
+    # the server couldn't be reached.
+    cached: bool = False
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def text(self) -> str:
+        return self.body.decode()
+
+
+class Fetcher:
+    """
+    Fetches URLs with a single `aiohttp` session reused across calls.
+
+    Successful responses are cached on disk with their ETag, and sent back with `If-None-Match` on the next fetch,
+    so unchanged resources cost a `304 Not Modified` that GitHub doesn't count against the rate limit. The cached
+    copy is also used when the server can't be reached.
+    """
+
+    def __init__(self, cache_directory: Path = CACHE_PATH, timeout: float = 10.0):
+        self.cache_directory = cache_directory
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session: aiohttp.ClientSession | None = None
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _cache_paths(self, url: str, params: Mapping[str, str] | None) -> tuple[Path, Path]:
+        key = hashlib.sha256(json.dumps([url, sorted((params or {}).items())]).encode()).hexdigest()[:32]
+        return self.cache_directory / f"{key}.json", self.cache_directory / f"{key}.body"
+
+    def _read_cache(self, url: str, params: Mapping[str, str] | None) -> tuple[dict[str, Any], bytes] | None:
+        meta_path, body_path = self._cache_paths(url, params)
+
+        try:
+            return json.loads(meta_path.read_text()), body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, url: str, params: Mapping[str, str] | None, etag: str, body: bytes):
+        meta_path, body_path = self._cache_paths(url, params)
+
+        try:
+            self.cache_directory.mkdir(exist_ok=True)
+            body_path.write_bytes(body)
+            meta_path.write_text(json.dumps({"url": url, "etag": etag}))
+        except OSError as error:
+            log.warning(f"Could not cache {url}: {error}")
+
+    async def get(self, url: str, params: Mapping[str, str] | None = None) -> FetchResult:
+        """
+        Fetches a URL, revalidating the cached copy if there is one. Error responses are returned as is, and are
+        never cached.
+        """
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+
+        # Cache files are small, so they are read on the loop like the config and the plugin manifest.
+        cached = self._read_cache(url, params)
+        headers = {"If-None-Match": cached[0]["etag"]} if cached else {}
+
+        try:
+            async with self.session.get(url, params=params, headers=headers) as response:
+                if response.status == 304 and cached:
+                    return FetchResult(200, cached[1], cached=True)
+
+                body = await response.read()
+                etag = response.headers.get("ETag")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            if cached is None:
+                raise FetchError(f"Could not fetch {url}: {error}") from error
+
+            log.warning(f"Could not fetch {url}, using the cached copy: {error}")
+            return FetchResult(200, cached[1], cached=True)
+
+        if response.status == 200 and etag:
+            self._write_cache(url, params, etag, body)
+
+        return FetchResult(response.status, body)
+
+
+def runtime_files(source: Path | None = None) -> tuple[str, ...]:
+    """
+    Returns the patterns of the files created at runtime. Files named by a setting of `FILE_SETTINGS` are matched
+    with their suggested name, the name set in the current config and the one set in the config of the `source`
+    package, including the per-node copies of coordinated processes and the journals written next to them.
+    """
+    names = set(FILE_SETTINGS.values())
+    names.update(getattr(get_config(), key.replace("-", "_")) for key in FILE_SETTINGS)
+
+    if source is not None:
+        # The source config is only read for file names, so an invalid one is ignored rather than stopping the install.
+        try:
+            settings = tomllib.loads((source / "config.toml").read_text()).get("settings", {})
+        except (OSError, ValueError):
+            settings = {}
+
+        names.update(settings.get(key) for key in FILE_SETTINGS if isinstance(settings.get(key), str))
+
+    patterns = [f"{path.stem}*{path.suffix}*" for path in map(Path, names) if path.name]
+    return RUNTIME_FILES + tuple(sorted(patterns))
+
+
+def _find_package(root: Path) -> Path | None:
+    """
+    Returns the shallowest folder containing the package, which can be the root itself, the `CBattle/package` folder
+    of a clone, or the same folder inside the top folder of a GitHub archive.
+    """
+    candidates = [path.parent for path in root.rglob("cog.py") if (path.parent / "__init__.py").exists()]
+    return min(candidates, key=lambda path: len(path.parts), default=None)
+
+
+def _copy_package(source: Path, target: Path):
+    if source.resolve() == target.resolve():
+        raise ValueError("The package can't be installed over itself.")
+
+    preserved = {name: (target / name).read_bytes() for name in PRESERVED_FILES if (target / name).exists()}
+
+    shutil.copytree(source, target, dirs_exist_ok=True, ignore=shutil.ignore_patterns(*runtime_files(source)))
+
+    for name, content in preserved.items():
+        (target / name).write_bytes(content)
+
+
+def _install(source: Path, target: Path) -> Path:
+    source = source.expanduser().resolve()
+
+    if source.is_dir():
+        package = _find_package(source)
+
+        if package is None:
+            raise FileNotFoundError(f"No CBattle package was found in {source}.")
+
+        _copy_package(package, target)
+        return package
+
+    if not tarfile.is_tarfile(source):
+        raise ValueError(f"{source} is neither a folder nor a tarball.")
+
+    with tempfile.TemporaryDirectory() as directory, tarfile.open(source) as archive:
+        archive.extractall(directory, filter="data")
+        package = _find_package(Path(directory))
+
+        if package is None:
+            raise FileNotFoundError(f"No CBattle package was found in {source}.")
+
+        _copy_package(package, target)
+        return source
+
+
+async def install_local(source: Path, target: Path = PACKAGE_PATH) -> Path:
+    """
+    Installs the package from a local folder or tarball over the installed one, keeping its config. Files are copied
+    in a worker thread, so the event loop isn't blocked. Returns the folder or tarball the package came from.
+    """
+    return await asyncio.to_thread(_install, source, target)
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .writer import BufferedWriter
+
+if TYPE_CHECKING:
+    from .logic import BattlePlayer, BattleState
+
+BASE_RATING = 1500.0
+RATING_SCALE = 400.0
+K_FACTOR = 32.0
+
+SCHEMA = """
+-- Battle IDs are only unique within the process that ran the battle, so every battle gets its own row ID, which
+-- also orders battles by the time they were written across processes.
+CREATE TABLE IF NOT EXISTS battles (
+    id INTEGER PRIMARY KEY,
+    node TEXT NOT NULL,
+    battle_id INTEGER NOT NULL,
+    finished_at REAL NOT NULL,
+    player1 INTEGER NOT NULL,
+    player2 INTEGER NOT NULL,
+    winner INTEGER,
+    rounds INTEGER NOT NULL,
+    UNIQUE (node, battle_id)
+);
+
+-- One row per player of a battle, so the history of a player is a range of the primary key.
+CREATE TABLE IF NOT EXISTS participations (
+    player_id INTEGER NOT NULL,
+    battle_id INTEGER NOT NULL,
+    opponent_id INTEGER NOT NULL,
+    result INTEGER NOT NULL,
+    rating_change REAL NOT NULL,
+    PRIMARY KEY (player_id, battle_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS ball_results (
+    battle_id INTEGER NOT NULL,
+    instance_id INTEGER NOT NULL,
+    ball TEXT NOT NULL,
+    player_id INTEGER NOT NULL,
+    result INTEGER NOT NULL,
+    PRIMARY KEY (battle_id, instance_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ball_results_ball ON ball_results (ball, result);
+
+-- Totals maintained as results are written, so leaderboards never aggregate the history.
+CREATE TABLE IF NOT EXISTS player_stats (
+    player_id INTEGER PRIMARY KEY,
+    rating REAL NOT NULL,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS player_stats_rating ON player_stats (rating DESC);
+
+CREATE TABLE IF NOT EXISTS ball_stats (
+    ball TEXT PRIMARY KEY,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ball_stats_wins ON ball_stats (wins DESC);
+"""
+
+# Results of a battle, from the point of view of a player or ball.
+WIN, LOSS, DRAW = 1, -1, 0
+
+
+@dataclass(frozen=True, slots=True)
+class BattleOutcome:
+    """
+    Result of a finished battle, detached from the battle so it can be written later.
+    """
+
+    battle_id: int
+    finished_at: float
+    player_ids: tuple[int, int]
+    winner_id: int | None
+    rounds: int
+
+    # Instance ID, ball name and Discord ID of the owner of every ball of both decks.
+    balls: tuple[tuple[int, str, int], ...]
+
+    @classmethod
+    def from_battle(cls, battle: BattleState, winner: BattlePlayer | None) -> BattleOutcome:
+        return cls(
+            battle_id=battle.id,
+            finished_at=time.time(),
+            player_ids=(battle.player1.user.id, battle.player2.user.id),
+            winner_id=winner.user.id if winner is not None else None,
+            rounds=battle.round_number,
+            balls=tuple(
+                (ball.instance_id, ball.name, player.user.id)
+                for player in (battle.player1, battle.player2)
+                for ball in player.balls
+            ),
+        )
+
+    def result(self, player_id: int) -> int:
+        if self.winner_id is None:
+            return DRAW
+
+        return WIN if self.winner_id == player_id else LOSS
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerStats:
+    player_id: int
+    rating: float
+    wins: int
+    losses: int
+    draws: int
+
+
+@dataclass(frozen=True, slots=True)
+class BallStats:
+    ball: str
+    wins: int
+    losses: int
+    draws: int
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryEntry:
+    battle_id: int
+    finished_at: float
+    opponent_id: int
+    result: int
+    rating_change: float
+
+
+def rating_changes(rating1: float, rating2: float, score1: float) -> tuple[float, float]:
+    """
+    Returns the Elo rating changes of two players, where `score1` is 1 if the first player won, 0 if they lost and
+    0.5 for a draw.
+    """
+    expected1 = 1 / (1 + 10 ** ((rating2 - rating1) / RATING_SCALE))
+    change = K_FACTOR * (score1 - expected1)
+
+    return change, -change
+
+
+class BattleHistory(BufferedWriter[BattleOutcome]):
+    """
+    Stores the results of finished battles in a SQLite database, along with the totals and ratings of every player
+    and ball.
+
+    Every process sharing the database writes with its own `node` name, as their battle IDs overlap.
+
+    Results are buffered in memory when battles end, and written in a single transaction every `flush_interval`
+    seconds, so the interaction that ended a battle never waits for the database. Results are buffered again if the
+    database is busy. Totals are updated as results are written, and read through indexes, so leaderboards and
+    player histories only read the rows they display.
+    """
+
+    description = "battle results"
+    retried = (sqlite3.OperationalError,)
+
+    def __init__(self, path: Path, node: str = "", flush_interval: float = 2.0):
+        super().__init__(flush_interval)
+        self.path = path
+        self.node = node
+        self.connection: sqlite3.Connection | None = None
+
+        # The connection is shared by the worker threads of writes and reads, which take turns.
+        self._lock = threading.Lock()
+
+    @property
+    def opened(self) -> bool:
+        return self.connection is not None
+
+    def open(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+        super().open()
+
+    def last_battle_id(self) -> int:
+        """
+        Returns the highest battle ID stored by this node, so battle IDs can be kept unique across restarts.
+        """
+        with self._lock:
+            query = "SELECT COALESCE(MAX(battle_id), 0) FROM battles WHERE node = ?"
+            return self.connection.execute(query, (self.node,)).fetchone()[0]
+
+    def record(self, battle: BattleState, winner: BattlePlayer | None):
+        """
+        Buffers the result of a finished battle.
+        """
+        self.pending.append(BattleOutcome.from_battle(battle, winner))
+
+    def _close(self):
+        with self._lock:
+            self.connection.close()
+            self.connection = None
+
+    def _write(self, outcomes: list[BattleOutcome]):
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN")
+
+            try:
+                for outcome in outcomes:
+                    self._write_outcome(cursor, outcome)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+            cursor.execute("COMMIT")
+
+    def _write_outcome(self, cursor: sqlite3.Cursor, outcome: BattleOutcome):
+        player1, player2 = outcome.player_ids
+
+        cursor.execute(
+            "INSERT OR IGNORE INTO battles (node, battle_id, finished_at, player1, player2, winner, rounds) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.node, outcome.battle_id, outcome.finished_at, player1, player2, outcome.winner_id, outcome.rounds),
+        )
+
+        # A battle restored after a restart could be recorded twice, which must not count twice in the totals.
+        if cursor.rowcount == 0:
+            return
+
+        battle_id = cursor.lastrowid
+
+        ratings = []
+        for player_id in outcome.player_ids:
+            cursor.execute(
+                "INSERT OR IGNORE INTO player_stats (player_id, rating) VALUES (?, ?)", (player_id, BASE_RATING)
+            )
+            cursor.execute("SELECT rating FROM player_stats WHERE player_id = ?", (player_id,))
+            ratings.append(cursor.fetchone()[0])
+
+        score = {WIN: 1.0, LOSS: 0.0, DRAW: 0.5}[outcome.result(player1)]
+        changes = rating_changes(ratings[0], ratings[1], score)
+
+        for player_id, opponent_id, change in ((player1, player2, changes[0]), (player2, player1, changes[1])):
+            result = outcome.result(player_id)
+
+            cursor.execute(
+                "INSERT INTO participations VALUES (?, ?, ?, ?, ?)", (player_id, battle_id, opponent_id, result, change)
+            )
+            cursor.execute(
+                "UPDATE player_stats SET rating = rating + ?, wins = wins + ?, losses = losses + ?, draws = draws + ? "
+                "WHERE player_id = ?",
+                (change, result == WIN, result == LOSS, result == DRAW, player_id),
+            )
+
+        for instance_id, ball, player_id in outcome.balls:
+            result = outcome.result(player_id)
+
+            cursor.execute(
+                "INSERT OR IGNORE INTO ball_results VALUES (?, ?, ?, ?, ?)",
+                (battle_id, instance_id, ball, player_id, result),
+            )
+            cursor.execute(
+                "INSERT INTO ball_stats (ball, wins, losses, draws) VALUES (?, ?, ?, ?) ON CONFLICT (ball) DO UPDATE "
+                "SET wins = wins + excluded.wins, losses = losses + excluded.losses, draws = draws + excluded.draws",
+                (ball, result == WIN, result == LOSS, result == DRAW),
+            )
+
+    async def _read(self, query: str, parameters: tuple = ()) -> list[tuple]:
+        def read():
+            with self._lock:
+                if self.connection is None:
+                    return []
+
+                return self.connection.execute(query, parameters).fetchall()
+
+        if self.connection is None:
+            return []
+
+        return await asyncio.to_thread(read)
+
+    async def leaderboard(self, limit: int = 10) -> list[PlayerStats]:
+        """
+        Returns the players with the highest rating.
+        """
+        rows = await self._read(
+            "SELECT player_id, rating, wins, losses, draws FROM player_stats ORDER BY rating DESC LIMIT ?", (limit,)
+        )
+        return [PlayerStats(*row) for row in rows]
+
+    async def ball_leaderboard(self, limit: int = 10) -> list[BallStats]:
+        """
+        Returns the balls that won the most battles.
+        """
+        rows = await self._read("SELECT ball, wins, losses, draws FROM ball_stats ORDER BY wins DESC LIMIT ?", (limit,))
+        return [BallStats(*row) for row in rows]
+
+    async def player_stats(self, player_id: int) -> PlayerStats | None:
+        rows = await self._read(
+            "SELECT player_id, rating, wins, losses, draws FROM player_stats WHERE player_id = ?", (player_id,)
+        )
+        return PlayerStats(*rows[0]) if rows else None
+
+    async def ball_stats(self, ball: str) -> BallStats | None:
+        rows = await self._read("SELECT ball, wins, losses, draws FROM ball_stats WHERE ball = ?", (ball,))
+        return BallStats(*rows[0]) if rows else None
+
+    async def history(self, player_id: int, limit: int = 10) -> list[HistoryEntry]:
+        """
+        Returns the latest battles of a player, most recent first.
+        """
+        rows = await self._read(
+            "SELECT p.battle_id, b.finished_at, p.opponent_id, p.result, p.rating_change FROM participations p "
+            "JOIN battles b ON b.id = p.battle_id WHERE p.player_id = ? ORDER BY p.battle_id DESC LIMIT ?",
+            (player_id, limit),
+        )
+        return [HistoryEntry(*row) for row in rows]
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from typing import TYPE_CHECKING, Callable, Generic, TypeVar
+
+import discord
+from discord.ui import Button
+
+from .metrics import count_request, metrics
+from .profiler import profiler
+
+if TYPE_CHECKING:
+    from .logic import BattleState
+    from .registry import BattleRegistry
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+EXPIRED_MESSAGE = "This battle expired, as nobody interacted with it for too long."
+
+metrics.describe("cbattle_expired_battles_total", "Battles removed by the janitor, by reason.")
+
+
+class TimerWheel(Generic[T]):
+    """
+    Hierarchical timer wheel counting time in ticks.
+
+    Every level has `slots` slots, and a slot of level `n` covers `slots ** n` ticks. Timers are stored in the lowest
+    level whose current rotation contains their expiry tick, and move down one level whenever the slot they are in
+    comes up, so scheduling a timer and advancing by one tick are both constant time. Timers can't be cancelled:
+    owners check whether a timer is still relevant when it fires.
+    """
+
+    __slots__ = ("slots", "levels", "tick", "_spans", "_wheels", "_size")
+
+    def __init__(self, slots: int = 64, levels: int = 4):
+        self.slots = slots
+        self.levels = levels
+        self.tick = 0
+
+        self._spans = [slots**level for level in range(levels + 1)]
+        self._wheels: list[list[list[tuple[int, T]]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def schedule(self, item: T, delay: int):
+        """
+        Schedules an item to be returned by `advance` in `delay` ticks. Delays beyond the range of the top level,
+        which is almost `slots ** levels` ticks, are shortened to fit in it.
+        """
+        span = self._spans[self.levels - 1]
+        expires = min(self.tick + max(delay, 1), (self.tick // span + self.slots) * span - 1)
+
+        self._insert(expires, item)
+        self._size += 1
+
+    def advance(self) -> list[T]:
+        """
+        Moves on to the next tick, and returns the items expiring at it.
+        """
+        self.tick += 1
+        tick = self.tick
+
+        # Higher levels are cascaded first, as their timers can land in the current slot of a lower level.
+        for level in range(self.levels - 1, 0, -1):
+            span = self._spans[level]
+
+            if tick % span:
+                continue
+
+            bucket = self._wheels[level][tick // span % self.slots]
+            entries = bucket[:]
+            bucket.clear()
+
+            for expires, item in entries:
+                self._insert(expires, item)
+
+        bucket = self._wheels[0][tick % self.slots]
+        expired = [item for _, item in bucket]
+        bucket.clear()
+        self._size -= len(expired)
+
+        return expired
+
+    def _insert(self, expires: int, item: T):
+        spans = self._spans
+        level = 0
+
+        while level < self.levels - 1 and expires // spans[level + 1] != self.tick // spans[level + 1]:
+            level += 1
+
+        self._wheels[level][expires // spans[level] % self.slots].append((expires, item))
+
+
+class BattleJanitor:
+    """
+    Removes battles nobody interacted with for `timeout` seconds, as well as finished battles.
+
+    Every battle gets a timer in a `TimerWheel` ticking every `resolution` seconds. When a timer fires, a battle that
+    was used since it was scheduled gets a new timer for the rest of its timeout, so interactions never touch the
+    wheel. Expired battles are removed from the registry, freeing both players, and their views are stopped and
+    disabled in batches of `batch_size` concurrent message edits.
+    """
+
+    def __init__(
+        self,
+        battles: BattleRegistry,
+        timeout: float,
+        resolution: float = 1.0,
+        batch_size: int = 25,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.battles = battles
+        self.timeout = timeout
+        self.resolution = resolution
+        self.batch_size = batch_size
+        self.clock = clock
+
+        self.wheel: TimerWheel[BattleState] = TimerWheel()
+        self.task: asyncio.Task | None = None
+        self._origin = clock()
+
+    def _ticks(self, seconds: float) -> int:
+        return math.ceil(seconds / self.resolution)
+
+    def track(self, battle: BattleState):
+        """
+        Starts watching a battle that was just added to the registry. The activity of the battle is timed with the
+        clock of the janitor from now on.
+        """
+        battle.clock = self.clock
+        battle.touch()
+
+        self.wheel.schedule(battle, self._ticks(self.timeout))
+
+    def sweep(self) -> list[BattleState]:
+        """
+        Advances the wheel up to the current time, and returns the battles that should be removed.
+        """
+        now = self.clock()
+        target = int((now - self._origin) / self.resolution)
+        due = []
+
+        while self.wheel.tick < target:
+            due.extend(self.wheel.advance())
+
+        expired = []
+
+        for battle in due:
+            # Battles removed in the meantime are simply dropped, which is how timers get cancelled.
+            if self.battles.get_battle(battle.id) is not battle:
+                continue
+
+            idle = now - battle.last_active
+
+            if not battle.finished and (idle < self.timeout or battle.lock.locked()):
+                self.wheel.schedule(battle, self._ticks(max(self.timeout - idle, self.resolution)))
+                continue
+
+            expired.append(battle)
+
+        return expired
+
+    async def expire(self, battles: list[BattleState]):
+        for index in range(0, len(battles), self.batch_size):
+            batch = battles[index : index + self.batch_size]
+            results = await asyncio.gather(*(self._expire(battle) for battle in batch), return_exceptions=True)
+
+            for battle, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    log.error(f"Could not expire battle {battle.id}", exc_info=result)
+
+    async def _expire(self, battle: BattleState):
+        async with battle.lock:
+            if not self.battles.remove(battle):
+                return
+
+            views = [view for view in (battle.accept_view, battle.last_turn) if view is not None]
+
+            for view in views:
+                view.stop()
+                view.editor.cancel()
+
+            if battle.finished:
+                metrics.inc("cbattle_expired_battles_total", reason="finished")
+                return
+
+            battle.finished = True
+            battle.recorder.ended()
+            profiler.finish(battle.id)
+            metrics.inc("cbattle_expired_battles_total", reason="idle")
+
+            if not views:
+                return
+
+            for view in views:
+                for child in [x for x in view.children if isinstance(x, Button)]:
+                    child.disabled = True
+
+            # Only the latest message still has enabled buttons, as locking disables the ones of the planning message.
+            view = views[-1]
+            message = getattr(view, "message", None)
+
+            if message is None:
+                return
+
+            try:
+                await message.edit(content=EXPIRED_MESSAGE, view=view)
+            except discord.HTTPException as error:
+                log.debug(f"Could not edit the message of expired battle {battle.id}: {error}")
+                return
+
+            count_request("edit", "janitor")
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.resolution)
+
+            expired = self.sweep()
+            if expired:
+                await self.expire(expired)
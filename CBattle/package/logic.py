@@ -1,45 +1,139 @@
 from __future__ import annotations
 
-import random
+import asyncio
+import time
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, Type
+from itertools import count
+from typing import TYPE_CHECKING, Callable
 
 from ballsdex.core.models import BallInstance, Player
 
-from .base import BaseEffect
-from .config import config
+from .base import BaseAbility, BaseEffect
+from .battlelog import BattleLog
+from .config import get_config
+from .engine import EffectEngine
+from .eventlog import CRIT, DODGED, KILLED, BattleRecorder
+from .metrics import timed
+from .rng import BattleRNG, new_seed
 
 if TYPE_CHECKING:
     from discord import Member, TextChannel, User
 
+    from .battlelog import LogExporter
     from .components import BattleAcceptView, TurnView
+    from .config import Config
+    from .history import BattleHistory
+    from .stats import BattleStats
+    from .templates import MessageTemplate
 
+DEFAULT_EVASION = 0.25
+DEFAULT_CRIT_CHANCE = 0.2
+MAX_ROUNDS = 1000
 
-def format_random(msg_list, **kwargs):
-    return random.choice(msg_list).format(**kwargs)
+_battle_ids = count(1)
 
 
-@dataclass
+def reserve_battle_ids(last_id: int):
+    """
+    Makes sure battles created from now on get an ID greater than `last_id`.
+    """
+    global _battle_ids
+    _battle_ids = count(max(next(_battle_ids), last_id + 1))
+
+
+@dataclass(slots=True)
+class AttackResult:
+    """
+    Stores the outcome of an attack. The message is only rendered when the result is converted to a string.
+    """
+
+    attacker: BattleBall
+    target: BattleBall
+    template: MessageTemplate
+
+    damage: int = 0
+    crit: bool = False
+    dodged: bool = False
+    killed: bool = False
+
+    @property
+    def flags(self) -> int:
+        """
+        Returns the outcome as the `CRIT`, `DODGED` and `KILLED` flags recorded in battle logs.
+        """
+        return (CRIT if self.crit else 0) | (DODGED if self.dodged else 0) | (KILLED if self.killed else 0)
+
+    def __str__(self) -> str:
+        message = self.template.render(
+            self.attacker.owner.user.name,
+            self.attacker.name,
+            self.target.owner.user.name,
+            self.target.name,
+            self.damage,
+        )
+
+        if self.crit:
+            message += "\nIt's a critical hit!"
+
+        return message
+
+
+@dataclass(slots=True)
 class BattleBall:
     """
     Stores a ball instance and keeps track of their health.
     """
 
-    model: BallInstance
+    model: BallInstance | None
     owner: BattlePlayer
 
     health: int
     attack: int
 
-    evasion: float = 0.25
-    crit_chance: float = 0.2
+    evasion: float = DEFAULT_EVASION
+    crit_chance: float = DEFAULT_CRIT_CHANCE
     dead: bool = False
 
-    effects: set[BaseEffect] = field(default_factory=set)
+    # Display values are resolved once when the ball joins a battle, so rendering never touches the model.
+    instance_id: int = 0
+    name: str = ""
+    label: str = ""
+    emoji: str = ""
+
+    abilities: list[BaseAbility] = field(default_factory=list)
+
+    # Effects applied by the battle's `EffectEngine`, by ID.
+    effects: dict[int, BaseEffect] = field(default_factory=dict)
 
     @classmethod
-    def from_ballinstance(cls, ballinstance: BallInstance, owner: BattlePlayer):
-        return cls(model=ballinstance, health=ballinstance.health, attack=ballinstance.attack, owner=owner)
+    def from_ballinstance(
+        cls, ballinstance: BallInstance, owner: BattlePlayer, emoji: str = "", stats: BattleStats | None = None
+    ):
+        """
+        Creates a ball from a ball instance, using the given resolved stats or the base stats of the instance.
+        """
+        if stats is None:
+            health, attack, evasion, crit_chance = (
+                ballinstance.health,
+                ballinstance.attack,
+                DEFAULT_EVASION,
+                DEFAULT_CRIT_CHANCE,
+            )
+        else:
+            health, attack, evasion, crit_chance = stats.health, stats.attack, stats.evasion, stats.crit_chance
+
+        return cls(
+            model=ballinstance,
+            health=health,
+            attack=attack,
+            evasion=evasion,
+            crit_chance=crit_chance,
+            owner=owner,
+            instance_id=ballinstance.pk,
+            name=ballinstance.countryball.country,
+            label=ballinstance.to_string(),
+            emoji=emoji,
+        )
 
     def damage(self, amount: int) -> bool:
         """Damage a BattleBall. If the damage kills the ball, returns true, otherwise returns false"""
@@ -49,46 +143,31 @@ class BattleBall:
             return True
         return False
 
-    @property
-    def name(self) -> str:
-        return self.model.countryball.country
-
-    def apply_effect(self, effect: Type[BaseEffect], rounds: int):
-        self.effects.add(effect(self, rounds))
+    def attack_target(
+        self, target: BattleBall, rng: BattleRNG, config: Config | None = None, effects: EffectEngine | None = None
+    ) -> AttackResult:
+        config = config or get_config()
 
-    def round_passed(self, round_number):
-        for effect in self.effects:
-            effect.round_passed(round_number)
+        if rng.chance(target.evasion):
+            return AttackResult(self, target, rng.message(config.dodge_messages), dodged=True)
 
-    def attack_target(self, target: BattleBall) -> str:
-        if random.random() < target.evasion:
-            return random.choice(config.dodge_messages).format(
-                a_owner=self.owner, a_name=self.name, d_owner=target.owner, d_name=target.name
-            )
-
-        damage = int(self.attack * random.uniform(0.6, 1.2))
+        damage = rng.damage_roll(effects.attack(self, target) if effects else self.attack)
 
         crit = False
-        if random.random() < self.crit_chance:
+        if rng.chance(self.crit_chance):
             crit = True
             damage *= 2
 
-        if target.damage(damage):
-            response = random.choice(config.defeat_messages).format(
-                a_owner=self.owner, a_name=self.name, d_owner=target.owner, d_name=target.name, dmg=damage
-            )
-        else:
-            response = random.choice(config.attack_messages).format(
-                a_owner=self.owner, a_name=self.name, d_owner=target.owner, d_name=target.name, dmg=damage
-            )
+        if effects:
+            damage = effects.damage(self, target, damage)
 
-        if crit:
-            response += "\nIt's a critical hit!"
+        if target.damage(damage):
+            return AttackResult(self, target, rng.message(config.defeat_messages), damage, crit, killed=True)
 
-        return response
+        return AttackResult(self, target, rng.message(config.attack_messages), damage, crit)
 
 
-@dataclass
+@dataclass(slots=True)
 class BattlePlayer:
     """
     Stores the deck of a player and their model.
@@ -102,8 +181,18 @@ class BattlePlayer:
     def __str__(self) -> str:
         return self.user.name
 
+    def get_ball(self, instance_id: int) -> BattleBall | None:
+        """
+        Returns the ball of this player's deck created from the ball instance with the given ID.
+        """
+        for ball in self.balls:
+            if ball.instance_id == instance_id:
+                return ball
 
-@dataclass
+        return None
+
+
+@dataclass(slots=True)
 class BattleState:
     """
     Stores both `BattlePlayer` instances and other additional information for a battle.
@@ -112,17 +201,60 @@ class BattleState:
     player1: BattlePlayer
     player2: BattlePlayer
 
+    id: int = field(default_factory=lambda: next(_battle_ids))
+    seed: int = field(default_factory=new_seed)
+
     active_player: BattlePlayer | None = None
     inactive_player: BattlePlayer | None = None
     round_number: int = 0
 
     started: bool = False
     accepted: bool = False
+    auto: bool = False
+    finished: bool = False
+
+    # Time of the last interaction with the battle according to `clock`, which the janitor uses to find idle
+    # battles. The janitor replaces the clock with its own once it tracks the battle.
+    last_active: float = field(default_factory=time.monotonic)
+    clock: Callable[[], float] = field(default=time.monotonic, repr=False)
 
     accept_view: BattleAcceptView | None = None
     channel: TextChannel | None = None
     last_turn: TurnView | None = None
 
+    # The config snapshot the battle started with, which stays the same if the config is reloaded.
+    config: Config = field(default_factory=get_config)
+    recorder: BattleRecorder = field(default_factory=BattleRecorder)
+    history: BattleHistory | None = field(default=None, repr=False)
+    log: BattleLog = field(default_factory=BattleLog, repr=False)
+    exporter: LogExporter | None = field(default=None, repr=False)
+    rng: BattleRNG = field(init=False, repr=False)
+    effects: EffectEngine = field(default_factory=EffectEngine, repr=False)
+
+    # Held while an interaction mutates the battle, so concurrent button presses are handled one after the other.
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.rng = BattleRNG(self.seed, self.round_number)
+
+    def end(self, winner: BattlePlayer | None):
+        """
+        Marks the battle as finished, and records its result. Draws have no winner.
+        """
+        self.finished = True
+
+        side = 0 if winner is None else self.recorder.side(self, winner) + 1
+        self.recorder.ended(side)
+
+        if self.history is not None:
+            self.history.record(self, winner)
+
+        if self.exporter is not None:
+            self.exporter.export(self, side)
+
+    def touch(self):
+        self.last_active = self.clock()
+
     def start(self):
         if self.started:
             return
@@ -138,12 +270,25 @@ class BattleState:
 
         return None
 
-    def next_round(self) -> str | BattlePlayer:
+    @property
+    def active_side(self) -> int:
+        return 0 if self.active_player is self.player1 else 1
+
+    @property
+    def winner(self) -> BattlePlayer | None:
         if all(ball.dead for ball in self.player2.balls):
             return self.player1
         if all(ball.dead for ball in self.player1.balls):
             return self.player2
 
+        return None
+
+    @timed("cbattle_round_seconds")
+    def next_round(self) -> AttackResult | BattlePlayer:
+        winner = self.winner
+        if winner is not None:
+            return winner
+
         if not self.active_player or not self.inactive_player:
             raise Exception("Attempted to move on to next round without an active player!")
 
@@ -152,10 +297,80 @@ class BattleState:
         # swap inactive and active
         self.active_player, self.inactive_player = self.inactive_player, self.active_player
 
-        for ball in self.active_player.balls:
-            ball.round_passed(self.round_number)
+        self.rng.seek(self.round_number)
+        self.effects.start_round(self.round_number, self.active_player.balls)
+
+        attacker = self.effects.choose(self.active_player.balls, self.rng)
+        target = self.rng.pick(len(self.inactive_player.balls))
+
+        result = self.active_player.balls[attacker].attack_target(
+            self.inactive_player.balls[target], self.rng, self.config, self.effects
+        )
+        self.recorder.round_played(self.round_number, attacker, target, result)
+        self.log.append(self.round_number, self.active_side, attacker, target, result, self.config)
+
+        return result
+
+    def apply_round(
+        self, attacker: int, target: int, damage: int, crit: bool = False, dodged: bool = False
+    ) -> AttackResult:
+        """
+        Moves on to the next round using a recorded outcome instead of rolling it. Only the message is picked, from
+        the cosmetic stream of the round.
+        """
+        self.round_number += 1
+        self.active_player, self.inactive_player = self.inactive_player, self.active_player
+
+        self.rng.seek(self.round_number)
+        self.effects.start_round(self.round_number, self.active_player.balls)
 
-        return random.choice(self.active_player.balls).attack_target(random.choice(self.inactive_player.balls))
+        attacking_ball = self.active_player.balls[attacker]
+        target_ball = self.inactive_player.balls[target]
+
+        if dodged:
+            result = AttackResult(
+                attacking_ball, target_ball, self.rng.message(self.config.dodge_messages), dodged=True
+            )
+        elif target_ball.damage(damage):
+            template = self.rng.message(self.config.defeat_messages)
+            result = AttackResult(attacking_ball, target_ball, template, damage, crit, killed=True)
+        else:
+            template = self.rng.message(self.config.attack_messages)
+            result = AttackResult(attacking_ball, target_ball, template, damage, crit)
+
+        self.log.append(self.round_number, self.active_side, attacker, target, result, self.config)
+        return result
+
+    def play(self, max_rounds: int = MAX_ROUNDS) -> tuple[list[AttackResult], BattlePlayer | None]:
+        """
+        Plays the remaining rounds of the battle at once. Returns the result of every round played and the winner,
+        which is `None` if nobody won after `max_rounds` rounds.
+        """
+        self.start()
+        messages = []
+
+        while self.round_number < max_rounds:
+            result = self.next_round()
+            if isinstance(result, BattlePlayer):
+                return messages, result
+
+            messages.append(result)
+
+        return messages, self.winner
+
+    def play_out(self, max_rounds: int = MAX_ROUNDS) -> BattlePlayer | None:
+        """
+        Plays the remaining rounds of the battle at once like `play`, without keeping their results, which can be
+        read back from the battle log instead. Returns the winner.
+        """
+        self.start()
+
+        while self.round_number < max_rounds:
+            result = self.next_round()
+            if isinstance(result, BattlePlayer):
+                return result
+
+        return self.winner
 
 
 # max_deck_size: int = max_deck_size
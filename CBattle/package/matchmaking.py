@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import heapq
+import math
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+
+def deck_power(stats: Iterable[tuple[int, int]], deck_size: int) -> float:
+    """
+    Returns the power of the strongest deck that can be built from the given health and attack stats. A ball is
+    worth the geometric mean of its stats, so a ball with a lot of one and none of the other is worth nothing.
+    """
+    return sum(heapq.nlargest(deck_size, (math.sqrt(max(health, 0) * max(attack, 0)) for health, attack in stats)))
+
+
+@dataclass(eq=False, slots=True)
+class QueueEntry:
+    """
+    A player waiting in a matchmaking queue.
+    """
+
+    user_id: int
+    power: float
+    joined: float
+
+    # Data passed back with the entry once it's paired, such as the interaction and player model.
+    payload: Any = None
+
+    # Discord IDs of the players this one must not be paired with.
+    avoid: set[int] = field(default_factory=set)
+
+
+class MatchQueue:
+    """
+    Pairs waiting players with the closest deck power.
+
+    Players are kept in buckets of `bucket_width` power, and the keys of the non-empty buckets are kept sorted, so
+    finding the closest bucket is a binary search. A player accepts opponents whose power is within their search
+    window, which starts at `window` and grows by `widening` per second spent waiting, up to `max_window`, and two
+    players are only paired if each one is within the other's window. New players are paired as they arrive, and
+    `pair_waiting` pairs the players whose window grew enough since.
+    """
+
+    def __init__(
+        self,
+        bucket_width: float = 250.0,
+        window: float = 250.0,
+        widening: float = 25.0,
+        max_window: float = math.inf,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.bucket_width = bucket_width
+        self.window = window
+        self.widening = widening
+        self.max_window = max_window
+        self.clock = clock
+
+        self.entries: dict[int, QueueEntry] = {}
+        self._buckets: dict[int, dict[int, QueueEntry]] = {}
+        self._keys: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.entries
+
+    def _bucket(self, power: float) -> int:
+        return int(power // self.bucket_width)
+
+    def search_window(self, entry: QueueEntry, now: float) -> float:
+        return min(self.window + self.widening * (now - entry.joined), self.max_window)
+
+    def join(self, entry: QueueEntry) -> QueueEntry | None:
+        """
+        Pairs a player with the closest waiting player within their window, which is returned and leaves the
+        queue. If there is none, the player starts waiting and `None` is returned.
+        """
+        if entry.user_id in self.entries:
+            raise ValueError(f"User {entry.user_id} is already queued.")
+
+        opponent = self._closest(entry, self.clock())
+
+        if opponent is not None:
+            self.leave(opponent.user_id)
+            return opponent
+
+        self._insert(entry)
+        return None
+
+    def wait(self, entry: QueueEntry):
+        """
+        Puts a player back in the queue without pairing them. They keep the time they joined, and with it their place
+        ahead of the players who joined after them.
+        """
+        self._insert(entry)
+
+    def leave(self, user_id: int) -> QueueEntry | None:
+        """
+        Removes a waiting player, and returns their entry if they were queued.
+        """
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return None
+
+        key = self._bucket(entry.power)
+        bucket = self._buckets[key]
+        del bucket[user_id]
+
+        if not bucket:
+            del self._buckets[key]
+            del self._keys[bisect_left(self._keys, key)]
+
+        return entry
+
+    def pair_waiting(self) -> list[tuple[QueueEntry, QueueEntry]]:
+        """
+        Pairs the waiting players whose window now reaches another player, longest waiting first.
+        """
+        now = self.clock()
+        pairs = []
+
+        # Entries are kept in the order players joined, so the players that waited the longest go first.
+        for entry in list(self.entries.values()):
+            if entry.user_id not in self.entries:
+                continue
+
+            opponent = self._closest(entry, now)
+            if opponent is None:
+                continue
+
+            self.leave(entry.user_id)
+            self.leave(opponent.user_id)
+            pairs.append((opponent, entry))
+
+        return pairs
+
+    def _insert(self, entry: QueueEntry):
+        key = self._bucket(entry.power)
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            bucket = self._buckets[key] = {}
+            insort(self._keys, key)
+
+        _insert_joined(bucket, entry)
+        _insert_joined(self.entries, entry)
+
+    def _closest(self, entry: QueueEntry, now: float) -> QueueEntry | None:
+        """
+        Returns the closest waiting player within the player's window whose own window reaches the player as well.
+        Buckets are visited from the closest outwards, alternating between weaker and stronger ones, and the players
+        of a bucket in the order they joined.
+        """
+        window = self.search_window(entry, now)
+        keys = self._keys
+        key = self._bucket(entry.power)
+        reach = math.floor(window / self.bucket_width) + 1
+
+        right = bisect_left(keys, key)
+        left = right - 1
+
+        while left >= 0 or right < len(keys):
+            left_distance = key - keys[left] if left >= 0 else math.inf
+            right_distance = keys[right] - key if right < len(keys) else math.inf
+
+            if min(left_distance, right_distance) > reach:
+                return None
+
+            if left_distance < right_distance:
+                bucket_key = keys[left]
+                left -= 1
+            else:
+                bucket_key = keys[right]
+                right += 1
+
+            for candidate in self._buckets[bucket_key].values():
+                if candidate is entry or candidate.user_id in entry.avoid or entry.user_id in candidate.avoid:
+                    continue
+
+                distance = abs(candidate.power - entry.power)
+
+                if distance <= window and distance <= self.search_window(candidate, now):
+                    return candidate
+
+        return None
+
+
+def _insert_joined(entries: dict[int, QueueEntry], entry: QueueEntry):
+    """
+    Adds an entry to a dictionary kept in the order players joined. New players always go last, so only players
+    put back in the queue move the ones who joined after them.
+    """
+    later = entries and next(reversed(entries.values())).joined > entry.joined
+    entries[entry.user_id] = entry
+
+    if not later:
+        return
+
+    for other in [other for other in entries.values() if other.joined > entry.joined]:
+        del entries[other.user_id]
+        entries[other.user_id] = other
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, ParamSpec, TypeVar
+
+log = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Interaction responses that send a new message or edit the one the component is attached to.
+SEND_RESPONSES = {"channel_message"}
+EDIT_RESPONSES = {"message_update"}
+
+Labels = tuple[tuple[str, str], ...]
+
+# Name of the command or callback being handled, so database queries can be attributed to it.
+current_handler: ContextVar[str | None] = ContextVar("current_handler", default=None)
+
+
+class Histogram:
+    """
+    Cumulative latency histogram in the Prometheus format.
+    """
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, quantile: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the given quantile, or infinity if it's above every bucket.
+        """
+        target = quantile * self.count
+        total = 0
+
+        for bound, count in zip(BUCKETS, self.counts):
+            total += count
+            if total >= target:
+                return bound
+
+        return float("inf")
+
+
+class Metrics:
+    """
+    Collects counters, gauges and latency histograms, and renders them in the Prometheus text format.
+
+    Nothing is recorded while the metrics are disabled, and instrumented functions only pay for a flag check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.descriptions: dict[str, str] = {}
+
+    def describe(self, name: str, description: str):
+        self.descriptions[name] = description
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        if not self.enabled:
+            return
+
+        counter = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        counter[key] = counter.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str):
+        if not self.enabled:
+            return
+
+        histograms = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+
+        histogram.observe(value)
+
+    def gauge(self, name: str, function: Callable[[], float], description: str = ""):
+        """
+        Registers a gauge, whose value is computed by calling `function` whenever the metrics are rendered.
+        """
+        self.gauges[name] = function
+
+        if description:
+            self.describe(name, description)
+
+    def counter_total(self, name: str, **labels: str) -> float:
+        """
+        Returns the sum of a counter over every label set matching the given labels.
+        """
+        wanted = set(labels.items())
+        return sum(value for key, value in self.counters.get(name, {}).items() if wanted <= set(key))
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+    def render(self) -> str:
+        return "".join(f"{line}\n" for line in self._lines())
+
+    def _header(self, name: str, kind: str) -> Iterator[str]:
+        if name in self.descriptions:
+            yield f"# HELP {name} {self.descriptions[name]}"
+
+        yield f"# TYPE {name} {kind}"
+
+    def _lines(self) -> Iterator[str]:
+        for name, function in self.gauges.items():
+            yield from self._header(name, "gauge")
+            yield f"{name} {function()}"
+
+        for name, counter in self.counters.items():
+            yield from self._header(name, "counter")
+
+            for labels, value in counter.items():
+                yield f"{name}{_format_labels(labels)} {value}"
+
+        for name, histograms in self.histograms.items():
+            yield from self._header(name, "histogram")
+
+            for labels, histogram in histograms.items():
+                total = 0
+
+                for bound, count in zip((*BUCKETS, "+Inf"), histogram.counts):
+                    total += count
+                    yield f"{name}_bucket{_format_labels((*labels, ('le', str(bound))))} {total}"
+
+                yield f"{name}_sum{_format_labels(labels)} {histogram.sum}"
+                yield f"{name}_count{_format_labels(labels)} {histogram.count}"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+metrics = Metrics()
+metrics.describe("cbattle_handler_seconds", "Latency of the battle commands and button callbacks.")
+metrics.describe("cbattle_handler_calls_total", "Calls of the battle commands and button callbacks.")
+metrics.describe("cbattle_handler_errors_total", "Battle commands and button callbacks that raised an error.")
+metrics.describe("cbattle_round_seconds", "Time taken to play a single battle round.")
+metrics.describe("cbattle_discord_requests_total", "Messages sent and edited on Discord, by handler.")
+metrics.describe("cbattle_db_queries_total", "Database queries run while handling a command or callback.")
+
+
+def instrument(name: str) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """
+    Records the latency of a command or button callback, and counts the messages its interaction response sent
+    or edited. Database queries run while it's handled are attributed to it.
+    """
+
+    def decorator(function: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @functools.wraps(function)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not metrics.enabled:
+                return await function(*args, **kwargs)
+
+            token = current_handler.set(name)
+            start = time.perf_counter()
+
+            try:
+                return await function(*args, **kwargs)
+            except Exception:
+                metrics.inc("cbattle_handler_errors_total", handler=name)
+                raise
+            finally:
+                metrics.observe("cbattle_handler_seconds", time.perf_counter() - start, handler=name)
+                metrics.inc("cbattle_handler_calls_total", handler=name)
+                current_handler.reset(token)
+
+                _count_response(name, args)
+
+        return wrapper
+
+    return decorator
+
+
+def timed(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """
+    Records the latency of a synchronous function in the given histogram.
+    """
+
+    def decorator(function: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(function)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def _count_response(handler: str, args: tuple[Any, ...]):
+    for arg in args:
+        response = getattr(arg, "response", None)
+        response_type = getattr(response, "type", None)
+
+        if response_type is None:
+            continue
+
+        if response_type.name in SEND_RESPONSES:
+            count_request("send", handler)
+        elif response_type.name in EDIT_RESPONSES:
+            count_request("edit", handler)
+
+        return
+
+
+def count_request(kind: str, handler: str | None = None):
+    """
+    Counts a message sent or edited on Discord outside of an interaction response.
+    """
+    metrics.inc("cbattle_discord_requests_total", kind=kind, handler=handler or current_handler.get() or "none")
+
+
+class QueryCounter(logging.Filter):
+    """
+    Counts the queries logged by Tortoise's database clients, attributing them to the command or callback being
+    handled. The logger has to be lowered to the debug level for queries to be logged, so records below the level
+    it had before are dropped once counted.
+    """
+
+    def __init__(self, logger: str = "tortoise.db_client"):
+        super().__init__()
+        self.logger = logging.getLogger(logger)
+        self.previous_level = self.logger.level
+        self.effective_level = self.logger.getEffectiveLevel()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        handler = current_handler.get()
+
+        if handler is not None and record.levelno == logging.DEBUG:
+            metrics.inc("cbattle_db_queries_total", handler=handler)
+
+        return record.levelno >= self.effective_level
+
+    def install(self):
+        self.previous_level = self.logger.level
+        self.effective_level = self.logger.getEffectiveLevel()
+        self.logger.addFilter(self)
+        self.logger.setLevel(logging.DEBUG)
+
+    def uninstall(self):
+        self.logger.removeFilter(self)
+        self.logger.setLevel(self.previous_level)
+
+
+class MetricsServer:
+    """
+    Serves the metrics in the Prometheus text format over HTTP.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.server: asyncio.Server | None = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        log.info(f"Serving CBattle metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.server is None:
+            return
+
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+
+            # Headers are read and ignored, as only the path of the request matters.
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+
+            parts = request_line.decode("latin-1").split()
+
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", metrics.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
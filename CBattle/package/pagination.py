@@ -1,26 +1,29 @@
 import discord
 
+from .updater import EditScheduler
+
 
 class TutorialPages(discord.ui.View):
-    def __init__(self, pages, author_id: int):
+    def __init__(self, pages, author_id: int | None):
         super().__init__(timeout=None)
 
         self.pages = pages
         self.author_id = author_id
 
         self.current = 0
+        self.editor = EditScheduler(self.render)
 
-    async def update_page(self, interaction: discord.Interaction):
+    async def render(self) -> dict:
         embed, attachment = await self.pages[self.current]()
 
-        if attachment:
-            await interaction.response.edit_message(embed=embed, attachments=[attachment], view=self)
-            return
+        # Pages without an attachment clear the one of the previous page, which would otherwise show below the embed.
+        return {"embed": embed, "attachments": [attachment] if attachment else [], "view": self}
 
-        await interaction.response.edit_message(embed=embed, view=self)
+    async def update_page(self, interaction: discord.Interaction):
+        await self.editor.respond(interaction)
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
-        if interaction.user.id != self.author_id:
+        if self.author_id is not None and interaction.user.id != self.author_id:
             await interaction.response.send_message("You are not allowed to interact with this menu.", ephemeral=True)
             return False
 
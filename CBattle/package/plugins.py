@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import ast
+import importlib
+import importlib.util
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import Any, Iterable, Mapping
+
+from .base import BaseAbility, BaseEffect
+
+log = logging.getLogger(__name__)
+
+CUSTOMS_PATH = Path(__file__).parent / "customs"
+CUSTOMS_PACKAGE = f"{__package__}.customs"
+MANIFEST_PATH = CUSTOMS_PATH / "manifest.json"
+MANIFEST_VERSION = 1
+ENTRY_POINT_GROUP = "cbattle.plugins"
+
+KINDS = {"BaseAbility": "ability", "BaseEffect": "effect"}
+
+
+@dataclass(frozen=True, slots=True)
+class PluginEntry:
+    """
+    Describes a custom ability or effect found in a plugin module, without importing it.
+    """
+
+    name: str
+    kind: str
+    module: str
+    bases: tuple[str, ...] = ()
+
+    # Names of the balls and of the config attributes the ability is given to.
+    balls: tuple[str, ...] = ()
+    attributes: tuple[str, ...] = ()
+
+    @property
+    def key(self) -> str:
+        """
+        Name of the class qualified by its module, as several plugin modules can define classes with the same name.
+        """
+        return f"{self.module}:{self.name}"
+
+
+def _literal_names(node: ast.expr) -> tuple[str, ...]:
+    try:
+        value = ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError):
+        return ()
+
+    if isinstance(value, str):
+        return (value,)
+
+    return tuple(item for item in value if isinstance(item, str)) if isinstance(value, (list, tuple)) else ()
+
+
+def scan_module(path: Path, module: str) -> list[dict[str, Any]]:
+    """
+    Parses a plugin module and returns every top-level class of it, with their base names and the `balls` and
+    `attributes` they declare. The module itself is never imported.
+    """
+    tree = ast.parse(path.read_bytes(), str(path))
+    classes = []
+
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+
+        declared = {"balls": (), "attributes": ()}
+
+        for statement in node.body:
+            if isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+                target, value = statement.targets[0], statement.value
+            elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+                target, value = statement.target, statement.value
+            else:
+                continue
+
+            if isinstance(target, ast.Name) and target.id in declared:
+                declared[target.id] = _literal_names(value)
+
+        bases = [base.id if isinstance(base, ast.Name) else getattr(base, "attr", "") for base in node.bases]
+        classes.append({"name": node.name, "module": module, "bases": [base for base in bases if base], **declared})
+
+    return classes
+
+
+def _resolve(classes: list[dict[str, Any]]) -> dict[str, PluginEntry]:
+    """
+    Keeps the classes inheriting from `BaseAbility` or `BaseEffect`, directly or through other plugin classes, by
+    key. Bases are only known by name, so a class name defined by several modules is reported.
+    """
+    kinds = dict(KINDS)
+    pending = list(classes)
+
+    # Subclasses of plugin classes can be declared in any order and any module, so bases are resolved until
+    # nothing changes anymore.
+    while True:
+        remaining = []
+
+        for data in pending:
+            kind = next((kinds[base] for base in data["bases"] if base in kinds), None)
+
+            if kind is None:
+                remaining.append(data)
+            else:
+                kinds[data["name"]] = kind
+
+        if len(remaining) == len(pending):
+            break
+
+        pending = remaining
+
+    entries = {}
+    modules: dict[str, str] = {}
+
+    for data in classes:
+        if data["name"] not in KINDS and data["name"] in kinds:
+            entry = PluginEntry(
+                name=data["name"],
+                kind=kinds[data["name"]],
+                module=data["module"],
+                bases=tuple(data["bases"]),
+                balls=tuple(data["balls"]),
+                attributes=tuple(data["attributes"]),
+            )
+            entries[entry.key] = entry
+
+            if modules.setdefault(entry.name, entry.module) != entry.module:
+                log.warning(
+                    f"CBattle plugin class `{entry.name}` is defined in both `{modules[entry.name]}` and "
+                    f"`{entry.module}`, subclasses naming it as a base could inherit from either."
+                )
+
+    return entries
+
+
+class PluginRegistry:
+    """
+    Registry of the custom abilities and effects of the `customs` folder and of the `cbattle.plugins` entry points.
+
+    Discovery parses plugin modules instead of importing them, and caches the result in a manifest keyed on the
+    modification time of every file, so only changed files are parsed again. Plugin modules are imported the first
+    time one of their classes is needed, and the time each import took is recorded. Plugins are identified by
+    their `PluginEntry.key`.
+    """
+
+    def __init__(
+        self,
+        directory: Path = CUSTOMS_PATH,
+        package: str = CUSTOMS_PACKAGE,
+        manifest_path: Path | None = MANIFEST_PATH,
+        entry_point_group: str | None = ENTRY_POINT_GROUP,
+    ):
+        self.directory = directory
+        self.package = package
+        self.manifest_path = manifest_path
+        self.entry_point_group = entry_point_group
+
+        self.entries: dict[str, PluginEntry] = {}
+        self.import_times: dict[str, float] = {}
+
+        # Modules that failed to import, which aren't imported again until the next discovery.
+        self.failed: set[str] = set()
+
+        self._by_ball: dict[str, list[PluginEntry]] = {}
+        self._by_attribute: dict[str, list[PluginEntry]] = {}
+        self._classes: dict[str, type] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def _sources(self) -> Iterable[tuple[Path, str]]:
+        if self.directory.is_dir():
+            for path in sorted(self.directory.rglob("*.py")):
+                parts = path.relative_to(self.directory).with_suffix("").parts
+
+                if any(part.startswith("_") for part in parts):
+                    continue
+
+                yield path, ".".join((self.package, *parts))
+
+        if self.entry_point_group is None:
+            return
+
+        for entry_point in entry_points(group=self.entry_point_group):
+            try:
+                spec = importlib.util.find_spec(entry_point.module)
+            except (ImportError, ValueError) as error:
+                log.error(f"Could not find the CBattle plugin `{entry_point.name}`: {error}")
+                continue
+
+            if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+                log.error(f"Could not find the source of the CBattle plugin `{entry_point.name}`.")
+                continue
+
+            yield Path(spec.origin), entry_point.module
+
+    def _read_manifest(self) -> dict[str, Any]:
+        if self.manifest_path is None:
+            return {}
+
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+        return manifest.get("files", {}) if manifest.get("version") == MANIFEST_VERSION else {}
+
+    def _write_manifest(self, files: dict[str, Any]):
+        if self.manifest_path is None:
+            return
+
+        try:
+            self.manifest_path.write_text(json.dumps({"version": MANIFEST_VERSION, "files": files}))
+        except OSError as error:
+            log.warning(f"Could not write the CBattle plugin manifest: {error}")
+
+    def discover(self):
+        """
+        Finds every plugin class, parsing only the files that changed since the manifest was written.
+        """
+        cached = self._read_manifest()
+        files = {}
+        changed = False
+
+        for path, module in self._sources():
+            stat = path.stat()
+            key = str(path)
+            entry = cached.get(key)
+            signature = (module, stat.st_mtime_ns, stat.st_size)
+
+            if entry is None or (entry["module"], entry["mtime"], entry["size"]) != signature:
+                try:
+                    classes = scan_module(path, module)
+                except (OSError, SyntaxError, ValueError) as error:
+                    log.error(f"Could not read the CBattle plugin module `{module}`: {error}")
+                    continue
+
+                entry = {"module": module, "mtime": stat.st_mtime_ns, "size": stat.st_size, "classes": classes}
+                changed = True
+
+            files[key] = entry
+
+        if changed or files.keys() != cached.keys():
+            self._write_manifest(files)
+
+        self.entries = _resolve([data for entry in files.values() for data in entry["classes"]])
+        self.failed.clear()
+        self._by_ball.clear()
+        self._by_attribute.clear()
+
+        for entry in self.entries.values():
+            for ball in entry.balls:
+                self._by_ball.setdefault(ball, []).append(entry)
+
+            for attribute in entry.attributes:
+                self._by_attribute.setdefault(attribute, []).append(entry)
+
+    def get(self, key: str) -> type[BaseAbility] | type[BaseEffect]:
+        """
+        Returns a plugin class by key, importing its module if it hasn't been imported yet.
+        """
+        plugin = self._classes.get(key)
+        if plugin is not None:
+            return plugin
+
+        entry = self.entries[key]
+
+        if entry.module not in sys.modules:
+            start = time.perf_counter()
+            importlib.import_module(entry.module)
+            self.import_times[entry.module] = time.perf_counter() - start
+
+            log.debug(f"Imported CBattle plugin module `{entry.module}` in {self.import_times[entry.module]:.4f}s.")
+
+        plugin = getattr(sys.modules[entry.module], entry.name)
+        self._classes[key] = plugin
+
+        return plugin
+
+    def entries_for(self, ball_name: str, attributes: Mapping[str, Iterable[str]]) -> list[PluginEntry]:
+        """
+        Returns the abilities given to a ball, either by its name or through one of the config attributes it has.
+        """
+        entries = list(self._by_ball.get(ball_name, ()))
+
+        for attribute, balls in attributes.items():
+            if attribute in self._by_attribute and ball_name in balls:
+                entries.extend(self._by_attribute[attribute])
+
+        return [entry for entry in dict.fromkeys(entries) if entry.kind == "ability"]
+
+    def abilities_for(self, ball_name: str, attributes: Mapping[str, Iterable[str]]) -> list[type[BaseAbility]]:
+        """
+        Imports and returns the abilities given to a ball. Modules of other plugins are left untouched, and abilities
+        whose module can't be imported are skipped.
+        """
+        abilities = []
+
+        for entry in self.entries_for(ball_name, attributes):
+            if entry.module in self.failed:
+                continue
+
+            try:
+                abilities.append(self.get(entry.key))
+            except Exception:
+                # Plugins are third-party code, which must not prevent the ball from joining the battle.
+                log.exception(f"Could not load the CBattle ability `{entry.key}`, it won't be given to {ball_name}")
+                self.failed.add(entry.module)
+
+        return abilities
+
+    def report(self) -> list[tuple[str, float]]:
+        """
+        Returns the import time of every plugin module imported so far, slowest first.
+        """
+        return sorted(self.import_times.items(), key=lambda item: item[1], reverse=True)
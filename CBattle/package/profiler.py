@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+
+log = logging.getLogger(__name__)
+
+PACKAGE_PATH = str(Path(__file__).parent)
+PROFILES_PATH = Path(__file__).parent / "profiles"
+
+# Names of the locals that hold the battle or the interaction being handled, in the package's own frames.
+BATTLE_LOCALS = ("battle", "self")
+INTERACTION_LOCAL = "interaction"
+
+
+class Capture:
+    """
+    Stack samples of a single battle, counted per collapsed stack.
+    """
+
+    __slots__ = ("user_ids", "armed", "battle_id", "stacks", "samples", "started")
+
+    def __init__(self, user_ids: tuple[int, ...], armed: int | None):
+        self.user_ids = user_ids
+        self.armed = armed
+        self.battle_id: int | None = None
+
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.started = time.monotonic()
+
+    def collapsed(self) -> str:
+        """
+        Returns the samples in the collapsed stack format read by flamegraph.pl, speedscope and most flame graph
+        viewers.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class BattleProfiler:
+    """
+    Sampling profiler limited to the battles it was armed for.
+
+    While at least one battle is captured, a background thread samples the stack of the event loop thread every
+    `interval` seconds. A sample is only kept if one of the package's frames in it handles a captured battle, or an
+    interaction of one of its players before the battle is created. Captures stop on their own after `max_samples`
+    samples or `max_duration` seconds, which bounds the overhead of a forgotten capture.
+    """
+
+    def __init__(
+        self,
+        directory: Path = PROFILES_PATH,
+        interval: float = 0.005,
+        max_samples: int = 20_000,
+        max_duration: float = 900.0,
+    ):
+        self.directory = directory
+        self.interval = interval
+        self.max_samples = max_samples
+        self.max_duration = max_duration
+
+        self.armed: set[int | None] = set()
+        self.captures: list[Capture] = []
+
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._target_thread = 0
+
+    def arm(self, user_id: int | None = None):
+        """
+        Profiles the next battle started by or against the given user, or the next battle started by anyone.
+        """
+        self.armed.add(user_id)
+
+    def begin(self, user_ids: tuple[int, int]) -> Capture | None:
+        """
+        Starts capturing a battle being started, if the profiler is armed for one of its players.
+        """
+        armed = next((user_id for user_id in (*user_ids, None) if user_id in self.armed), False)
+        if armed is False:
+            return None
+
+        self.armed.discard(armed)
+        capture = Capture(user_ids, armed)
+
+        with self._lock:
+            self.captures.append(capture)
+
+        self._target_thread = threading.get_ident()
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._sample, name="cbattle-profiler", daemon=True)
+            self._thread.start()
+
+        return capture
+
+    def bind(self, capture: Capture | None, battle_id: int):
+        if capture is not None:
+            capture.battle_id = battle_id
+
+    def discard(self, capture: Capture | None):
+        """
+        Drops a capture of a battle that couldn't be started, and arms the profiler again for its players.
+        """
+        if capture is None:
+            return
+
+        with self._lock:
+            if capture in self.captures:
+                self.captures.remove(capture)
+
+        self.armed.add(capture.armed)
+
+    def finish(self, battle_id: int) -> Path | None:
+        """
+        Stops capturing a battle and writes its samples. Returns the path of the written file, if the battle was
+        captured.
+        """
+        with self._lock:
+            capture = next((capture for capture in self.captures if capture.battle_id == battle_id), None)
+
+            if capture is None:
+                return None
+
+            self.captures.remove(capture)
+
+        return self._write(capture)
+
+    def _write(self, capture: Capture) -> Path:
+        self.directory.mkdir(exist_ok=True)
+
+        path = self.directory / f"battle-{capture.battle_id}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        path.write_text(capture.collapsed())
+
+        log.info(f"Wrote {capture.samples} samples of battle {capture.battle_id} to {path}.")
+        return path
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+
+            with self._lock:
+                if not self.captures:
+                    return
+
+                frame = sys._current_frames().get(self._target_thread)
+
+                if frame is not None:
+                    self._record(frame)
+
+                expired = [
+                    capture
+                    for capture in self.captures
+                    if capture.samples >= self.max_samples or time.monotonic() - capture.started > self.max_duration
+                ]
+
+                for capture in expired:
+                    self.captures.remove(capture)
+
+            for capture in expired:
+                log.warning(f"Stopped profiling battle {capture.battle_id}, as it reached the sampling limits.")
+                self._write(capture)
+
+    def _record(self, frame: FrameType):
+        stack = []
+        capture = None
+
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+
+            if capture is None and code.co_filename.startswith(PACKAGE_PATH):
+                capture = self._match(frame)
+
+            frame = frame.f_back
+
+        if capture is not None:
+            capture.stacks[";".join(reversed(stack))] += 1
+            capture.samples += 1
+
+    def _match(self, frame: FrameType) -> Capture | None:
+        local_values = frame.f_locals
+
+        for name in BATTLE_LOCALS:
+            value = local_values.get(name)
+            battle_id = getattr(getattr(value, "battle", value), "id", None)
+
+            for capture in self.captures:
+                if capture.battle_id is not None and capture.battle_id == battle_id:
+                    return capture
+
+        user = getattr(local_values.get(INTERACTION_LOCAL), "user", None)
+
+        for capture in self.captures:
+            if capture.battle_id is None and getattr(user, "id", None) in capture.user_ids:
+                return capture
+
+        return None
+
+
+profiler = BattleProfiler()
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from .coordination import Coordinator
+    from .logic import BattleState
+
+
+class BattleRegistry:
+    """
+    Stores every active battle, indexed by battle ID, by the Discord ID of both players and by channel ID.
+
+    Both players of a battle are reserved together when the battle is added, so a user can only ever be part of one
+    battle, and lookups never need a database round-trip. Reservations of other processes are held by the
+    `coordinator`, which is told when a battle is removed.
+    """
+
+    def __init__(self, coordinator: Coordinator | None = None):
+        self.coordinator = coordinator
+        self._battles: dict[int, BattleState] = {}
+        self._users: dict[int, BattleState] = {}
+        self._channels: dict[int, dict[int, BattleState]] = {}
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def __len__(self) -> int:
+        return len(self._battles)
+
+    def __iter__(self) -> Iterator[BattleState]:
+        return iter(list(self._battles.values()))
+
+    def get(self, user_id: int) -> BattleState | None:
+        """
+        Returns the battle a user is part of.
+        """
+        return self._users.get(user_id)
+
+    def get_battle(self, battle_id: int) -> BattleState | None:
+        """
+        Returns the battle with the given battle ID.
+        """
+        return self._battles.get(battle_id)
+
+    def in_channel(self, channel_id: int) -> list[BattleState]:
+        """
+        Returns every battle taking place in a channel.
+        """
+        return list(self._channels.get(channel_id, {}).values())
+
+    def add(self, battle: BattleState) -> bool:
+        """
+        Adds a battle and reserves both of its players. Returns false without adding anything if either player is
+        already part of a battle.
+        """
+        user_ids = battle.player1.user.id, battle.player2.user.id
+
+        if battle.id in self._battles or any(user_id in self._users for user_id in user_ids):
+            return False
+
+        self._battles[battle.id] = battle
+
+        for user_id in user_ids:
+            self._users[user_id] = battle
+
+        if battle.channel is not None:
+            self._channels.setdefault(battle.channel.id, {})[battle.id] = battle
+
+        return True
+
+    def remove(self, battle: BattleState) -> bool:
+        """
+        Removes a battle and frees both of its players. Returns false if the battle wasn't registered.
+        """
+        if self._battles.pop(battle.id, None) is None:
+            return False
+
+        for user_id in (battle.player1.user.id, battle.player2.user.id):
+            if self._users.get(user_id) is battle:
+                del self._users[user_id]
+
+        if battle.channel is not None:
+            channel_battles = self._channels.get(battle.channel.id, {})
+            channel_battles.pop(battle.id, None)
+
+            if not channel_battles:
+                self._channels.pop(battle.channel.id, None)
+
+        if self.coordinator is not None:
+            self.coordinator.drop(battle)
+
+        return True
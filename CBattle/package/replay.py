@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+from .logic import DEFAULT_CRIT_CHANCE, DEFAULT_EVASION, MAX_ROUNDS, BattleBall, BattlePlayer, BattleState
+
+if TYPE_CHECKING:
+    from .config import Config
+    from .logic import AttackResult
+
+
+@dataclass(frozen=True, slots=True)
+class ReplayUser:
+    """
+    Stands in for the Discord user of a player when a battle is replayed.
+    """
+
+    id: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class ReplayBall:
+    """
+    Stores the stats a ball had when its battle was played.
+    """
+
+    name: str
+    health: int
+    attack: int
+    evasion: float = DEFAULT_EVASION
+    crit_chance: float = DEFAULT_CRIT_CHANCE
+    instance_id: int = 0
+
+    @classmethod
+    def from_ball(cls, ball: BattleBall) -> ReplayBall:
+        return cls(ball.name, ball.health, ball.attack, ball.evasion, ball.crit_chance, ball.instance_id)
+
+
+def _index(ball: BattleBall) -> int:
+    # Balls are compared by identity, as two balls with the same stats are equal.
+    return next(index for index, other in enumerate(ball.owner.balls) if other is ball)
+
+
+@dataclass(slots=True)
+class ReplayResult:
+    """
+    Stores every round of a replayed battle and its winner, which is 1 or 2, or 0 if nobody won.
+    """
+
+    seed: int
+    results: list[AttackResult] = field(default_factory=list)
+    winner: int = 0
+
+    @property
+    def rounds(self) -> list[tuple[int, int, int, int]]:
+        """
+        Returns the attacker index, target index, damage and flags of every round, as recorded in the event log.
+        """
+        rounds = []
+
+        for result in self.results:
+            attacker = _index(result.attacker)
+            target = _index(result.target)
+            rounds.append((attacker, target, result.damage, result.flags))
+
+        return rounds
+
+    def matches(self, recorded: Iterable[tuple[int, int, int, int]]) -> bool:
+        """
+        Checks that rounds recorded for a battle are the ones its seed and decks produce.
+        """
+        recorded = list(recorded)
+        return self.rounds[: len(recorded)] == recorded
+
+
+def replay_battle(
+    seed: int,
+    deck1: Sequence[ReplayBall],
+    deck2: Sequence[ReplayBall],
+    config: Config | None = None,
+    max_rounds: int = MAX_ROUNDS,
+    users: tuple[ReplayUser, ReplayUser] = (ReplayUser(0, "Player 1"), ReplayUser(0, "Player 2")),
+) -> ReplayResult:
+    """
+    Plays a battle again from its seed and the stats of both decks, without Discord or the database. The outcome
+    only depends on the seed and the stats, while the messages also depend on the config.
+    """
+    players = [BattlePlayer(model=None, user=user) for user in users]
+
+    for player, deck in zip(players, (deck1, deck2)):
+        player.balls = [
+            BattleBall(
+                model=None,
+                owner=player,
+                health=ball.health,
+                attack=ball.attack,
+                evasion=ball.evasion,
+                crit_chance=ball.crit_chance,
+                instance_id=ball.instance_id,
+                name=ball.name,
+            )
+            for ball in deck
+        ]
+
+    battle = BattleState(player1=players[0], player2=players[1], seed=seed, accepted=True)
+    if config is not None:
+        battle.config = config
+
+    results, winner = battle.play(max_rounds)
+
+    if winner is None:
+        return ReplayResult(seed, results)
+
+    return ReplayResult(seed, results, 1 if winner is battle.player1 else 2)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import random
+import secrets
+from typing import Sequence, TypeVar
+
+T = TypeVar("T")
+
+SEED_BITS = 64
+
+
+def new_seed() -> int:
+    """
+    Returns a random seed for a new battle.
+    """
+    return secrets.randbits(SEED_BITS)
+
+
+class BattleRNG:
+    """
+    Random streams of a single battle, derived from its seed.
+
+    Combat rolls and cosmetic choices come from separate streams, so changing the battle messages in the config
+    never changes the outcome of a battle replayed from the same seed. Both streams are derived again from the seed
+    at the start of every round, which means any round can be rolled again without rolling the ones before it.
+    """
+
+    __slots__ = ("seed", "round_number", "combat", "cosmetic")
+
+    def __init__(self, seed: int, round_number: int = 0):
+        self.seed = seed
+        self.combat = random.Random()
+        self.cosmetic = random.Random()
+        self.seek(round_number)
+
+    def __repr__(self) -> str:
+        return f"BattleRNG({self.seed}, round_number={self.round_number})"
+
+    def seek(self, round_number: int):
+        """
+        Moves both streams to the start of the given round.
+        """
+        self.round_number = round_number
+
+        # String seeds are hashed with SHA-512, which gives independent streams that are stable across processes.
+        self.combat.seed(f"{self.seed}:combat:{round_number}")
+        self.cosmetic.seed(f"{self.seed}:cosmetic:{round_number}")
+
+    def pick(self, length: int) -> int:
+        """
+        Returns the index of a ball picked from a deck of the given length.
+        """
+        return self.combat.randrange(length)
+
+    def chance(self, probability: float) -> bool:
+        return self.combat.random() < probability
+
+    def damage_roll(self, attack: int) -> int:
+        return int(attack * self.combat.uniform(0.6, 1.2))
+
+    def message(self, messages: Sequence[T]) -> T:
+        return self.cosmetic.choice(messages)
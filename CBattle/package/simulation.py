@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Sequence
+
+import numpy as np
+
+from .logic import DEFAULT_CRIT_CHANCE, DEFAULT_EVASION, MAX_ROUNDS
+
+if TYPE_CHECKING:
+    from .logic import BattlePlayer
+
+MIN_DAMAGE_ROLL = 0.6
+MAX_DAMAGE_ROLL = 1.2
+
+
+@dataclass(frozen=True, eq=False)
+class SimDeck:
+    """
+    Stores the stats of a deck as NumPy arrays, one entry per ball.
+    """
+
+    health: np.ndarray
+    attack: np.ndarray
+    evasion: np.ndarray
+    crit_chance: np.ndarray
+    name: str = ""
+
+    def __post_init__(self):
+        sizes = {len(self.health), len(self.attack), len(self.evasion), len(self.crit_chance)}
+
+        if len(sizes) != 1:
+            raise ValueError("All stat arrays of a deck must have the same length.")
+
+    def __len__(self) -> int:
+        return len(self.health)
+
+    @classmethod
+    def from_stats(
+        cls,
+        stats: Sequence[tuple[int, int]],
+        name: str = "",
+        evasion: float = DEFAULT_EVASION,
+        crit_chance: float = DEFAULT_CRIT_CHANCE,
+    ) -> SimDeck:
+        """
+        Creates a deck from `(health, attack)` pairs, using the same evasion and crit chance for every ball.
+        """
+        return cls(
+            health=np.array([health for health, _ in stats], dtype=np.int64),
+            attack=np.array([attack for _, attack in stats], dtype=np.int64),
+            evasion=np.full(len(stats), evasion, dtype=np.float64),
+            crit_chance=np.full(len(stats), crit_chance, dtype=np.float64),
+            name=name,
+        )
+
+    @classmethod
+    def from_player(cls, player: BattlePlayer) -> SimDeck:
+        """
+        Creates a deck from the current stats of a `BattlePlayer`'s balls.
+        """
+        return cls(
+            health=np.array([ball.health for ball in player.balls], dtype=np.int64),
+            attack=np.array([ball.attack for ball in player.balls], dtype=np.int64),
+            evasion=np.array([ball.evasion for ball in player.balls], dtype=np.float64),
+            crit_chance=np.array([ball.crit_chance for ball in player.balls], dtype=np.float64),
+            name=str(player),
+        )
+
+
+@dataclass(eq=False)
+class SimulationResult:
+    """
+    Stores the outcome of a batch of simulated battles.
+
+    `winners` holds 1 or 2 for the winning player of each battle and 0 for battles that hit the round limit.
+    `rounds` holds the amount of attacks each battle took. `survival1` and `survival2` hold, per ball, the fraction
+    of battles the ball was still alive at the end of.
+    """
+
+    winners: np.ndarray
+    rounds: np.ndarray
+    survival1: np.ndarray
+    survival2: np.ndarray
+
+    @property
+    def battles(self) -> int:
+        return len(self.winners)
+
+    @property
+    def player1_wins(self) -> int:
+        return int(np.count_nonzero(self.winners == 1))
+
+    @property
+    def player2_wins(self) -> int:
+        return int(np.count_nonzero(self.winners == 2))
+
+    @property
+    def draws(self) -> int:
+        return int(np.count_nonzero(self.winners == 0))
+
+    @property
+    def player1_win_rate(self) -> float:
+        return self.player1_wins / self.battles if self.battles else 0.0
+
+    @property
+    def player2_win_rate(self) -> float:
+        return self.player2_wins / self.battles if self.battles else 0.0
+
+    @property
+    def round_distribution(self) -> np.ndarray:
+        """
+        Amount of battles that ended after each round count, indexed by round count.
+        """
+        return np.bincount(self.rounds)
+
+    @classmethod
+    def merge(cls, results: Sequence[SimulationResult]) -> SimulationResult:
+        total = sum(result.battles for result in results)
+
+        return cls(
+            winners=np.concatenate([result.winners for result in results]),
+            rounds=np.concatenate([result.rounds for result in results]),
+            survival1=sum(result.survival1 * result.battles for result in results) / total,
+            survival2=sum(result.survival2 * result.battles for result in results) / total,
+        )
+
+
+def _simulate_batch(deck1: SimDeck, deck2: SimDeck, battles: int, rng: np.random.Generator, max_rounds: int):
+    decks = (deck1, deck2)
+    winners = np.zeros(battles, dtype=np.int8)
+    rounds = np.zeros(battles, dtype=np.int64)
+    dead = [np.zeros((battles, len(deck1)), dtype=bool), np.zeros((battles, len(deck2)), dtype=bool)]
+
+    # `BattleState.next_round` checks player 2's deck before player 1's, so an empty deck 2 always loses.
+    if len(deck2) == 0:
+        winners[:] = 1
+    elif len(deck1) == 0:
+        winners[:] = 2
+
+    # The state of running battles is kept compacted and flattened, so that a round only touches one element per
+    # battle. Finished battles are dropped once they make up a large enough share of the batch.
+    running = np.flatnonzero(winners == 0)
+    health = [np.tile(deck.health, len(running)) for deck in decks]
+    running_dead = [np.zeros(len(running) * len(deck), dtype=bool) for deck in decks]
+    alive = [np.full(len(running), len(deck)) for deck in decks]
+    live = np.ones(len(running), dtype=bool)
+    live_count = len(running)
+    offsets = [np.arange(len(running)) * len(deck) for deck in decks]
+    round_number = 0
+
+    while live_count and round_number < max_rounds:
+        round_number += 1
+
+        # The active player is swapped before attacking, so player 2 attacks on odd rounds.
+        attacker = 1 if round_number % 2 else 0
+        defender = 1 - attacker
+        attacking, defending = decks[attacker], decks[defender]
+
+        size = len(running)
+        rolls = rng.random((5, size))
+
+        # Like `attack_target`, dead balls can still be picked as the attacker or the target.
+        attacker_index = (rolls[0] * len(attacking)).astype(np.intp)
+        target_index = (rolls[1] * len(defending)).astype(np.intp)
+        target = offsets[defender] + target_index
+
+        damage = attacking.attack[attacker_index] * (MIN_DAMAGE_ROLL + (MAX_DAMAGE_ROLL - MIN_DAMAGE_ROLL) * rolls[2])
+        damage = damage.astype(np.int64) << (rolls[3] < attacking.crit_chance[attacker_index])
+
+        # Dodged attacks never reach `BattleBall.damage`, so they can't mark a ball as dead either. Battles that
+        # finished but weren't compacted yet are masked out the same way.
+        hit = (rolls[4] >= defending.evasion[target_index]) & live
+
+        target_health = health[defender][target] - damage * hit
+        health[defender][target] = target_health
+
+        killed = hit & (target_health <= 0) & ~running_dead[defender][target]
+        running_dead[defender][target] = running_dead[defender][target] | killed
+        alive[defender] -= killed
+
+        finished = (alive[defender] == 0) & live
+
+        if not finished.any():
+            continue
+
+        done = running[finished]
+        winners[done] = attacker + 1
+        rounds[done] = round_number
+        live &= ~finished
+        live_count -= len(done)
+
+        if live_count > size * 3 // 4:
+            continue
+
+        running = _compact(decks, live, running, health, running_dead, alive, dead)
+        live = np.ones(len(running), dtype=bool)
+        offsets = [np.arange(len(running)) * len(deck) for deck in decks]
+
+    unfinished = running[live]
+    rounds[unfinished] = round_number
+    _compact(decks, np.zeros(len(running), dtype=bool), running, health, running_dead, alive, dead)
+
+    return SimulationResult(
+        winners=winners,
+        rounds=rounds,
+        survival1=(~dead[0]).mean(axis=0) if battles else np.zeros(len(deck1)),
+        survival2=(~dead[1]).mean(axis=0) if battles else np.zeros(len(deck2)),
+    )
+
+
+def _compact(decks, kept, running, health, running_dead, alive, dead) -> np.ndarray:
+    """
+    Drops the battles that aren't kept from the running state in place, storing which of their balls died in `dead`.
+    Returns the indices of the battles that are still running.
+    """
+    dropped = running[~kept]
+
+    for side, deck in enumerate(decks):
+        side_dead = running_dead[side].reshape(len(running), len(deck))
+        dead[side][dropped] = side_dead[~kept]
+
+        health[side] = health[side].reshape(len(running), len(deck))[kept].ravel()
+        running_dead[side] = side_dead[kept].ravel()
+        alive[side] = alive[side][kept]
+
+    return running[kept]
+
+
+def simulate(
+    deck1: SimDeck,
+    deck2: SimDeck,
+    battles: int,
+    seed: int | np.random.Generator | None = None,
+    max_rounds: int = MAX_ROUNDS,
+    batch_size: int = 100_000,
+) -> SimulationResult:
+    """
+    Simulates `battles` battles between two decks without Discord, following the rules of `BattleState.next_round`
+    and `BattleBall.attack_target`. All battles advance together, so every roll of a round is drawn in bulk.
+
+    Parameters
+    ----------
+    deck1: SimDeck
+        The deck of the player that starts the battle.
+    deck2: SimDeck
+        The deck of the player that is challenged, who attacks first.
+    battles: int
+        The amount of battles to simulate.
+    seed: int | np.random.Generator | None
+        The seed or generator used for all rolls.
+    max_rounds: int
+        The amount of rounds after which a battle is counted as a draw.
+    batch_size: int
+        The max amount of battles kept in memory at once.
+    """
+    rng = np.random.default_rng(seed)
+
+    results = [
+        _simulate_batch(deck1, deck2, min(batch_size, battles - start), rng, max_rounds)
+        for start in range(0, battles, batch_size)
+    ]
+
+    if not results:
+        return _simulate_batch(deck1, deck2, 0, rng, max_rounds)
+
+    return results[0] if len(results) == 1 else SimulationResult.merge(results)
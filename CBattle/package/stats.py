@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping
+
+from .config import get_config
+from .logic import DEFAULT_CRIT_CHANCE, DEFAULT_EVASION
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from ballsdex.core.models import BallInstance
+
+    from .config import Config
+
+
+@dataclass(frozen=True, slots=True)
+class BattleStats:
+    """
+    Effective stats of a ball instance in battle, once the modifiers of its config attributes are applied.
+    """
+
+    health: int
+    attack: int
+    evasion: float = DEFAULT_EVASION
+    crit_chance: float = DEFAULT_CRIT_CHANCE
+
+    # The attributes of the ball, which also give it abilities.
+    attributes: tuple[str, ...] = ()
+
+
+def ball_attributes(config: Config) -> Mapping[str, tuple[str, ...]]:
+    """
+    Returns the config attributes of every ball given one, by ball name.
+    """
+    attributes: dict[str, list[str]] = {}
+
+    for attribute, balls in config.attributes.items():
+        for ball in balls:
+            attributes.setdefault(ball, []).append(attribute)
+
+    return MappingProxyType({ball: tuple(names) for ball, names in attributes.items()})
+
+
+def resolve_stats(ballinstance: BallInstance, attributes: tuple[str, ...], config: Config) -> BattleStats:
+    """
+    Computes the battle stats of a ball instance, which must have been fetched with its countryball.
+    """
+    health = ballinstance.health
+    attack = ballinstance.attack
+    health_bonus = attack_bonus = evasion = crit_chance = 0.0
+
+    for attribute in attributes:
+        modifiers = config.modifiers.get(attribute, {})
+
+        health_bonus += modifiers.get("health", 0.0)
+        attack_bonus += modifiers.get("attack", 0.0)
+        evasion += modifiers.get("evasion", 0.0)
+        crit_chance += modifiers.get("crit-chance", 0.0)
+
+    return BattleStats(
+        health=health + int(health * health_bonus * 0.01),
+        attack=attack + int(attack * attack_bonus * 0.01),
+        evasion=min(max(DEFAULT_EVASION + evasion, 0.0), 1.0),
+        crit_chance=min(max(DEFAULT_CRIT_CHANCE + crit_chance, 0.0), 1.0),
+        attributes=attributes,
+    )
+
+
+class StatResolver:
+    """
+    Resolves the battle stats of ball instances, keeping the `maxsize` most recently used in an LRU cache.
+
+    Entries are keyed by instance ID and config version, so reloading the config invalidates every entry at once.
+    Hits never read the stats of the instance. Changes the cache can't notice, like a trade or a new special or
+    bonus, have to drop the entry through `invalidate`.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+
+        self._cache: OrderedDict[tuple[int, int], BattleStats] = OrderedDict()
+        self._version = 0
+        self._attributes: Mapping[str, tuple[str, ...]] = MappingProxyType({})
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def resolve(self, ballinstance: BallInstance, config: Config | None = None) -> BattleStats:
+        config = config or get_config()
+
+        if config.version != self._version:
+            # Entries of older versions could never be hit again.
+            self._cache.clear()
+            self._version = config.version
+            self._attributes = ball_attributes(config)
+
+        key = (ballinstance.pk, config.version)
+        stats = self._cache.get(key)
+
+        if stats is not None:
+            self._cache.move_to_end(key)
+            metrics.inc("cbattle_stat_cache_total", result="hit")
+            return stats
+
+        stats = resolve_stats(ballinstance, self._attributes.get(ballinstance.countryball.country, ()), config)
+        self._cache[key] = stats
+        self._cache.move_to_end(key)
+
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+        metrics.inc("cbattle_stat_cache_total", result="miss")
+        return stats
+
+    def invalidate(self, instance_id: int):
+        """
+        Drops the cached stats of a ball instance, so they are resolved again the next time it joins a deck.
+        """
+        self._cache.pop((instance_id, self._version), None)
+
+    def clear(self):
+        self._cache.clear()
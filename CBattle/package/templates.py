@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from string import Formatter
+from typing import Iterable
+
+# Order of the arguments taken by `MessageTemplate.render`.
+PLACEHOLDERS = ("a_owner", "a_name", "d_owner", "d_name", "dmg")
+
+
+class MessageTemplate:
+    """
+    Battle message parsed once into a positional format string, so rendering is a single `str.format` call with no
+    keyword dictionary.
+    """
+
+    __slots__ = ("source", "compiled", "fields")
+
+    def __init__(self, source: str, allowed: Iterable[str] = PLACEHOLDERS):
+        allowed = set(allowed)
+        compiled = []
+        fields = set()
+
+        for literal, field_name, format_spec, conversion in Formatter().parse(source):
+            compiled.append(literal.replace("{", "{{").replace("}", "}}"))
+
+            if field_name is None:
+                continue
+
+            if field_name not in allowed:
+                raise ValueError(
+                    f"Unknown placeholder {{{field_name}}} in message {source!r}, "
+                    f"expected one of {', '.join(sorted(allowed))}."
+                )
+
+            # Nested fields would be looked up by name when rendering, which the positional arguments can't provide.
+            if "{" in format_spec:
+                raise ValueError(f"Placeholder {{{field_name}}} in message {source!r} can't have nested fields.")
+
+            fields.add(field_name)
+            compiled.append(
+                "{"
+                + str(PLACEHOLDERS.index(field_name))
+                + (f"!{conversion}" if conversion else "")
+                + (f":{format_spec}" if format_spec else "")
+                + "}"
+            )
+
+        self.source = source
+        self.compiled = "".join(compiled)
+        self.fields = frozenset(fields)
+
+        # Rendered once with placeholder values, so invalid format specs or conversions are reported right away.
+        try:
+            self.render("", "", "", "", 0)
+        except (ValueError, TypeError) as error:
+            raise ValueError(f"Invalid format in message {source!r}: {error}") from error
+
+    def __repr__(self) -> str:
+        return f"MessageTemplate({self.source!r})"
+
+    def render(self, a_owner: str, a_name: str, d_owner: str, d_name: str, dmg: int = 0) -> str:
+        return self.compiled.format(a_owner, a_name, d_owner, d_name, dmg)
+
+
+def compile_messages(messages: list[str], allowed: Iterable[str] = PLACEHOLDERS) -> list[MessageTemplate]:
+    """
+    Compiles a list of messages, raising a `ValueError` if any of them uses a placeholder that isn't allowed or
+    can't be rendered.
+    """
+    return [MessageTemplate(message, allowed) for message in messages]
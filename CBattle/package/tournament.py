@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from itertools import combinations
+from typing import Iterator, Sequence
+
+import numpy as np
+
+from .simulation import SimDeck, simulate
+
+ELO_BASE = 1500
+ELO_SCALE = 400
+
+
+@dataclass
+class MatchupResult:
+    """
+    Stores the outcome of every battle played between two decks of a tournament.
+    """
+
+    deck1: int
+    deck2: int
+
+    wins1: int
+    wins2: int
+    draws: int
+
+    @property
+    def battles(self) -> int:
+        return self.wins1 + self.wins2 + self.draws
+
+
+@dataclass
+class TournamentResult:
+    """
+    Stores the standings of a tournament, updated as each matchup finishes.
+    """
+
+    names: list[str]
+    wins: np.ndarray = field(init=False)
+    games: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.wins = np.zeros((len(self.names), len(self.names)))
+        self.games = np.zeros((len(self.names), len(self.names)))
+
+    def add(self, matchup: MatchupResult):
+        """
+        Adds the result of a matchup. Draws count as half a win for both decks.
+        """
+        i, j = matchup.deck1, matchup.deck2
+
+        self.wins[i, j] += matchup.wins1 + matchup.draws / 2
+        self.wins[j, i] += matchup.wins2 + matchup.draws / 2
+        self.games[i, j] += matchup.battles
+        self.games[j, i] += matchup.battles
+
+    @property
+    def win_rates(self) -> np.ndarray:
+        """
+        Matrix where each entry `[i, j]` is the rate at which deck `i` beats deck `j`, or NaN if they haven't played.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.wins / self.games
+
+    def bradley_terry(self, iterations: int = 200, prior: float = 0.5, tolerance: float = 1e-9) -> np.ndarray:
+        """
+        Fits a Bradley-Terry strength to every deck using the MM algorithm. `prior` adds virtual wins in both
+        directions of every played matchup, so decks that never win still get a finite strength.
+        """
+        played = self.games > 0
+        wins = self.wins + prior * played
+        games = self.games + 2 * prior * played
+
+        strengths = np.ones(len(self.names))
+        total_wins = wins.sum(axis=1)
+
+        for _ in range(iterations):
+            pair_sums = strengths[:, None] + strengths[None, :]
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                denominator = np.where(played, games / pair_sums, 0).sum(axis=1)
+                updated = np.where(denominator > 0, total_wins / denominator, 1.0)
+
+            updated /= np.exp(np.log(updated).mean())
+
+            if np.abs(updated - strengths).max() < tolerance:
+                return updated
+
+            strengths = updated
+
+        return strengths
+
+    def elo(self) -> np.ndarray:
+        """
+        Converts the Bradley-Terry strengths into Elo ratings centered around `ELO_BASE`.
+        """
+        return ELO_BASE + ELO_SCALE * np.log10(self.bradley_terry())
+
+    def ranking(self) -> list[tuple[str, float]]:
+        """
+        Returns every deck name with its Elo rating, from strongest to weakest.
+        """
+        ratings = self.elo()
+        order = np.argsort(-ratings, kind="stable")
+
+        return [(self.names[index], float(ratings[index])) for index in order]
+
+
+def _play_matchup(
+    deck1: SimDeck, deck2: SimDeck, indices: tuple[int, int], battles: int, seed: np.random.SeedSequence
+) -> MatchupResult:
+    # The challenged player attacks first, so each deck plays half of the battles on each side.
+    rng = np.random.default_rng(seed)
+    first = simulate(deck1, deck2, math.ceil(battles / 2), rng)
+    second = simulate(deck2, deck1, battles // 2, rng)
+
+    return MatchupResult(
+        deck1=indices[0],
+        deck2=indices[1],
+        wins1=first.player1_wins + second.player2_wins,
+        wins2=first.player2_wins + second.player1_wins,
+        draws=first.draws + second.draws,
+    )
+
+
+def run_tournament(
+    decks: Sequence[SimDeck], battles: int, seed: int | None = None, max_workers: int | None = None
+) -> Iterator[tuple[MatchupResult, TournamentResult]]:
+    """
+    Plays every pair of decks against each other across a process pool, yielding each matchup as it finishes along
+    with the updated standings. The last standings yielded are the final results of the tournament.
+
+    Every matchup gets its own child of the tournament's seed sequence, so results are the same no matter which
+    worker plays a matchup or in which order matchups finish.
+
+    Parameters
+    ----------
+    decks: Sequence[SimDeck]
+        The decks taking part in the tournament.
+    battles: int
+        The amount of battles played for every pair of decks.
+    seed: int | None
+        The seed of the tournament. Leaving it empty makes the tournament unreproducible.
+    max_workers: int | None
+        The amount of worker processes, defaults to the amount of CPUs.
+    """
+    pairs = list(combinations(range(len(decks)), 2))
+    seeds = np.random.SeedSequence(seed).spawn(len(pairs))
+    standings = TournamentResult([deck.name or f"Deck {index + 1}" for index, deck in enumerate(decks)])
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_play_matchup, decks[i], decks[j], (i, j), battles, matchup_seed)
+            for (i, j), matchup_seed in zip(pairs, seeds)
+        ]
+
+        for future in as_completed(futures):
+            matchup = future.result()
+            standings.add(matchup)
+
+            yield matchup, standings
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable
+
+import discord
+
+from .config import get_config
+from .metrics import count_request
+
+log = logging.getLogger(__name__)
+
+Render = Callable[[], Awaitable[dict[str, Any]]]
+Edit = Callable[..., Awaitable[Any]]
+
+
+def _digest(kwargs: dict[str, Any]) -> int:
+    """
+    Hashes the rendered content of an edit, so unchanged renders can be skipped.
+    """
+    parts = []
+
+    for key, value in sorted(kwargs.items()):
+        if isinstance(value, discord.Embed):
+            value = value.to_dict()
+        elif isinstance(value, discord.ui.View):
+            value = value.to_components()
+        elif key == "attachments":
+            value = [attachment.filename for attachment in value]
+
+        parts.append((key, value))
+
+    return hash(json.dumps(parts, sort_keys=True, default=str))
+
+
+class EditScheduler:
+    """
+    Coalesces edits of a message. Every edit requested within `window` seconds of the first pending one is merged
+    into a single edit of the latest rendered state, and renders identical to the last sent one are skipped.
+    """
+
+    def __init__(self, render: Render, edit: Edit | None = None, window: float | None = None):
+        self.render = render
+        self.edit = edit
+        self.window = get_config().edit_window if window is None else window
+
+        self._pending: asyncio.Task | None = None
+
+        # Edit of the latest deferred interaction, for messages without an edit of their own. Interaction tokens
+        # expire, so it's only used for the flush answering that interaction.
+        self._response_edit: Edit | None = None
+
+        self._last_digest: int | None = None
+        self._last_edit = 0.0
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not None and not self._pending.done()
+
+    def schedule(self):
+        """
+        Requests an edit, which is sent once the current window is over.
+        """
+        if self.pending:
+            return
+
+        self._pending = asyncio.create_task(self._delayed_flush())
+
+    def cancel(self):
+        """
+        Drops the pending edit, if there is one.
+        """
+        self._drop_pending()
+        self._response_edit = None
+
+    async def flush(self):
+        """
+        Sends the latest state right away, unless it's identical to the last sent one.
+        """
+        self._drop_pending()
+        await self._send()
+
+    async def respond(self, interaction: discord.Interaction):
+        """
+        Responds to a component interaction on the scheduled message. If no edit was sent during the current window,
+        the interaction is answered with the edit directly. Otherwise, it is deferred and the edit gets merged.
+        """
+        loop = asyncio.get_running_loop()
+
+        if self.pending or loop.time() - self._last_edit < self.window:
+            await interaction.response.defer()
+            self._response_edit = interaction.edit_original_response
+            self.schedule()
+            return
+
+        kwargs = await self.render()
+        digest = _digest(kwargs)
+
+        if digest == self._last_digest:
+            await interaction.response.defer()
+            return
+
+        await interaction.response.edit_message(**kwargs)
+        self._last_digest = digest
+        self._last_edit = loop.time()
+
+    def _drop_pending(self):
+        if self.pending:
+            self._pending.cancel()
+
+        self._pending = None
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.window)
+        self._pending = None
+
+        # Nothing awaits this task, so its errors are logged here instead of surfacing when it's garbage collected.
+        try:
+            await self._send()
+        except discord.HTTPException as error:
+            log.warning(f"Could not send a scheduled edit: {error}")
+        except Exception:
+            log.exception("Could not send a scheduled edit")
+
+    async def _send(self):
+        edit = self.edit or self._response_edit
+        self._response_edit = None
+
+        if edit is None:
+            return
+
+        kwargs = await self.render()
+        digest = _digest(kwargs)
+
+        if digest == self._last_digest:
+            return
+
+        await edit(**kwargs)
+        count_request("edit")
+        self._last_digest = digest
+        self._last_edit = asyncio.get_running_loop().time()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import BinaryIO, Generic, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BufferedWriter(Generic[T]):
+    """
+    Buffers items in memory and writes them in batches from a worker thread, every `flush_interval` seconds and when
+    closed, so the interaction producing an item never waits for the disk.
+
+    Subclasses open their file or connection in `open`, write a batch in `_write` and release it in `_close`. A
+    batch failing with one of the `retried` errors is buffered again for the next flush, any other error drops it.
+    """
+
+    # Name of the buffered items in log messages.
+    description = "items"
+    retried: tuple[type[Exception], ...] = ()
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+
+        self.pending: list[T] = []
+        self.task: asyncio.Task | None = None
+
+        # Held while a batch is written, so closing waits for a write running in a worker thread.
+        self._flushing = asyncio.Lock()
+
+    @property
+    def opened(self) -> bool:
+        raise NotImplementedError
+
+    def open(self):
+        self.task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        await self.flush()
+
+        if self.pending:
+            log.error(f"Could not write {len(self.pending)} {self.description} before closing")
+
+        async with self._flushing:
+            if self.opened:
+                await asyncio.to_thread(self._close)
+
+    async def flush(self):
+        """
+        Writes every buffered item.
+        """
+        async with self._flushing:
+            if not self.pending or not self.opened:
+                return
+
+            items, self.pending = self.pending, []
+
+            try:
+                await asyncio.to_thread(self._write, items)
+            except self.retried:
+                log.exception(f"Could not write {len(items)} {self.description}, retrying with the next flush")
+                self.pending[:0] = items
+            except Exception:
+                log.exception(f"Could not write {len(items)} {self.description}")
+
+    def _write(self, items: list[T]):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            # A flush keeps going when the loop is cancelled, as its write can't be interrupted.
+            await asyncio.shield(self.flush())
+
+
+class FileWriter(BufferedWriter[bytes]):
+    """
+    Appends buffered chunks of bytes to a file, followed by an fsync.
+    """
+
+    def __init__(self, path: Path, flush_interval: float):
+        super().__init__(flush_interval)
+        self.path = path
+        self.file: BinaryIO | None = None
+
+    @property
+    def opened(self) -> bool:
+        return self.file is not None
+
+    def open(self):
+        self.file = self.path.open("ab")
+        super().open()
+
+    def _write(self, items: list[bytes]):
+        self.file.write(b"".join(items))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _close(self):
+        self.file.close()
+        self.file = None
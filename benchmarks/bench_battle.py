@@ -0,0 +1,179 @@
+"""
+Benchmarks of the battle hot paths, run with `pytest` from the repository root.
+
+Every run is saved as JSON in `.benchmarks/`. Compare a run against the previous one with
+`pytest --benchmark-compare --benchmark-compare-fail=mean:10%`.
+"""
+
+import pytest
+
+from benchmarks.compact import CompactBattle
+from benchmarks.memory import measure
+from benchmarks.standins import make_battle, make_instance
+from CBattle.package.battlelog import LOG_CAPACITY, RECORD, LogView
+from CBattle.package.cog import THUMBNAILS, TUTORIAL
+from CBattle.package.components import BattleAcceptView, TurnView
+from CBattle.package.config import get_config
+from CBattle.package.embeds import AssetCache, build_tutorial
+from CBattle.package.logic import BattlePlayer
+from CBattle.package.pagination import TutorialPages
+from CBattle.package.stats import StatResolver
+
+DECK_SIZES = range(1, get_config().max_ball_amount + 1)
+
+
+def test_next_round(benchmark):
+    battle = make_battle(get_config().max_ball_amount, health=10**15)
+
+    result = benchmark(battle.next_round)
+
+    assert not isinstance(result, BattlePlayer)
+
+
+@pytest.mark.parametrize("deck_size", DECK_SIZES)
+def test_full_battle(benchmark, deck_size):
+    seeds = iter(range(10**9))
+
+    def setup():
+        return (make_battle(deck_size, next(seeds)),), {}
+
+    messages, winner = benchmark.pedantic(lambda battle: battle.play(), setup=setup, rounds=200)
+
+    assert winner is not None and messages
+
+
+@pytest.mark.parametrize("rounds", (100, 10_000))
+def test_long_battle_log(benchmark, rounds):
+    """
+    Plays a round and renders the turn view's log after a battle already lasted `rounds` rounds. The log keeps the
+    same size however long the battle lasts.
+    """
+    battle = make_battle(get_config().max_ball_amount, health=10**15)
+    view = LogView(battle)
+
+    for _ in range(rounds):
+        battle.next_round()
+
+    def play():
+        battle.next_round()
+        return view.update()
+
+    description = benchmark(play)
+
+    benchmark.extra_info["log_bytes"] = len(battle.log.buffer)
+    assert description.count("\n") == view.lines.maxlen - 1
+    assert len(battle.log.buffer) <= LOG_CAPACITY * RECORD.size
+
+
+def test_accept_embed(benchmark, loop):
+    battle = make_battle(get_config().max_ball_amount)
+
+    async def make_view():
+        return BattleAcceptView(battle)
+
+    view = loop.run_until_complete(make_view())
+    embed = benchmark(view.get_embed)
+
+    assert len(embed.fields) == 2
+
+
+def test_tutorial_page(benchmark, loop):
+    pages = build_tutorial(TUTORIAL, THUMBNAILS, AssetCache())
+
+    async def make_view():
+        return TutorialPages(pages, None)
+
+    view = loop.run_until_complete(make_view())
+    view.current = 3
+
+    kwargs = benchmark(lambda: loop.run_until_complete(view.render()))
+
+    assert kwargs["embed"] is pages[3].embed and kwargs["attachments"][0].filename == THUMBNAILS[3]
+
+
+def test_battle_status(benchmark):
+    battle = make_battle(get_config().max_ball_amount)
+    battle.play()
+
+    status = benchmark(TurnView.get_battle_status, battle.player1)
+
+    assert status.count("\n") == get_config().max_ball_amount - 1
+
+
+def test_memory_per_battle(benchmark):
+    deck_size = get_config().max_ball_amount
+
+    # pytest-benchmark only records timings, so the memory footprint is stored next to them in the JSON results.
+    benchmark.extra_info["bytes_per_battle"] = measure(lambda seed: make_battle(deck_size, seed), 1000)
+    benchmark(make_battle, deck_size)
+
+
+def test_compact_round_trip():
+    """
+    A battle rebuilt from its packed form plays on exactly like the original, with the same log.
+    """
+    battle = make_battle(3, seed=7, health=10**12)
+
+    # Enough rounds for the log to wrap around.
+    for _ in range(LOG_CAPACITY + 10):
+        battle.next_round()
+
+    battle.finished = True
+    restored = CompactBattle(battle).to_state(battle.player1.user, battle.player2.user)
+
+    def snapshot(state):
+        balls = [
+            (
+                ball.instance_id,
+                ball.name,
+                ball.label,
+                ball.health,
+                ball.attack,
+                ball.evasion,
+                ball.crit_chance,
+                ball.dead,
+            )
+            for player in (state.player1, state.player2)
+            for ball in player.balls
+        ]
+        flags = (state.started, state.accepted, state.auto, state.finished, state.active_player is state.player2)
+        return state.id, state.seed, state.round_number, flags, balls, list(state.log.records())
+
+    assert snapshot(restored) == snapshot(battle)
+
+    battle.finished = restored.finished = False
+    assert str(restored.next_round()) == str(battle.next_round())
+
+
+@pytest.mark.parametrize("cached", (False, True))
+def test_resolve_deck(benchmark, cached):
+    """
+    Resolves the stats of a full deck, either from scratch or from the stat cache.
+    """
+    deck = [make_instance(slot + 1, slot) for slot in range(get_config().max_ball_amount)]
+    resolver = StatResolver()
+
+    def resolve():
+        if not cached:
+            resolver.clear()
+
+        return [resolver.resolve(instance) for instance in deck]
+
+    stats = benchmark(resolve)
+
+    assert len(stats) == len(deck) and len(resolver) == len(deck)
+
+
+def test_invalidate_stats():
+    """
+    Cached stats are kept until the instance is invalidated, however its own stats change.
+    """
+    instance = make_instance(1, 0)
+    resolver = StatResolver()
+    stats = resolver.resolve(instance)
+
+    instance.health += 100
+    assert resolver.resolve(instance) is stats
+
+    resolver.invalidate(instance.pk)
+    assert resolver.resolve(instance).health == stats.health + 100
@@ -0,0 +1,155 @@
+"""
+Stress tests of concurrent button presses on battles, run with `pytest` from the repository root.
+
+Discord delivers the interactions of a battle concurrently, and every response awaits a request, so presses of
+the same button can interleave. Requests are simulated with a random delay, many battles are run at once, and every
+battle must end up with no round lost or played twice and a single winner announcement.
+"""
+
+import asyncio
+import random
+from types import SimpleNamespace
+
+from benchmarks.standins import make_battle
+from CBattle.package.components import BattleAcceptView, TurnView
+
+BATTLES = 50
+PRESSES = 40
+
+
+async def request(rng: random.Random):
+    await asyncio.sleep(rng.random() * 0.002)
+
+
+class FakeMessage:
+    def __init__(self, rng: random.Random, content: str | None = None, view=None):
+        self.rng = rng
+        self.content = content
+        self.view = view
+
+    async def edit(self, **kwargs):
+        await request(self.rng)
+
+    async def delete(self):
+        await request(self.rng)
+
+
+class FakeChannel:
+    """
+    Records the messages sent to it.
+    """
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.messages: list[FakeMessage] = []
+
+    async def send(self, content: str | None = None, view=None, **kwargs) -> FakeMessage:
+        await request(self.rng)
+
+        message = FakeMessage(self.rng, content, view)
+        self.messages.append(message)
+
+        return message
+
+
+class FakeResponse:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    async def send_message(self, *args, **kwargs):
+        await request(self.rng)
+
+    async def edit_message(self, **kwargs):
+        await request(self.rng)
+
+    async def defer(self):
+        await request(self.rng)
+
+
+def make_interaction(user: SimpleNamespace, rng: random.Random) -> SimpleNamespace:
+    async def edit_original_response(**kwargs):
+        await request(rng)
+
+    return SimpleNamespace(
+        user=user, response=FakeResponse(rng), edit_original_response=edit_original_response, message=None
+    )
+
+
+async def press(item, user: SimpleNamespace, rng: random.Random):
+    await asyncio.sleep(rng.random() * 0.002)
+    await item.callback(make_interaction(user, rng))
+
+
+async def lock_battle(seed: int) -> tuple[list[TurnView], int]:
+    """
+    Has both players of a battle spam the lock button. Returns the turn views sent and the rounds played.
+    """
+    rng = random.Random(seed)
+    battle = make_battle(3, seed, start=False)
+    battle.channel = FakeChannel(rng)
+
+    view = BattleAcceptView(battle)
+    view.message = FakeMessage(rng)
+    battle.accept_view = view
+
+    users = (battle.player1.user, battle.player2.user)
+    await asyncio.gather(*(press(view.lock_button, users[index % 2], rng) for index in range(PRESSES)))
+    view.stop()
+
+    turn_views = [message.view for message in battle.channel.messages if isinstance(message.view, TurnView)]
+    return turn_views, battle.round_number
+
+
+async def play_battle(seed: int, health: int | None) -> tuple[int, int, int]:
+    """
+    Has both players of a started battle spam the next turn button. Returns the rounds played, the rounds the
+    battle lasts when played at once, and the amount of winner announcements.
+    """
+    rng = random.Random(seed)
+    battle = make_battle(3, seed, health)
+    battle.channel = FakeChannel(rng)
+
+    view = TurnView(battle)
+    view.message = FakeMessage(rng)
+    battle.last_turn = view
+
+    users = (battle.player1.user, battle.player2.user)
+    await asyncio.gather(*(press(view.next_turn_button, users[index % 2], rng) for index in range(PRESSES)))
+    view.editor.cancel()
+    view.stop()
+
+    expected = make_battle(3, seed, health)
+    expected.play(max_rounds=PRESSES)
+
+    announcements = sum(
+        1 for message in battle.channel.messages if message.content and message.content.startswith("Battle finished")
+    )
+    return battle.round_number, expected.round_number, announcements
+
+
+def test_concurrent_locks(loop):
+    async def run():
+        return await asyncio.gather(*(lock_battle(seed) for seed in range(BATTLES)))
+
+    for turn_views, round_number in loop.run_until_complete(run()):
+        assert len(turn_views) == 1
+        assert round_number == 0
+
+
+def test_concurrent_turns_without_winner(loop):
+    async def run():
+        return await asyncio.gather(*(play_battle(seed, 10**15) for seed in range(BATTLES)))
+
+    for round_number, _, announcements in loop.run_until_complete(run()):
+        assert round_number == PRESSES
+        assert announcements == 0
+
+
+def test_concurrent_turns_until_winner(loop):
+    async def run():
+        return await asyncio.gather(*(play_battle(seed, 100) for seed in range(BATTLES)))
+
+    for round_number, rounds, announcements in loop.run_until_complete(run()):
+        assert rounds < PRESSES
+        assert round_number == rounds
+        assert announcements == 1
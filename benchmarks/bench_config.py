@@ -0,0 +1,102 @@
+"""
+Benchmarks of loading the config and rendering its messages, run with `pytest` from the repository root.
+"""
+
+import pytest
+
+from CBattle.package.config import CONFIG_PATH, Config, ConfigError
+from CBattle.package.templates import MessageTemplate
+
+MESSAGES = """
+[messages]
+attack = ["{a_owner}'s {a_name} dealt {dmg} damage to {d_owner}'s {d_name}."]
+defeat = ["{d_owner}'s {d_name} was defeated."]
+dodge = ["{d_name} dodged."]
+"""
+
+
+def load(tmp_path, source: str) -> Config:
+    path = tmp_path / "config.toml"
+    path.write_text(source, encoding="utf-8")
+    return Config.load(path)
+
+
+def test_load(benchmark):
+    config = benchmark(Config.load, CONFIG_PATH)
+
+    assert config.attack_messages and config.defeat_messages and config.dodge_messages
+
+
+def test_render(benchmark):
+    template = MessageTemplate("{a_owner}'s {a_name} dealt {dmg:,} damage to {d_owner}'s {d_name}!")
+
+    message = benchmark(template.render, "Alice", "Poland", "Bob", "Brazil", 12345)
+
+    assert message == "Alice's Poland dealt 12,345 damage to Bob's Brazil!"
+
+
+def test_load_minimal(tmp_path):
+    config = load(tmp_path, MESSAGES)
+
+    assert config.event_log == "" and config.history_database == "" and config.log_export == ""
+    assert config.max_ball_amount >= 1 and config.modifiers == {}
+
+
+@pytest.mark.parametrize(
+    "source",
+    (
+        "[unknown]\n",
+        "settings = 1\n",
+        "[settings]\nunknown = 1\n",
+        "[settings]\nmax-ball-amount = true\n",
+        "[settings]\nmax-ball-amount = 0\n",
+        "[settings]\nedit-window = '1'\n",
+        "[settings]\nmetrics-port = 70000\n",
+        "[settings]\nbattle-timeout = -1\n",
+        "[settings]\ncoordination-url = 'http://localhost'\n",
+        "[attributes]\nshiny = 'Poland'\n",
+        "[modifiers]\nshiny = { health = 1.5 }\n",
+        "[attributes]\nshiny = ['Poland']\n[modifiers]\nshiny = { speed = 1.5 }\n",
+        "[attributes]\nshiny = ['Poland']\n[modifiers]\nshiny = { health = '1.5' }\n",
+        "[attributes]\nshiny = ['Poland']\n[modifiers]\nshiny = { health = false }\n",
+    ),
+)
+def test_load_rejects_schema(tmp_path, source):
+    with pytest.raises(ConfigError):
+        load(tmp_path, source + MESSAGES)
+
+
+@pytest.mark.parametrize(
+    "messages",
+    (
+        "attack = ['{a_owner} attacked.']\ndefeat = ['{d_name} was defeated.']\n",
+        "attack = []\ndefeat = ['{d_name} was defeated.']\ndodge = ['{d_name} dodged.']\n",
+        "attack = [1]\ndefeat = ['{d_name} was defeated.']\ndodge = ['{d_name} dodged.']\n",
+        "attack = ['{damage}']\ndefeat = ['{d_name} was defeated.']\ndodge = ['{d_name} dodged.']\n",
+        "attack = ['{a_owner} attacked.']\ndefeat = ['{d_name} was defeated.']\ndodge = ['{d_name} took {dmg}.']\n",
+        "attack = ['{a_owner} attacked.']\ndefeat = ['{d_name} was defeated.']\ndodge = ['{d_name']\n",
+    ),
+)
+def test_load_rejects_messages(tmp_path, messages):
+    with pytest.raises(ConfigError):
+        load(tmp_path, "[messages]\n" + messages)
+
+
+def test_load_rejects_invalid_toml(tmp_path):
+    with pytest.raises(ConfigError):
+        load(tmp_path, MESSAGES + "[settings\n")
+
+
+@pytest.mark.parametrize(
+    "source", ("{attacker}", "{0}", "{}", "{a_name.upper}", "{dmg:{a_name}}", "{dmg:q}", "{a_name!z}", "{a_name")
+)
+def test_template_rejects(source):
+    with pytest.raises(ValueError):
+        MessageTemplate(source)
+
+
+def test_template_render():
+    template = MessageTemplate("{{{a_name!r}}} {dmg:>4} {dmg}% {d_owner}")
+
+    assert template.fields == {"a_name", "dmg", "d_owner"}
+    assert template.render("Alice", "Poland", "Bob", "Brazil", 42) == "{'Poland'}   42 42% Bob"
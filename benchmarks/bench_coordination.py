@@ -0,0 +1,129 @@
+"""
+Benchmarks of the battle coordinator, run with `pytest` from the repository root.
+
+Thousands of `/battle start` calls reserve random pairs out of a smaller pool of players at once, so many of them
+compete for the same players. With Redis, the calls are spread over several shards, each with its own connection
+to a stand-in server. The latency of every reservation is saved in the extra info of the benchmark, and no player
+may ever end up reserved for two battles.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.resp import RespServer
+from CBattle.package.coordination import Coordinator, LocalCoordinator, RedisCoordinator, RespClient
+
+STARTS = 5_000
+PLAYERS = 2_000
+SHARDS = 4
+
+
+def make_battles(count: int, seed: int = 0) -> list[SimpleNamespace]:
+    """
+    Stands in for battles between random players, with only what the coordinator reads.
+    """
+    rng = random.Random(seed)
+    battles = []
+
+    for battle_id in range(1, count + 1):
+        user1, user2 = rng.sample(range(PLAYERS), 2)
+        battles.append(
+            SimpleNamespace(
+                id=battle_id,
+                player1=SimpleNamespace(user=SimpleNamespace(id=user1)),
+                player2=SimpleNamespace(user=SimpleNamespace(id=user2)),
+                finished=False,
+            )
+        )
+
+    return battles
+
+
+async def start_battles(coordinators: list[Coordinator], battles: list[SimpleNamespace]) -> list[float]:
+    """
+    Reserves the players of every battle concurrently, alternating between shards. Returns the latency of every
+    reservation.
+    """
+    latencies = []
+
+    async def start(coordinator: Coordinator, battle: SimpleNamespace):
+        begin = time.perf_counter()
+        await coordinator.reserve(battle)
+        latencies.append(time.perf_counter() - begin)
+
+    await asyncio.gather(
+        *(start(coordinators[index % len(coordinators)], battle) for index, battle in enumerate(battles))
+    )
+    return latencies
+
+
+def check_exclusive(coordinators: list[Coordinator]) -> int:
+    """
+    Asserts that no player is reserved for two battles, across every shard. Returns the amount of battles started.
+    """
+    reserved = [
+        user_id
+        for coordinator in coordinators
+        for battle in coordinator.leases.values()
+        for user_id in (battle.player1.user.id, battle.player2.user.id)
+    ]
+    assert len(reserved) == len(set(reserved))
+
+    return len(reserved) // 2
+
+
+def record(benchmark, latencies: list[float], started: int):
+    quantiles = statistics.quantiles(latencies, n=100)
+
+    benchmark.extra_info["started"] = started
+    benchmark.extra_info["p50_ms"] = quantiles[49] * 1000
+    benchmark.extra_info["p95_ms"] = quantiles[94] * 1000
+    benchmark.extra_info["p99_ms"] = quantiles[98] * 1000
+
+
+def test_local_starts(benchmark, loop):
+    battles = make_battles(STARTS)
+    latencies = []
+
+    def setup():
+        return ([LocalCoordinator("local")],), {}
+
+    def run(coordinators: list[Coordinator]) -> list[Coordinator]:
+        latencies[:] = loop.run_until_complete(start_battles(coordinators, battles))
+        return coordinators
+
+    coordinators = benchmark.pedantic(run, setup=setup, rounds=10)
+
+    record(benchmark, latencies, check_exclusive(coordinators))
+
+
+@pytest.mark.parametrize("shards", (1, SHARDS))
+def test_redis_starts(benchmark, loop, shards):
+    battles = make_battles(STARTS)
+    server = RespServer()
+    latencies = []
+
+    loop.run_until_complete(server.start())
+    clients = [RespClient("127.0.0.1", server.port) for _ in range(shards)]
+
+    def setup():
+        server.data.clear()
+        return ([RedisCoordinator(client, f"shard-{index}") for index, client in enumerate(clients)],), {}
+
+    def run(coordinators: list[Coordinator]) -> list[Coordinator]:
+        latencies[:] = loop.run_until_complete(start_battles(coordinators, battles))
+        return coordinators
+
+    try:
+        coordinators = benchmark.pedantic(run, setup=setup, rounds=10)
+    finally:
+        for client in clients:
+            loop.run_until_complete(client.close())
+        loop.run_until_complete(server.stop())
+
+    record(benchmark, latencies, check_exclusive(coordinators))
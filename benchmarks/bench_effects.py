@@ -0,0 +1,119 @@
+"""
+Benchmarks of the effect engine, run with `pytest` from the repository root.
+"""
+
+from dataclasses import dataclass, field
+
+import pytest
+
+from benchmarks.effects import Marker, Weaken
+from benchmarks.standins import make_battle
+from CBattle.package.base import BaseEffect
+from CBattle.package.engine import EffectEngine
+
+STACKED = (0, 500)
+
+
+@dataclass(eq=False)
+class Tracked(BaseEffect):
+    """
+    Effect recording the rounds it saw and how many times it expired.
+    """
+
+    rounds_seen: list[int] = field(default_factory=list)
+    expired: int = 0
+
+    def round_passed(self, round_number: int):
+        self.rounds_seen.append(round_number)
+
+    def on_expire(self):
+        self.expired += 1
+
+
+@dataclass(eq=False)
+class Remover(Tracked):
+    """
+    Effect removing other effects of the battle when a round starts, then applying a new one to its ball.
+    """
+
+    engine: EffectEngine | None = None
+    targets: list[BaseEffect] = field(default_factory=list)
+    applied: list[Tracked] = field(default_factory=list)
+
+    def round_passed(self, round_number: int):
+        super().round_passed(round_number)
+
+        for target in self.targets:
+            self.engine.remove(target)
+
+        self.applied.append(self.engine.apply(self.ball, Tracked, 10))
+
+
+@pytest.mark.parametrize("stacked", STACKED)
+def test_round_with_effects(benchmark, stacked):
+    """
+    Plays a round with `stacked` effects on every ball, a tenth of which change the damage dealt.
+    """
+    battle = make_battle(5, health=10**15)
+
+    for ball in battle.player1.balls + battle.player2.balls:
+        for index in range(stacked):
+            battle.effects.apply(ball, Weaken if index % 10 == 0 else Marker, 10**9)
+
+    benchmark(battle.next_round)
+
+    assert len(battle.effects) == stacked * 10
+
+
+def test_expiry_at_exact_round():
+    """
+    An effect applied for `rounds` rounds is active until the round it expires at starts, and expires only once.
+    """
+    battle = make_battle(1, start=False)
+    engine = battle.effects
+    balls = battle.player1.balls
+
+    engine.start_round(3, balls)
+    effect = engine.apply(balls[0], Tracked, 2)
+    removed = engine.apply(balls[0], Tracked, 5)
+    engine.remove(removed)
+
+    engine.start_round(4, balls)
+    assert effect.active and effect.rounds_seen == [4]
+
+    engine.start_round(5, balls)
+    assert not effect.active and effect.rounds_seen == [4] and effect.expired == 1
+    assert balls[0].effects == {} and len(engine) == 0
+
+    # The entry of the effect removed early is dropped from the heap without expiring the effect again.
+    engine.start_round(8, balls)
+    assert removed.expired == 1 and engine._expiry == []
+
+
+def test_remove_during_dispatch():
+    """
+    Effects removed by a hook while a round starts are skipped for the rest of the dispatch, including the effect
+    removing itself, and effects applied by a hook only run from the next round.
+    """
+    battle = make_battle(2, start=False)
+    engine = battle.effects
+    balls = battle.player1.balls
+
+    before = engine.apply(balls[0], Tracked, 10)
+    remover = engine.apply(balls[0], Remover, 10)
+    after = engine.apply(balls[0], Tracked, 10)
+    other_ball = engine.apply(balls[1], Tracked, 10)
+    remover.engine = engine
+    remover.targets = [after, other_ball, remover]
+
+    engine.start_round(1, balls)
+
+    assert before.rounds_seen == [1] and remover.rounds_seen == [1]
+    assert after.rounds_seen == [] and other_ball.rounds_seen == []
+    assert [effect.expired for effect in (before, remover, after, other_ball)] == [0, 1, 1, 1]
+    (applied,) = remover.applied
+    assert applied.rounds_seen == [] and list(balls[0].effects.values()) == [before, applied]
+    assert balls[1].effects == {}
+
+    engine.start_round(2, balls)
+    assert before.rounds_seen == [1, 2] and applied.rounds_seen == [2] and remover.rounds_seen == [1]
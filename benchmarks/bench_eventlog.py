@@ -0,0 +1,101 @@
+"""
+Benchmarks of the battle event log, run with `pytest` from the repository root.
+"""
+
+import io
+
+import pytest
+
+from CBattle.package.eventlog import BALL, CREATE, FRAME_HEADER, KILLED, ROUND, SIDE, EventType, compact, encode, replay
+
+BATTLES = 1000
+ROUNDS = 40
+
+
+def battle_frames(battle_id: int, rounds: int, ended: bool = False) -> list[bytes]:
+    """
+    Returns the frames of a battle between two single-ball decks, played for `rounds` rounds.
+    """
+    frames = [
+        encode(EventType.CREATE, battle_id, CREATE.pack(battle_id * 2, battle_id * 2 + 1, battle_id, 0, battle_id)),
+        encode(EventType.ACCEPT, battle_id),
+    ]
+
+    for side in range(2):
+        frames.append(encode(EventType.ADD_BALL, battle_id, BALL.pack(side, battle_id * 10 + side)))
+        frames.append(encode(EventType.LOCK, battle_id, SIDE.pack(side)))
+
+    for round_number in range(1, rounds + 1):
+        frames.append(encode(EventType.ROUND, battle_id, ROUND.pack(round_number, 0, 0, round_number, 0)))
+
+    if ended:
+        frames.append(encode(EventType.END, battle_id, SIDE.pack(1)))
+
+    return frames
+
+
+def test_replay(benchmark):
+    data = b"".join(frame for battle_id in range(1, BATTLES + 1) for frame in battle_frames(battle_id, ROUNDS))
+
+    battles = benchmark(lambda: replay(io.BytesIO(data)))
+
+    assert len(battles) == BATTLES and all(len(battle.rounds) == ROUNDS for battle in battles.values())
+
+
+def test_replay_skips_ended_battles():
+    data = b"".join(battle_frames(1, 3, ended=True) + battle_frames(2, 3))
+
+    battles = replay(io.BytesIO(data))
+
+    assert list(battles) == [2]
+    battle = battles[2]
+    assert battle.user_ids == (4, 5) and battle.decks == ([20], [21]) and battle.started and battle.accepted
+    assert battle.rounds == [(0, 0, 1, 0), (0, 0, 2, 0), (0, 0, 3, 0)]
+
+
+@pytest.mark.parametrize("cut", (1, FRAME_HEADER.size, FRAME_HEADER.size + 1))
+def test_replay_torn_tail(cut):
+    """
+    A frame cut short by a crash is dropped, while every frame before it is kept.
+    """
+    frames = battle_frames(1, 3)
+    last = encode(EventType.ROUND, 1, ROUND.pack(4, 0, 0, 400, KILLED))
+
+    battles = replay(io.BytesIO(b"".join(frames) + last[:-cut]))
+
+    assert battles[1].rounds == [(0, 0, 1, 0), (0, 0, 2, 0), (0, 0, 3, 0)]
+    assert battles[1].frames == frames
+
+
+def test_replay_corrupted_frame():
+    """
+    Reading stops at the first frame failing its checksum, so the frames written after it are ignored as well.
+    """
+    frames = battle_frames(1, 3)
+    corrupted = bytearray(frames[-1])
+    corrupted[-1] ^= 0xFF
+
+    battles = replay(io.BytesIO(b"".join(frames[:-1]) + bytes(corrupted) + b"".join(battle_frames(2, 3))))
+
+    assert list(battles) == [1]
+    assert battles[1].rounds == [(0, 0, 1, 0), (0, 0, 2, 0)]
+
+
+def test_compact_truncates_tail(tmp_path):
+    """
+    Compacting a log after recovery drops a torn tail, so events appended afterwards can be read back.
+    """
+    path = tmp_path / "battles.log"
+    path.write_bytes(b"".join(battle_frames(1, 2, ended=True) + battle_frames(2, 2)) + b"\xff" * 5)
+
+    with path.open("rb") as file:
+        compact(path, replay(file))
+
+    with path.open("ab") as file:
+        file.write(encode(EventType.ROUND, 2, ROUND.pack(3, 0, 0, 3, KILLED)))
+
+    with path.open("rb") as file:
+        battles = replay(file)
+
+    assert path.read_bytes().startswith(b"".join(battle_frames(2, 2)))
+    assert list(battles) == [2] and battles[2].rounds[-1] == (0, 0, 3, KILLED)
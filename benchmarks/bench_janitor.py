@@ -0,0 +1,61 @@
+"""
+Benchmarks of the battle janitor, run with `pytest` from the repository root.
+"""
+
+import asyncio
+
+from benchmarks.soak import bounded, soak
+from CBattle.package.janitor import TimerWheel
+
+TIMERS = 100_000
+
+
+def test_wheel_tick(benchmark):
+    wheel = TimerWheel()
+
+    for index in range(TIMERS):
+        wheel.schedule(index, index % 3600 + 1)
+
+    # Ticking a wheel full of timers costs the same as ticking an empty one, besides the timers that expire.
+    benchmark(wheel.advance)
+
+
+def test_wheel_schedule(benchmark):
+    wheel = TimerWheel()
+
+    benchmark(wheel.schedule, 0, 900)
+
+
+def test_soak(benchmark):
+    samples = benchmark.pedantic(lambda: asyncio.run(soak(hours=3, per_minute=30)), rounds=1)
+
+    benchmark.extra_info["battles"] = [sample.battles for sample in samples]
+    benchmark.extra_info["memory"] = [sample.memory for sample in samples]
+
+    assert bounded(samples)
+
+
+def test_wheel_fires_on_time():
+    """
+    Timers fire at their exact tick from any starting tick, including those cascading down from every level at once
+    and those shortened to the range of the top level.
+    """
+    slots, levels = 4, 3
+    top = slots ** (levels - 1)
+
+    for start in range(slots**levels + 1):
+        wheel = TimerWheel(slots, levels)
+        for _ in range(start):
+            wheel.advance()
+
+        delays = range(slots**levels + 2)
+        for delay in delays:
+            wheel.schedule(delay, delay)
+
+        fired = {}
+        while len(wheel):
+            for delay in wheel.advance():
+                fired[delay] = wheel.tick
+
+        limit = (start // top + slots) * top - 1
+        assert fired == {delay: min(start + max(delay, 1), limit) for delay in delays}
@@ -0,0 +1,108 @@
+"""
+Benchmarks of the matchmaking queue, run with `pytest` from the repository root.
+
+Deck powers follow a normal distribution around the power of an average deck, so most players land in a few
+crowded buckets while the strongest and weakest decks wait alone in the tails.
+"""
+
+import random
+
+import pytest
+
+from CBattle.package.matchmaking import MatchQueue, QueueEntry
+
+PLAYERS = (1_000, 10_000)
+MEAN_POWER = 7_500
+POWER_DEVIATION = 2_500
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_entries(count: int, clock: Clock, seed: int = 0) -> list[QueueEntry]:
+    rng = random.Random(seed)
+    return [QueueEntry(user_id, max(rng.gauss(MEAN_POWER, POWER_DEVIATION), 0), clock.now) for user_id in range(count)]
+
+
+@pytest.mark.parametrize("players", PLAYERS)
+def test_arrivals(benchmark, players):
+    """
+    Players join one after the other, and are paired as they arrive whenever an opponent is within their window.
+    """
+    clock = Clock()
+
+    def setup():
+        return (MatchQueue(window=100, clock=clock), make_entries(players, clock)), {}
+
+    def run(queue: MatchQueue, entries: list[QueueEntry]) -> int:
+        return sum(queue.join(entry) is not None for entry in entries)
+
+    pairs = benchmark.pedantic(run, setup=setup, rounds=20)
+
+    benchmark.extra_info["pairs"] = pairs
+    assert pairs * 2 <= players
+
+
+@pytest.mark.parametrize("players", PLAYERS)
+def test_widening(benchmark, players):
+    """
+    Players wait with a window too narrow to find anyone, until enough time passed for every window to reach the
+    closest opponent.
+    """
+    clock = Clock()
+
+    def setup():
+        queue = MatchQueue(window=0, widening=100, clock=clock)
+        clock.now = 0.0
+
+        for entry in make_entries(players, clock):
+            queue.wait(entry)
+
+        clock.now = 600.0
+        return (queue,), {}
+
+    pairs = benchmark.pedantic(lambda queue: queue.pair_waiting(), setup=setup, rounds=20)
+
+    assert len(pairs) * 2 == players
+
+
+def test_wait_keeps_place():
+    """
+    A player put back in the queue is paired before the players who joined after them.
+    """
+    clock = Clock()
+    queue = MatchQueue(window=0, widening=10, clock=clock)
+    first = QueueEntry(1, 1000, clock.now)
+    queue.join(first)
+    queue.leave(first.user_id)
+
+    clock.now = 10.0
+    queue.join(QueueEntry(2, 1000, clock.now, avoid={3}))
+    queue.wait(first)
+    queue.join(QueueEntry(3, 1100, clock.now, avoid={2}))
+
+    clock.now = 20.0
+    assert [entry.user_id for entry in queue.entries.values()] == [1, 2, 3]
+    assert [(opponent.user_id, entry.user_id) for opponent, entry in queue.pair_waiting()] == [(2, 1)]
+
+
+def test_pairs_within_both_windows():
+    """
+    Players are only paired once each of them is within the other's window.
+    """
+    clock = Clock()
+    queue = MatchQueue(window=100, widening=10, clock=clock)
+    queue.join(QueueEntry(1, 1000, clock.now))
+
+    # The first player waited long enough to reach the second one, but the second one only just joined.
+    clock.now = 20.0
+    assert queue.join(QueueEntry(2, 1250, clock.now)) is None
+    assert queue.pair_waiting() == []
+
+    clock.now = 35.0
+    assert [(opponent.user_id, entry.user_id) for opponent, entry in queue.pair_waiting()] == [(2, 1)]
@@ -0,0 +1,68 @@
+"""
+Benchmarks of the vectorized battle simulator, run with `pytest` from the repository root. The simulator needs the
+`simulation` extra, so these are skipped without NumPy.
+"""
+
+import pytest
+
+from benchmarks.standins import make_battle
+
+pytest.importorskip("numpy")
+
+from CBattle.package.simulation import SimDeck, simulate  # noqa: E402
+
+DECK_SIZE = 4
+BATTLES = 2000
+
+
+def make_decks(deck_size: int, seed: int = 0) -> tuple:
+    """
+    Builds a battle whose first player has 30% more health on every ball, so the decks don't win equally often.
+    """
+    battle = make_battle(deck_size, seed, start=False)
+
+    for ball in battle.player1.balls:
+        ball.health = int(ball.health * 1.3)
+
+    return battle, SimDeck.from_player(battle.player1), SimDeck.from_player(battle.player2)
+
+
+def play_reference(deck_size: int, battles: int) -> tuple[float, float, float]:
+    """
+    Plays battles with `BattleState.play`, returning the win rate of both players and the mean round count.
+    """
+    wins = [0, 0]
+    rounds = 0
+
+    for seed in range(battles):
+        battle, _, _ = make_decks(deck_size, seed)
+        messages, winner = battle.play()
+        rounds += len(messages)
+
+        if winner is not None:
+            wins[0 if winner is battle.player1 else 1] += 1
+
+    return wins[0] / battles, wins[1] / battles, rounds / battles
+
+
+def test_matches_reference_engine():
+    """
+    The simulator and `BattleState.play` play by the same rules, so they must agree on how often each deck wins and
+    how long battles last, up to sampling noise.
+    """
+    _, deck1, deck2 = make_decks(DECK_SIZE)
+    win_rate1, win_rate2, mean_rounds = play_reference(DECK_SIZE, BATTLES)
+
+    result = simulate(deck1, deck2, BATTLES * 50, seed=0)
+
+    assert abs(result.player1_win_rate - win_rate1) < 0.04
+    assert abs(result.player2_win_rate - win_rate2) < 0.04
+    assert abs(result.rounds.mean() - mean_rounds) < mean_rounds * 0.05
+
+
+def test_simulate(benchmark):
+    _, deck1, deck2 = make_decks(DECK_SIZE)
+
+    result = benchmark(simulate, deck1, deck2, 100_000, 0)
+
+    assert result.battles == 100_000
@@ -0,0 +1,147 @@
+"""
+Packed representation of a battle, used by `benchmarks/memory.py` to measure how much of the footprint of a live
+`BattleState` comes from its objects rather than its data. The cog doesn't use it: live battles are also held by
+their views, so packing the registry's copy wouldn't free them.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING
+
+from CBattle.package.battlelog import BattleLog
+from CBattle.package.logic import BattleBall, BattlePlayer, BattleState
+
+if TYPE_CHECKING:
+    from discord import Member, TextChannel, User
+
+    from ballsdex.core.models import Player
+
+STARTED = 1 << 0
+ACCEPTED = 1 << 1
+AUTO = 1 << 2
+PLAYER1_LOCKED = 1 << 3
+PLAYER2_LOCKED = 1 << 4
+PLAYER2_ACTIVE = 1 << 5
+FINISHED = 1 << 6
+
+
+class CompactBattle:
+    """
+    Packed representation of a `BattleState`. Ball stats of both decks are stored back to back in typed arrays,
+    and Discord and ORM objects are replaced by their IDs. The battle log is kept as its ring buffer.
+
+    Effects and abilities are objects of their own, which can't be packed, so battles with any of them are refused.
+    """
+
+    __slots__ = (
+        "id",
+        "seed",
+        "user_ids",
+        "channel_id",
+        "round_number",
+        "flags",
+        "deck_size",
+        "instance_ids",
+        "health",
+        "attack",
+        "evasion",
+        "crit_chance",
+        "dead",
+        "names",
+        "labels",
+        "emojis",
+        "log",
+    )
+
+    def __init__(self, battle: BattleState):
+        balls = battle.player1.balls + battle.player2.balls
+
+        if len(battle.effects) or any(ball.abilities for ball in balls):
+            raise ValueError("Battles with effects or abilities can't be packed.")
+
+        self.id = battle.id
+        self.seed = battle.seed
+        self.user_ids = (battle.player1.user.id, battle.player2.user.id)
+        self.channel_id = battle.channel.id if battle.channel else None
+        self.round_number = battle.round_number
+        self.deck_size = len(battle.player1.balls)
+
+        self.flags = (
+            (STARTED if battle.started else 0)
+            | (ACCEPTED if battle.accepted else 0)
+            | (AUTO if battle.auto else 0)
+            | (PLAYER1_LOCKED if battle.player1.locked else 0)
+            | (PLAYER2_LOCKED if battle.player2.locked else 0)
+            | (PLAYER2_ACTIVE if battle.active_player is battle.player2 else 0)
+            | (FINISHED if battle.finished else 0)
+        )
+
+        self.instance_ids = array("q", [ball.instance_id for ball in balls])
+        self.health = array("q", [ball.health for ball in balls])
+        self.attack = array("q", [ball.attack for ball in balls])
+        self.evasion = array("d", [ball.evasion for ball in balls])
+        self.crit_chance = array("d", [ball.crit_chance for ball in balls])
+        self.dead = bytes(ball.dead for ball in balls)
+
+        # Display values are shared with the countryball cache, so keeping them only costs a reference per ball.
+        self.names = tuple(ball.name for ball in balls)
+        self.labels = tuple(ball.label for ball in balls)
+        self.emojis = tuple(ball.emoji for ball in balls)
+
+        self.log = (battle.log.capacity, battle.log.count, bytes(battle.log.buffer))
+
+    def to_state(
+        self,
+        user1: User | Member,
+        user2: User | Member,
+        channel: TextChannel | None = None,
+        model1: Player | None = None,
+        model2: Player | None = None,
+    ) -> BattleState:
+        """
+        Rebuilds a `BattleState` from the packed data. Balls are created without their ball instance, which is only
+        read when a battle is built.
+        """
+        player1 = BattlePlayer(model=model1, user=user1, locked=bool(self.flags & PLAYER1_LOCKED))
+        player2 = BattlePlayer(model=model2, user=user2, locked=bool(self.flags & PLAYER2_LOCKED))
+
+        for index in range(len(self.instance_ids)):
+            owner = player1 if index < self.deck_size else player2
+            owner.balls.append(
+                BattleBall(
+                    model=None,
+                    owner=owner,
+                    health=self.health[index],
+                    attack=self.attack[index],
+                    evasion=self.evasion[index],
+                    crit_chance=self.crit_chance[index],
+                    dead=bool(self.dead[index]),
+                    instance_id=self.instance_ids[index],
+                    name=self.names[index],
+                    label=self.labels[index],
+                    emoji=self.emojis[index],
+                )
+            )
+
+        battle = BattleState(
+            player1=player1,
+            player2=player2,
+            id=self.id,
+            seed=self.seed,
+            round_number=self.round_number,
+            accepted=bool(self.flags & ACCEPTED),
+            auto=bool(self.flags & AUTO),
+            finished=bool(self.flags & FINISHED),
+            channel=channel,
+            log=BattleLog(self.log[0]),
+        )
+        battle.log.count, battle.log.buffer = self.log[1], bytearray(self.log[2])
+
+        if self.flags & STARTED:
+            battle.start()
+
+            if self.flags & PLAYER2_ACTIVE:
+                battle.active_player, battle.inactive_player = player2, player1
+
+        return battle
@@ -0,0 +1,69 @@
+import asyncio
+import enum
+import sys
+from types import ModuleType, SimpleNamespace
+
+import pytest
+from discord import app_commands
+
+
+def install_ballsdex_stub():
+    """
+    Registers stand-ins of the Ballsdex modules the package imports, so the benchmarks run from a checkout without
+    a Ballsdex install. The benchmarks never reach the database, so the models are empty classes.
+    """
+    try:
+        import tortoise  # noqa: F401
+    except ModuleNotFoundError:
+        tortoise_modules = {"tortoise": {}, "tortoise.signals": {"Signals": enum.Enum("Signals", "post_save")}}
+    else:
+        tortoise_modules = {}
+
+    class BallInstance:
+        pass
+
+    class Player:
+        pass
+
+    class BallInstanceTransformer(app_commands.Transformer):
+        async def transform(self, interaction, value):
+            return value
+
+    modules = {
+        "ballsdex": {},
+        "ballsdex.core": {},
+        "ballsdex.core.bot": {"BallsDexBot": type("BallsDexBot", (), {})},
+        "ballsdex.core.models": {"BallInstance": BallInstance, "Player": Player},
+        "ballsdex.core.utils": {},
+        "ballsdex.core.utils.transformers": {
+            "BallInstanceTransform": app_commands.Transform[BallInstance, BallInstanceTransformer]
+        },
+        "ballsdex.settings": {
+            "settings": SimpleNamespace(
+                bot_name="BallsDex", collectible_name="countryball", plural_collectible_name="countryballs"
+            )
+        },
+        **tortoise_modules,
+    }
+
+    for name, attributes in modules.items():
+        module = ModuleType(name)
+        module.__path__ = []
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+try:
+    import ballsdex  # noqa: F401
+except ModuleNotFoundError:
+    install_ballsdex_stub()
+
+
+@pytest.fixture
+def loop():
+    """
+    Event loop for building views, which need a running loop when they are created.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
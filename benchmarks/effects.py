@@ -0,0 +1,68 @@
+"""
+Measures the cost of a battle round with hundreds of effects stacked on the balls, compared to a round without any.
+
+Run from the repository root with `python -m benchmarks.effects`.
+"""
+
+import time
+from dataclasses import dataclass
+
+from benchmarks.standins import make_battle
+from CBattle.package.base import BaseEffect
+
+DECK_SIZE = 5
+ROUNDS = 20_000
+STACKED = (0, 100, 500, 1000)
+
+
+@dataclass(eq=False)
+class Weaken(BaseEffect):
+    def modify_damage(self, damage: int, opponent_ball) -> int:
+        return damage * 99 // 100
+
+
+@dataclass(eq=False)
+class Marker(BaseEffect):
+    """
+    Effect without any hook, which the engine only has to expire.
+    """
+
+
+def run(stacked: int) -> float:
+    """
+    Returns the average time of a round, with `stacked` effects alive on every ball at all times. Effects expire
+    and get applied again every round, so expiry and registration are part of the measurement.
+    """
+    # Balls never die, so every round is played with the same amount of balls.
+    battle = make_battle(DECK_SIZE, stacked, health=10**12)
+    balls = battle.player1.balls + battle.player2.balls
+
+    for index in range(stacked):
+        for ball in balls:
+            effect_type = Weaken if index % 10 == 0 else Marker
+            battle.effects.apply(ball, effect_type, index % 50 + 1)
+
+    start = time.perf_counter()
+
+    for _ in range(ROUNDS):
+        alive = len(battle.effects)
+        battle.next_round()
+
+        for index in range(alive - len(battle.effects)):
+            effect_type = Weaken if index % 10 == 0 else Marker
+            battle.effects.apply(balls[index % len(balls)], effect_type, 50)
+
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    baseline = run(0)
+    print(f"{0:5} effects per ball: {baseline * 1e6:7.2f} us per round")
+
+    for stacked in STACKED[1:]:
+        elapsed = run(stacked)
+        print(f"{stacked:5} effects per ball: {elapsed * 1e6:7.2f} us per round ({elapsed / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
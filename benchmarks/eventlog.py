@@ -0,0 +1,78 @@
+"""
+Measures the write overhead of the battle event log and the time it takes to recover live battles from it.
+
+Run from the repository root with `python -m benchmarks.eventlog`.
+"""
+
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from CBattle.package.eventlog import EventLog, replay
+
+BATTLES = 10_000
+DECK_SIZE = 5
+ROUNDS = 40
+
+
+def make_battle(index: int) -> SimpleNamespace:
+    players = [SimpleNamespace(user=SimpleNamespace(id=index * 2 + side)) for side in range(2)]
+    return SimpleNamespace(
+        player1=players[0], player2=players[1], channel=SimpleNamespace(id=index), auto=False, seed=index
+    )
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "battles.log")
+        event_log = EventLog(path, flush_interval=3600)
+        event_log.open()
+
+        result = SimpleNamespace(damage=120, flags=0)
+        recorders = [event_log.recorder(index) for index in range(1, BATTLES + 1)]
+        events = 0
+
+        start = time.perf_counter()
+
+        for index, recorder in enumerate(recorders):
+            recorder.created(make_battle(index))
+            recorder.accepted()
+
+            for side in range(2):
+                for slot in range(DECK_SIZE):
+                    recorder.ball_added(side, index * 10 + side * DECK_SIZE + slot)
+
+                recorder.locked(side)
+
+            events += 4 + 2 * DECK_SIZE
+
+        for round_number in range(1, ROUNDS + 1):
+            for recorder in recorders:
+                recorder.round_played(round_number, 0, round_number % DECK_SIZE, result)
+
+            events += BATTLES
+
+        append_time = time.perf_counter() - start
+        size = sum(map(len, event_log.pending))
+
+        start = time.perf_counter()
+        await event_log.flush()
+        flush_time = time.perf_counter() - start
+
+        await event_log.close()
+
+        start = time.perf_counter()
+        with path.open("rb") as file:
+            recovered = replay(file)
+        replay_time = time.perf_counter() - start
+
+    print(f"{BATTLES} live battles, {events} events, {size / 1024 / 1024:.1f} MiB")
+    print(f"Append: {append_time / events * 1e6:.2f} us per event")
+    print(f"Write + fsync: {flush_time * 1000:.1f} ms for the whole batch")
+    print(f"Recovery: {replay_time * 1000:.1f} ms to rebuild {len(recovered)} battles")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Measures the memory footprint of a live `BattleState` and of its `CompactBattle` counterpart.
+
+Run from the repository root with `python -m benchmarks.memory`.
+"""
+
+import gc
+import tracemalloc
+from types import SimpleNamespace
+
+from benchmarks.compact import CompactBattle
+from CBattle.package.logic import BattleBall, BattlePlayer, BattleState
+
+BATTLES = 10_000
+DECK_SIZE = 5
+
+
+def make_users(index: int) -> list[SimpleNamespace]:
+    return [SimpleNamespace(id=index * 2 + side, name=f"user{index * 2 + side}") for side in range(2)]
+
+
+def make_instances(index: int) -> list[list[SimpleNamespace]]:
+    return [
+        [
+            SimpleNamespace(
+                pk=(index * 2 + side) * DECK_SIZE + slot,
+                health=500 + slot,
+                attack=100 + slot,
+                countryball=SimpleNamespace(country="Poland"),
+                to_string=lambda: "#1 Poland",
+            )
+            for slot in range(DECK_SIZE)
+        ]
+        for side in range(2)
+    ]
+
+
+def make_battle(users: list[SimpleNamespace], instances: list[list[SimpleNamespace]]) -> BattleState:
+    players = [BattlePlayer(model=None, user=user) for user in users]
+
+    for player, deck in zip(players, instances):
+        player.balls.extend(BattleBall.from_ballinstance(instance, player) for instance in deck)
+
+    battle = BattleState(player1=players[0], player2=players[1], accepted=True)
+    battle.start()
+
+    return battle
+
+
+def measure(factory, count: int) -> float:
+    """
+    Returns the average amount of bytes allocated and kept alive by each call of `factory`.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    objects = [factory(index) for index in range(count)]
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+
+    return size / count
+
+
+def main():
+    # Users and ball instances are stand-ins for Discord and ORM objects that live outside of the battle, so they
+    # are created before measuring.
+    users = [make_users(index) for index in range(BATTLES)]
+    instances = [make_instances(index) for index in range(BATTLES)]
+    battles = [make_battle(users[index], instances[index]) for index in range(BATTLES)]
+
+    full = measure(lambda index: make_battle(users[index], instances[index]), BATTLES)
+    compact = measure(lambda index: CompactBattle(battles[index]), BATTLES)
+
+    print(f"BattleState:   {full:8.0f} bytes per {DECK_SIZE}v{DECK_SIZE} battle")
+    print(f"CompactBattle: {compact:8.0f} bytes per {DECK_SIZE}v{DECK_SIZE} battle")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Measures plugin discovery as the amount of custom abilities grows, with and without a manifest, and the cost of
+loading the abilities of a single ball.
+
+Run from the repository root with `python -m benchmarks.plugins`.
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from CBattle.package.plugins import PluginRegistry
+
+CATALOG_SIZES = (50, 100, 500, 1000)
+ABILITIES_PER_MODULE = 5
+
+MODULE_TEMPLATE = """
+from dataclasses import dataclass
+
+from CBattle.package.base import BaseAbility
+
+
+@dataclass
+class Ability{index}_{slot}(BaseAbility):
+    balls = ["Ball{index}"]
+
+    def on_activation(self):
+        self.ball.attack += {slot}
+"""
+
+
+def write_catalog(directory: Path, modules: int):
+    package = directory / "catalog"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+
+    for index in range(modules):
+        source = "".join(MODULE_TEMPLATE.format(index=index, slot=slot) for slot in range(ABILITIES_PER_MODULE))
+        (package / f"abilities{index}.py").write_text(source)
+
+
+def measure(modules: int):
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        write_catalog(directory, modules)
+        sys.path.insert(0, str(directory))
+
+        def make_registry():
+            return PluginRegistry(directory / "catalog", "catalog", directory / "manifest.json", None)
+
+        start = time.perf_counter()
+        make_registry().discover()
+        cold = time.perf_counter() - start
+
+        registry = make_registry()
+        start = time.perf_counter()
+        registry.discover()
+        warm = time.perf_counter() - start
+
+        start = time.perf_counter()
+        abilities = registry.abilities_for("Ball0", {})
+        load = time.perf_counter() - start
+
+        sys.path.remove(str(directory))
+        for name in [name for name in sys.modules if name.startswith("catalog")]:
+            del sys.modules[name]
+
+    print(
+        f"{modules * ABILITIES_PER_MODULE:5} abilities: discovery {cold * 1000:7.1f}ms without a manifest, "
+        f"{warm * 1000:6.1f}ms with it, {len(abilities)} abilities of a ball loaded in {load * 1000:.1f}ms"
+    )
+
+
+def main():
+    for abilities in CATALOG_SIZES:
+        measure(abilities // ABILITIES_PER_MODULE)
+
+
+if __name__ == "__main__":
+    main()
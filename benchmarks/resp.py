@@ -0,0 +1,146 @@
+"""
+Stand-in of a Redis server, implementing the commands used by the battle coordinator over the Redis serialization
+protocol, so the coordinator can be benchmarked without a Redis server.
+"""
+
+import asyncio
+import time
+
+from CBattle.package.coordination import RELEASE_SCRIPT, RENEW_SCRIPT
+
+
+class RespServer:
+    """
+    Serves a single in-memory keyspace to any number of connections. Every command is handled at once by the event
+    loop, so commands are atomic like in Redis. `EVAL` only runs the scripts of the coordinator, implemented in
+    Python.
+    """
+
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.server: asyncio.Server | None = None
+        self.connections: set[asyncio.StreamWriter] = set()
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = await asyncio.start_server(self._serve, host, port)
+
+    async def stop(self):
+        self.server.close()
+
+        for writer in self.connections:
+            writer.close()
+
+        await self.server.wait_closed()
+
+    def _get(self, key: bytes) -> bytes | None:
+        entry = self.data.get(key)
+
+        if entry is None:
+            return None
+
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+
+        return entry[0]
+
+    def handle(self, command: list[bytes]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+
+        if name in (b"PING", b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+
+        if name == b"GET":
+            return _bulk(self._get(args[0]))
+
+        if name == b"MGET":
+            return b"*%d\r\n%s" % (len(args), b"".join(_bulk(self._get(key)) for key in args))
+
+        if name == b"SET":
+            key, value, options = args[0], args[1], [option.upper() for option in args[2:]]
+            exists = self._get(key) is not None
+
+            if (b"NX" in options and exists) or (b"XX" in options and not exists):
+                return b"$-1\r\n"
+
+            expires = None
+            if b"PX" in options:
+                expires = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+
+            self.data[key] = (value, expires)
+            return b"+OK\r\n"
+
+        if name == b"PEXPIRE":
+            value = self._get(args[0])
+            if value is None:
+                return b":0\r\n"
+
+            self.data[args[0]] = (value, time.monotonic() + int(args[1]) / 1000)
+            return b":1\r\n"
+
+        if name == b"DEL":
+            deleted = 0
+            for key in args:
+                if self._get(key) is not None:
+                    del self.data[key]
+                    deleted += 1
+
+            return b":%d\r\n" % deleted
+
+        if name == b"EVAL":
+            return self._eval(args[0].decode(), args[2 : 2 + int(args[1])], args[2 + int(args[1]) :])
+
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    def _eval(self, script: str, keys: list[bytes], argv: list[bytes]) -> bytes:
+        if script == RELEASE_SCRIPT:
+            owned = [key for key, token in zip(keys, argv) if self._get(key) == token]
+            for key in owned:
+                del self.data[key]
+
+            return b":%d\r\n" % len(owned)
+
+        if script == RENEW_SCRIPT:
+            expires = time.monotonic() + int(argv[0]) / 1000
+            renewed = []
+
+            for key, token in zip(keys, argv[1:]):
+                owned = self._get(key) == token
+                if owned:
+                    self.data[key] = (token, expires)
+
+                renewed.append(b":%d\r\n" % owned)
+
+            return b"*%d\r\n%s" % (len(renewed), b"".join(renewed))
+
+        return b"-NOSCRIPT unknown script\r\n"
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections.add(writer)
+
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+
+                command = []
+                for _ in range(int(header[1:])):
+                    length = int((await reader.readline())[1:])
+                    command.append((await reader.readexactly(length + 2))[:-2])
+
+                writer.write(self.handle(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+
+def _bulk(value: bytes | None) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
@@ -0,0 +1,158 @@
+"""
+Simulates a day of battle traffic on a simulated clock, and checks that the janitor keeps the amount of registered
+battles and the memory in use bounded.
+
+Battles are started at a steady rate and either finish, get cancelled or are abandoned by their players. Only the
+janitor removes finished and abandoned battles.
+
+Run from the repository root with `python -m benchmarks.soak`.
+"""
+
+import argparse
+import asyncio
+import gc
+import heapq
+import random
+import tracemalloc
+from dataclasses import dataclass
+from itertools import count
+
+from benchmarks.standins import make_battle
+from CBattle.package.components import TurnView
+from CBattle.package.janitor import BattleJanitor
+from CBattle.package.logic import BattleState
+from CBattle.package.registry import BattleRegistry
+
+DECK_SIZE = 3
+TIMEOUT = 900.0
+
+# Share of the battles that are played until the end, and that are cancelled. The others are abandoned.
+FINISHED = 0.5
+CANCELLED = 0.2
+
+
+@dataclass
+class Sample:
+    hour: int
+    battles: int
+    timers: int
+    memory: int
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StubMessage:
+    async def edit(self, **kwargs):
+        pass
+
+
+def start_battle(user_ids: count) -> BattleState:
+    """
+    Builds a started battle between two new players, with the view of its turns.
+    """
+    battle = make_battle(DECK_SIZE, user_ids=(next(user_ids), next(user_ids)))
+
+    view = TurnView(battle)
+    view.message = StubMessage()
+    battle.last_turn = view
+
+    return battle
+
+
+async def soak(hours: int, per_minute: float, seed: int = 0) -> list[Sample]:
+    """
+    Runs the simulation and returns the amount of registered battles, of pending timers and the memory in use at
+    the end of every simulated hour.
+    """
+    rng = random.Random(seed)
+    clock = Clock()
+    battles = BattleRegistry()
+    janitor = BattleJanitor(battles, TIMEOUT, clock=clock)
+
+    user_ids = count(1)
+    order = count()
+    events: list[tuple[float, int, str, BattleState]] = []
+    samples = []
+    arrivals = 0.0
+
+    gc.collect()
+    tracemalloc.start()
+
+    for second in range(1, hours * 3600 + 1):
+        clock.now = float(second)
+        arrivals += per_minute / 60
+
+        while arrivals >= 1:
+            arrivals -= 1
+
+            battle = start_battle(user_ids)
+            battles.add(battle)
+            janitor.track(battle)
+
+            fate = rng.random()
+            end = clock.now + rng.uniform(10, 600)
+            kind = "finish" if fate < FINISHED else "cancel" if fate < FINISHED + CANCELLED else "abandon"
+
+            heapq.heappush(events, (end, next(order), kind, battle))
+
+            # Players press buttons until the battle ends, or until they leave it.
+            for moment in range(int(clock.now) + 10, int(end), 30):
+                heapq.heappush(events, (float(moment), next(order), "touch", battle))
+
+        while events and events[0][0] <= clock.now:
+            _, _, kind, battle = heapq.heappop(events)
+
+            if kind == "touch":
+                battle.touch()
+            elif kind == "finish":
+                battle.finished = True
+                battle.last_turn.stop()
+            elif kind == "cancel":
+                battle.finished = True
+                battles.remove(battle)
+                battle.last_turn.stop()
+
+        expired = janitor.sweep()
+        if expired:
+            await janitor.expire(expired)
+
+        if second % 3600 == 0:
+            gc.collect()
+            memory, _ = tracemalloc.get_traced_memory()
+            samples.append(Sample(second // 3600, len(battles), len(janitor.wheel), memory))
+
+    tracemalloc.stop()
+    return samples
+
+
+def bounded(samples: list[Sample], tolerance: float = 1.25) -> bool:
+    """
+    Returns whether the memory in use stopped growing once the traffic reached a steady state, after the first hour.
+    """
+    steady = samples[1:] or samples
+    return max(sample.memory for sample in steady) <= steady[0].memory * tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--per-minute", type=float, default=30.0, help="Battles started per simulated minute.")
+    args = parser.parse_args()
+
+    samples = asyncio.run(soak(args.hours, args.per_minute))
+
+    print(f"{'hour':>4} {'battles':>8} {'timers':>8} {'memory':>12}")
+    for sample in samples:
+        print(f"{sample.hour:>4} {sample.battles:>8} {sample.timers:>8} {sample.memory / 1024:>10.0f}KB")
+
+    print("Memory stayed bounded." if bounded(samples) else "Memory kept growing!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Stand-ins of the `BallInstance` and `Player` models and of Discord users, used to build battles without a database
+or a Discord connection.
+"""
+
+from types import SimpleNamespace
+
+from CBattle.package.logic import BattleBall, BattlePlayer, BattleState
+
+BALL_NAMES = ("Poland", "Brazil", "Mexico", "Japan", "France", "Egypt", "Canada", "India", "Chile", "Kenya")
+
+
+def make_instance(pk: int, slot: int, player_id: int = 1) -> SimpleNamespace:
+    """
+    Stands in for a `BallInstance` fetched with its countryball.
+    """
+    name = BALL_NAMES[slot % len(BALL_NAMES)]
+
+    return SimpleNamespace(
+        pk=pk,
+        player_id=player_id,
+        health=400 + slot * 25,
+        attack=80 + slot * 10,
+        countryball=SimpleNamespace(country=name, emoji_id=pk),
+        to_string=lambda: f"#{pk:X} {name}",
+    )
+
+
+def make_battle(
+    deck_size: int, seed: int = 0, health: int | None = None, start: bool = True, user_ids: tuple[int, int] = (1, 2)
+) -> BattleState:
+    """
+    Builds an accepted battle between two players with `deck_size` balls each. Setting `health` gives every ball
+    the same health, which can be used to make a battle last as long as needed. With `start` disabled, the battle
+    is left in the planning phase, before both players locked. Battles registered together need their own
+    `user_ids`.
+    """
+    players = []
+
+    for side, user_id in enumerate(user_ids):
+        user = SimpleNamespace(id=user_id, name=f"Player {user_id}", mention=f"<@{user_id}>")
+        player = BattlePlayer(model=SimpleNamespace(pk=user_id, discord_id=user_id), user=user)
+
+        for slot in range(deck_size):
+            ball = BattleBall.from_ballinstance(make_instance(side * deck_size + slot + 1, slot, user_id), player)
+
+            if health is not None:
+                ball.health = health
+
+            player.balls.append(ball)
+
+        players.append(player)
+
+    battle = BattleState(player1=players[0], player2=players[1], seed=seed, accepted=True)
+    if start:
+        battle.start()
+
+    return battle